@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
@@ -23,11 +23,30 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = schemas.TokenData(username=username)
-    except JWTError:
+        token_data = schemas.TokenData(
+            username=username, user_id=payload.get("uid"), token_version=payload.get("ver", 0)
+        )
+    except (JWTError, ValueError):
         raise credentials_exception
-    
-    user = crud.get_user_by_username(db, username=token_data.username)
+
+    if token_data.user_id is None:
+        # ユーザーIDを含まない古いトークン
+        user = crud.get_user_by_username(db, username=token_data.username)
+        if user is not None and user.token_version != token_data.token_version:
+            user = None
+    else:
+        # 主キーで引く（TTLの間はプロセス内のキャッシュから返す）
+        user = crud.get_authenticated_user(db, user_id=token_data.user_id, token_version=token_data.token_version)
     if user is None:
         raise credentials_exception
     return user
+
+def get_language(accept_language: str | None = Header(None)) -> str:
+    """
+    Accept-Language ヘッダーからレスポンスの言語 ("ja" / "en") を決める。デフォルトは日本語
+    """
+    if accept_language:
+        primary_lang = accept_language.split(",")[0].split(";")[0].lower()
+        if primary_lang.startswith("en"):
+            return "en"
+    return "ja"
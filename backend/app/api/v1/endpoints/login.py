@@ -1,39 +1,87 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 
-from app import crud, schemas
+from app import crud, models, schemas
 from app.core import security
+from app.core.config import settings
+from app.core.dates import is_valid_timezone
 from app.database import get_db
+from ..dependencies import get_current_user
 
 router = APIRouter()
 
+def _hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Too many login requests. Please retry later.",
+        headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
+def _get_user_and_release(db: Session, username: str):
+    # 照合の間DBコネクションを保持しないよう、読み込んだらすぐプールに返す（セッションは後で再利用できる）。
+    # 別々に run_in_threadpool すると、スレッドの空き待ちの間もコネクションを保持してしまう
+    user = crud.get_user_by_username(db, username=username)
+    db.close()
+    return user
+
 @router.post("/login/token", response_model=schemas.Token)
-def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
     """
     ユーザー名とパスワードで認証し、アクセストークンを発行する
+    パスワードの照合は専用のプロセスプールで行い、処理待ちが多いときは503を返す
     """
-    user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    if security.hashing_pool_full():
+        raise _hashing_busy()
+    user = await run_in_threadpool(_get_user_and_release, db, form_data.username)
+
+    verified, new_hash = False, None
+    if user:
+        try:
+            verified, new_hash = await security.verify_password_async(form_data.password, user.password_hash)
+        except security.HashingPoolFull:
+            raise _hashing_busy()
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # ハッシュのコストなどが変わっていれば、新しい設定で保存し直す
+        await run_in_threadpool(crud.update_password_hash, db, user_id=user.id, password_hash=new_hash)
+
     access_token = security.create_access_token(
-        data={"sub": user.username}
+        data={"sub": user.username, "uid": user.id, "ver": user.token_version}
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/logout-all", status_code=status.HTTP_204_NO_CONTENT)
+def logout_all(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+    """
+    発行済みのアクセストークンをすべて失効させる（全端末からログアウト）
+    """
+    crud.revoke_user_tokens(db, db_user=current_user)
+
 @router.post("/signup", response_model=schemas.UserInfo, status_code=status.HTTP_201_CREATED)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     """
     新規ユーザーを作成する
     """
-    db_user = crud.get_user_by_username(db, username=user.username)
+    if security.hashing_pool_full():
+        raise _hashing_busy()
+    db_user = await run_in_threadpool(_get_user_and_release, db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    
+    if user.timezone is not None and not is_valid_timezone(user.timezone):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {user.timezone}")
+
+    try:
+        password_hash = await security.get_password_hash_async(user.password)
+    except security.HashingPoolFull:
+        raise _hashing_busy()
+
     # crud.create_userに修正
-    created_user = crud.create_user(db=db, user=user)
+    created_user = await run_in_threadpool(crud.create_user, db=db, user=user, password_hash=password_hash)
     return created_user
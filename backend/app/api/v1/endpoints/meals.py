@@ -1,190 +1,453 @@
+import asyncio
+import base64
+import hashlib
 import json
-import shutil
-from datetime import date, datetime, timezone
-from pathlib import Path
+from datetime import date, datetime, timedelta
 
-import google.generativeai as genai
-from app import crud, models, schemas
+from app import crud, database, models, schemas, worker
+from app.core import meal_io, metrics, storage
 from app.core.config import settings
-from app.database import get_db
-from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, UploadFile
+from app.core.dates import local_today, utc_bounds_of_local_day
+from app.database import get_db, get_read_db
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..dependencies import get_current_user
+from ..dependencies import get_current_user, get_language
 
 router = APIRouter()
 
-# --- Gemini API Configuration ---
-try:
-    if settings.GEMINI_API_KEY:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-except Exception as e:
-    # サーバー起動時にAPIキーがなくてもエラーにならないようにする
-    print(f"Could not configure Gemini API: {e}")
 
+# GET /meals/history の fields で指定できるフィールド
+MEAL_FIELDS = list(getattr(schemas.Meal, "model_fields", None) or schemas.Meal.__fields__)
 
-def get_gemini_model():
-    if not settings.GEMINI_API_KEY:
-        raise HTTPException(status_code=503, detail="Gemini API key is not configured on the server.")
+
+def _encode_cursor(created_at: datetime, meal_id: int) -> str:
+    payload = json.dumps({"t": created_at.isoformat(), "id": meal_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
     try:
-        return genai.GenerativeModel("gemini-2.5-flash")
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Could not initialize Gemini model: {e}")
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(payload["t"]), int(payload["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+def _cache_headers(etag: str) -> dict:
+    # ブラウザにはキャッシュさせるが、使う前に毎回 If-None-Match で確認させる
+    return {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization, Accept-Language"}
+
+
+def _check_not_modified(request: Request, db: Session, user_id: int, *variant) -> tuple[str, Response | None]:
+    """
+    一覧のレスポンスの弱い ETag を、ユーザーのデータのバージョンとレスポンスを変えるもの
+    （URLのクエリ、言語、日付など variant に渡したもの）から作る。
+    If-None-Match と一致すれば、食事記録を読まずに返せる304のレスポンスも返す
+    """
+    version = crud.get_data_version(db, user_id)
+    key = json.dumps([request.url.path, sorted(request.query_params.multi_items()), *map(str, variant)])
+    etag = f'W/"{user_id}-{version}-{hashlib.sha256(key.encode()).hexdigest()[:16]}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # 弱い比較なので W/ を除いて比べる
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if "*" in tags or etag.removeprefix("W/") in tags:
+            return etag, Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=_cache_headers(etag))
+    return etag, None
+
+
+def _localize(meals: list[models.Meal], language: str) -> list[models.Meal]:
+    """
+    レスポンス用に description をリクエストされた言語のものに差し替える（DBには反映しない）
+    """
+    for meal in meals:
+        meal.description = meal.description_for(language)
+    return meals
+
+
+def _localize_items(meal: models.Meal, language: str) -> models.Meal:
+    """
+    _localize に加えて、写真ごとの記録（items）の description も差し替える。items を読み込んだ記録にだけ使う
+    """
+    _localize([meal], language)
+    for item in meal.items:
+        item.description = item.description_for(language)
+    return meal
+
+
+async def _store_uploads(files: list[UploadFile]) -> list[storage.StoredImage]:
+    """
+    アップロードされた写真を並行して保存し、同じ内容の写真を除いて順番どおりに返す。
+    保存できない写真があれば 413 / 415 / 500 にする（保存済みの写真は他の記録と共有している
+    可能性があるので消さず、どこからも参照されなければ reconcile_storage が削除する）
+    """
+    results = await asyncio.gather(*[storage.store_upload(file, is_stored=crud.is_image_stored) for file in files], return_exceptions=True)
+    for result in results:
+        if isinstance(result, storage.UploadTooLarge):
+            raise HTTPException(
+                status_code=413, detail=f"The image is too large (max {settings.MAX_UPLOAD_BYTES} bytes)."
+            )
+        if isinstance(result, storage.UnsupportedImageType):
+            raise HTTPException(status_code=415, detail="Unsupported image type. Please upload a JPEG, PNG, WEBP, GIF or HEIC image.")
+        if isinstance(result, BaseException):
+            raise HTTPException(status_code=500, detail=f"Could not save file: {result}")
+    return list({image.digest: image for image in results}.values())
 
 
 # --- API Endpoints ---
 
 
-@router.post("", response_model=schemas.Meal)
-def create_meal_and_analyze(
+@router.post("", response_model=schemas.MealWithItems, status_code=status.HTTP_202_ACCEPTED)
+async def create_meal_and_analyze(
     meal_type: models.MealType = Form(...),
-    file: UploadFile = File(...),
+    file: list[UploadFile] = File(..., description="食事の写真。複数の料理は file を繰り返して送る"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
-    model: genai.GenerativeModel = Depends(get_gemini_model),
-    accept_language: str | None = Header(None),
+    language: str = Depends(get_language),
 ):
     """
-    食事の写真をアップロードし、カロリーを分析して記録する
+    食事の写真をアップロードし、カロリー分析のジョブを登録する
+    すぐに status が pending の食事記録を返すので、GET /meals/{meal_id} で解析結果を取得する
+    同じ写真の解析結果が既にあれば、Geminiを呼ばずに analyzed の記録を返す
+    未処理のジョブが上限に達している場合は503を返す
+    画像の形式はファイルの内容で判定し、対応していない形式は415、MAX_UPLOAD_BYTES を超える場合は413を返す
+    写真を複数（MEAL_MAX_IMAGES 枚まで）送ると1つの食事記録にまとめ、すべての写真を1回で解析して
+    料理ごとの結果を items、合計を calories に返す
     """
-    # 1. Save the uploaded file
-    upload_dir = Path(settings.UPLOADS_DIR) / str(current_user.id)
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    if len(file) > settings.MEAL_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Too many images (max {settings.MEAL_MAX_IMAGES}).")
+    user_id = current_user.id
+    queued = await run_in_threadpool(crud.count_queued_analysis_jobs, db)
+    metrics.ANALYSIS_QUEUE_DEPTH.set(queued)
+    if queued >= settings.ANALYSIS_QUEUE_LIMIT:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many meals are waiting for analysis. Please retry later.",
+            headers={"Retry-After": str(settings.ANALYSIS_RETRY_AFTER_SECONDS)},
+        )
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    # Sanitize filename to prevent security issues
-    safe_filename = Path(file.filename).name
-    file_path = upload_dir / f"{timestamp}_{safe_filename}"
+    # ファイルの書き込み中にDBコネクションを保持しないよう、いったんプールに返す（セッションは後で再利用できる）
+    await run_in_threadpool(db.close)
 
-    try:
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+    # 1. Save the uploaded files (content-addressed by their SHA-256)
+    images = await _store_uploads(file)
 
-    # 2. Analyze with Gemini
-    try:
-        # Determine language for the response
-        lang = "Japanese"  # Default
-        if accept_language:
-            primary_lang = accept_language.split(",")[0].split(";")[0].lower()
-            if primary_lang.startswith("ja"):
-                lang = "Japanese"
-            elif primary_lang.startswith("en"):
-                lang = "English"
-
-        image_parts = [{"mime_type": file.content_type, "data": file_path.read_bytes()}]
-        prompt = f"""
-        Analyze the food item in the image and estimate its total calories.
-        Respond in JSON format with two keys: 'description' (a brief, one-sentence description of the food in {lang}) and 'calories' (an integer representing the estimated total calories).
-        Example for Japanese: {{\"description\": \"ラーメン一杯と餃子3個\", \"calories\": 850}}
-        Example for English: {{\"description\": \"A bowl of ramen and three gyoza dumplings.\", \"calories\": 850}}
-        """
-        response = model.generate_content([prompt, *image_parts])
-
-        # GeminiのレスポンスからJSONを抽出する
-        # レスポンスが ```json\n...\n``` のようなマークダウン形式で返ってくることがあるため
-        cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-        result = json.loads(cleaned_response)
-        description = result.get("description", "No description provided.")
-        calories = int(result.get("calories", 0))
-
-    except Exception as e:
-        file_path.unlink(missing_ok=True)  # Clean up failed analysis file
-        raise HTTPException(status_code=500, detail=f"Failed to analyze image with Gemini: {e}")
-
-    # 3. Create Meal in DB
-    meal_data = schemas.MealCreate(meal_type=meal_type, description=description, calories=calories)
-    db_meal = crud.create_meal(db=db, meal=meal_data, user_id=current_user.id, image_path=str(file_path))  # Store relative path from inside the container
-
-    return db_meal
+    # 2. Create the Meal (and its analysis job if the images have not been analyzed yet) in DB
+    # DBアクセスは同期処理なのでスレッドプールで実行する
+    if len(images) == 1:
+        image = images[0]
+        db_meal = await run_in_threadpool(
+            crud.create_uploaded_meal,
+            db=db,
+            meal_type=meal_type,
+            user_id=user_id,
+            image_path=str(image.path),  # Store relative path from inside the container
+            thumbnail_path=str(image.thumbnail_path) if image.thumbnail_path else None,
+            image_hash=image.digest,
+            image_size=image.size,
+            mime_type=image.mime_type,
+            language=language,
+        )
+    else:
+        db_meal = await run_in_threadpool(
+            crud.create_uploaded_meal_with_items,
+            db=db,
+            meal_type=meal_type,
+            user_id=user_id,
+            images=images,
+            language=language,
+        )
+    if db_meal.status == models.MealStatus.pending:
+        worker.notify()
 
+    return _localize_items(db_meal, language)
 
 
 @router.get("/today", response_model=list[schemas.Meal])
 def get_today_meals(
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user),
-    model: genai.GenerativeModel = Depends(get_gemini_model),
-    accept_language: str | None = Header(None),
+    language: str = Depends(get_language),
 ):
     """
     今日の食事記録をすべて取得する
-    必要に応じて、食事の概要をリクエストされた言語に翻訳する
+    食事の概要はリクエストされた言語のものを返す
+    変更がなければ If-None-Match に304を返す
     """
-    today = date.today()
-    start_of_day = datetime(today.year, today.month, today.day, 0, 0, 0, tzinfo=timezone.utc)
-    end_of_day = datetime(today.year, today.month, today.day, 23, 59, 59, 999999, tzinfo=timezone.utc)
+    # 「今日」はユーザーのタイムゾーンで判定する
+    today = local_today(current_user.timezone)
+    etag, not_modified = _check_not_modified(request, db, current_user.id, language, today, current_user.timezone)
+    if not_modified:
+        return not_modified
+    start_of_day, end_of_day = utc_bounds_of_local_day(today, current_user.timezone)
 
     meals_from_db = crud.get_meals_by_user_and_date(
         db=db, user_id=current_user.id, start_date=start_of_day, end_date=end_of_day
     )
 
-    # Determine target language
-    target_lang = "English"
-    if accept_language:
-        primary_lang = accept_language.split(",")[0].split(";")[0].lower()
-        if primary_lang.startswith("ja"):
-            target_lang = "Japanese"
-
-    # Only perform translation if the target language is Japanese
-    if target_lang == "Japanese":
-        for meal in meals_from_db:
-            try:
-                # This prompt is idempotent. Translating Japanese text to Japanese will return the original text.
-                prompt = f"Translate the following food description to Japanese. Respond with only the translated text, without any introductory phrases. Description: '{meal.description}'"
-                response = model.generate_content(prompt)
-                
-                # Clean up the response, removing potential markdown or quotes
-                translated_description = response.text.strip().replace("`", "").replace('"', "")
-                
-                meal.description = translated_description
-            except Exception as e:
-                print(f"Warning: Could not translate description for meal {meal.id}: {e}")
-                # If translation fails, we proceed with the original description
-                pass
-
-    return meals_from_db
+    response.headers.update(_cache_headers(etag))
+    return _localize(meals_from_db, language)
 
 
 @router.get("/history", response_model=list[schemas.Meal])
 def get_meal_history(
+    request: Request,
+    limit: int = Query(50, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = Query(None, description="前のページの X-Next-Cursor ヘッダーの値"),
+    from_: datetime | None = Query(None, alias="from", description="この日時以降の記録に絞り込む（タイムゾーンなしはUTC）"),
+    to: datetime | None = Query(None, description="この日時より前の記録に絞り込む（タイムゾーンなしはUTC）"),
+    fields: str | None = Query(None, description="返すフィールドをカンマ区切りで指定する（例: id,calories,created_at）"),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+    language: str = Depends(get_language),
+):
+    """
+    食事記録の履歴を新しい順にページ単位で取得する
+    続きがある場合は X-Next-Cursor ヘッダーに次のページのカーソルを返す
+    食事の概要はリクエストされた言語のものを返す
+    変更がなければ If-None-Match に304を返す
+    """
+    selected = None
+    if fields:
+        # 重複した指定は1つにする（columns の先頭と output_fields を同じ並びに保つため）
+        selected = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+        unknown = set(selected) - set(MEAL_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    etag, not_modified = _check_not_modified(request, db, current_user.id, language)
+    if not_modified:
+        return not_modified
+
+    # 必要な列だけを Row で読み、ORM のオブジェクトや pydantic のモデルを作らずに dict を orjson でエンコードする
+    # （レスポンスは schemas.Meal と同じ形。ページングのカーソルに使う id と created_at は常に読む）
+    output_fields = selected or MEAL_FIELDS
+    columns = list(dict.fromkeys([*output_fields, "id", "created_at"]))
+    localized = "description" in output_fields
+    if localized:
+        columns += ["description_ja", "description_en"]
+
+    rows = crud.get_meal_rows_page(
+        db=db,
+        user_id=current_user.id,
+        limit=limit + 1,
+        columns=columns,
+        before=_decode_cursor(cursor) if cursor else None,
+        start_date=from_,
+        end_date=to,
+    )
+
+    headers = _cache_headers(etag)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        headers["X-Next-Cursor"] = _encode_cursor(last.created_at, last.id)
+
+    # columns の先頭は output_fields と同じ順なので、Row をそのまま zip できる
+    content = [dict(zip(output_fields, row)) for row in rows]
+    if localized:
+        # models.Meal.description_for と同じ
+        for item, row in zip(content, rows):
+            item["description"] = (row.description_ja if language == "ja" else row.description_en) or row.description
+    return metrics.TimedORJSONResponse(content=content, headers=headers)
+
+
+@router.get("/search", response_model=list[schemas.Meal])
+def search_meals(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="検索語（日本語・英語）"),
+    limit: int = Query(50, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=settings.SEARCH_MAX_OFFSET),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+    language: str = Depends(get_language),
+):
+    """
+    食事の概要（日本語・英語）を全文検索し、関連度の高い順に返す
+    続きは offset を limit ずつ増やして取得する
+    変更がなければ If-None-Match に304を返す
+    """
+    etag, not_modified = _check_not_modified(request, db, current_user.id, language)
+    if not_modified:
+        return not_modified
+
+    meals_from_db = crud.search_meals(db, user_id=current_user.id, query=q, limit=limit, offset=offset)
+    response.headers.update(_cache_headers(etag))
+    return _localize(meals_from_db, language)
+
+
+def _bucket_start(day: date, granularity: str) -> date:
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())  # 月曜始まり
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket_start(start: date, granularity: str) -> date:
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+@router.get("/summary", response_model=list[schemas.CalorieSummaryBucket])
+def get_meal_summary(
+    request: Request,
+    response: Response,
+    granularity: str = Query("day", pattern="^(day|week|month)$"),
+    from_: date | None = Query(None, alias="from", description="集計の開始日（ユーザーのタイムゾーン）。省略時は to の30日前"),
+    to: date | None = Query(None, description="集計の終了日（この日を含む）。省略時は今日"),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    日・週・月ごとの摂取カロリーと食事数を集計し、カロリー上限と比較する
+    食事記録ではなく日ごとの集計テーブルを読むので、期間の日数に比例するコストで済む
+    変更がなければ If-None-Match に304を返す
+    """
+    end_day = to or local_today(current_user.timezone)
+    start_day = from_ or end_day - timedelta(days=30)
+    if start_day > end_day:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'.")
+    if (end_day - start_day).days > settings.SUMMARY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"The range must be at most {settings.SUMMARY_MAX_DAYS} days.")
+    limit = current_user.daily_calorie_limit
+    etag, not_modified = _check_not_modified(request, db, current_user.id, start_day, end_day, limit)
+    if not_modified:
+        return not_modified
+
+    daily = {
+        row.day: row
+        for row in crud.get_daily_totals(db, user_id=current_user.id, start_day=start_day, end_day=end_day)
+    }
+
+    buckets = []
+    bucket_start = _bucket_start(start_day, granularity)
+    while bucket_start <= end_day:
+        next_start = _next_bucket_start(bucket_start, granularity)
+        # 期間の両端の週・月は from / to の範囲内の日だけを数える
+        first = max(bucket_start, start_day)
+        last = min(next_start - timedelta(days=1), end_day)
+        total_calories = meal_count = days_over_limit = 0
+        day = first
+        while day <= last:
+            row = daily.get(day)
+            if row is not None:
+                total_calories += row.total_calories
+                meal_count += row.meal_count
+                if row.total_calories > limit:
+                    days_over_limit += 1
+            day += timedelta(days=1)
+        calorie_limit = limit * ((last - first).days + 1)
+        buckets.append(schemas.CalorieSummaryBucket(
+            start=first,
+            end=last,
+            total_calories=total_calories,
+            meal_count=meal_count,
+            calorie_limit=calorie_limit,
+            difference=calorie_limit - total_calories,
+            days_over_limit=days_over_limit,
+        ))
+        bucket_start = next_start
+    response.headers.update(_cache_headers(etag))
+    return buckets
+
+
+def _export_chunks(user_id: int, format: str):
+    # レスポンスを送り終わるまでセッションを保持するため、依存関係のセッションではなく自分で開いて閉じる
+    db = database.ReadSessionLocal()
+    try:
+        if format == "csv":
+            yield meal_io.csv_header()
+        for rows in crud.iter_meals_for_export(
+            db, user_id=user_id, columns=meal_io.EXPORT_COLUMNS, batch_size=settings.EXPORT_BATCH_SIZE
+        ):
+            yield meal_io.encode_rows(rows, format)
+    finally:
+        db.close()
+
+
+@router.get("/export")
+def export_meals(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    すべての食事記録を古い順に NDJSON または CSV でダウンロードする
+    DBから EXPORT_BATCH_SIZE 行ずつ読みながら送るので、件数によらずメモリは一定
+    """
+    return StreamingResponse(
+        _export_chunks(current_user.id, format),
+        media_type=meal_io.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="meals.{format}"'},
+    )
+
+
+@router.get("/{meal_id}", response_model=schemas.MealWithItems)
+async def get_meal(
+    meal_id: int,
+    wait: int = Query(0, ge=0, description="解析が終わるまで最大何秒待つか（ロングポーリング）"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
-    model: genai.GenerativeModel = Depends(get_gemini_model),
-    accept_language: str | None = Header(None),
+    language: str = Depends(get_language),
 ):
     """
-    すべての食事記録を履歴として取得する
-    必要に応じて、食事の概要をリクエストされた言語に翻訳する
-    """
-    meals_from_db = crud.get_all_meals_by_user(db=db, user_id=current_user.id)
-
-    # Determine target language
-    target_lang = "English"
-    if accept_language:
-        primary_lang = accept_language.split(",")[0].split(";")[0].lower()
-        if primary_lang.startswith("ja"):
-            target_lang = "Japanese"
-
-    # Only perform translation if the target language is Japanese
-    if target_lang == "Japanese":
-        for meal in meals_from_db:
-            try:
-                # This prompt is idempotent. Translating Japanese text to Japanese will return the original text.
-                prompt = f"Translate the following food description to Japanese. Respond with only the translated text, without any introductory phrases. Description: '{meal.description}'"
-                response = model.generate_content(prompt)
-                
-                # Clean up the response, removing potential markdown or quotes
-                translated_description = response.text.strip().replace("`", "").replace('"', "")
-                
-                meal.description = translated_description
-            except Exception as e:
-                print(f"Warning: Could not translate description for meal {meal.id}: {e}")
-                # If translation fails, we proceed with the original description
-                pass
-
-    return meals_from_db
+    特定の食事記録を取得する
+    wait を指定すると、status が pending でなくなるか wait 秒経つまで待ってから返す
+    複数の写真で登録した食事では、写真ごとの解析結果を items に返す
+    """
+    user_id = current_user.id
+    deadline = asyncio.get_running_loop().time() + min(wait, settings.MEAL_LONG_POLL_MAX_SECONDS)
+    while True:
+        db_meal = await run_in_threadpool(crud.get_meal, db=db, meal_id=meal_id, user_id=user_id, with_items=True)
+        # 待っている間はDBコネクションを保持しない。閉じることで次の取得では最新の状態を読み込む
+        await run_in_threadpool(db.close)
+        if db_meal is None:
+            raise HTTPException(status_code=404, detail="Meal not found.")
+        if db_meal.status != models.MealStatus.pending or asyncio.get_running_loop().time() >= deadline:
+            return _localize_items(db_meal, language)
+        await asyncio.sleep(settings.ANALYSIS_POLL_INTERVAL_SECONDS)
+
+
+@router.post("/batch", response_model=list[schemas.MealBatchItemResult])
+def apply_meal_batch(
+    batch: schemas.MealBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    language: str = Depends(get_language),
+):
+    """
+    複数の食事記録の削除・更新（食事の種類・カロリー）を1つのトランザクションで行う
+    操作ごとの結果（deleted / updated / not_found / conflict）を操作の順に返す
+    """
+    operations = batch.operations
+    if not operations:
+        raise HTTPException(status_code=400, detail="No operations.")
+    if len(operations) > settings.MEAL_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400, detail=f"Too many operations (max {settings.MEAL_BATCH_MAX_ITEMS})."
+        )
+    if len({operation.meal_id for operation in operations}) != len(operations):
+        raise HTTPException(status_code=400, detail="Each meal can appear only once in a batch.")
+    if any(
+        operation.action == "update" and operation.meal_type is None and operation.calories is None
+        for operation in operations
+    ):
+        raise HTTPException(status_code=400, detail="Update operations need meal_type or calories.")
+
+    results = crud.apply_meal_batch(db, user_id=current_user.id, operations=operations)
+    _localize([result["meal"] for result in results if result.get("meal") is not None], language)
+    return results
+
 
 @router.delete("/{meal_id}", response_model=schemas.Meal)
 def delete_meal_endpoint(
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
+from app.core.dates import is_valid_timezone
 from app.database import get_db
 from ..dependencies import get_current_user
 
@@ -21,7 +22,9 @@ def update_user_me(
     current_user: models.User = Depends(get_current_user)
 ):
     """
-    現在のログインユーザーの情報（カロリー上限）を更新する
+    現在のログインユーザーの情報（カロリー上限・タイムゾーン）を更新する
     """
+    if user_in.timezone is not None and not is_valid_timezone(user_in.timezone):
+        raise HTTPException(status_code=400, detail=f"Unknown timezone: {user_in.timezone}")
     user = crud.update_user(db, db_user=current_user, user_in=user_in)
     return user
@@ -0,0 +1,92 @@
+"""
+既存の食事記録に description_ja / description_en を埋める一回限りのバックフィル。
+
+meal_translations に保存済みの日本語訳があればそれを使い、残りはGeminiでまとめて翻訳する。
+翻訳に失敗した行は空のまま残るので、もう一度実行すれば再試行される。
+
+    python -m app.backfill_descriptions --batch-size 200
+"""
+import argparse
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from . import crud, models
+from .core import search
+from .core.gemini import get_gemini_model
+from .core.translation import description_hash, translate_descriptions
+from .database import SessionLocal
+
+
+def backfill(db: Session, model, batch_size: int = 200, dry_run: bool = False) -> int:
+    """
+    description_ja / description_en が空の行を id 順にバッチで処理し、更新した行数を返す
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.query(
+            models.Meal.id, models.Meal.user_id, models.Meal.description, models.Meal.description_ja,
+            models.Meal.description_en
+        ).filter(
+            models.Meal.id > last_id,
+            models.Meal.description.isnot(None),
+            or_(models.Meal.description_ja.is_(None), models.Meal.description_en.is_(None))
+        ).order_by(models.Meal.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        missing_ja = {row.id: row.description for row in rows if row.description_ja is None}
+        missing_en = {row.id: row.description for row in rows if row.description_en is None}
+
+        # 読み出し時の翻訳で保存済みの日本語訳を再利用する
+        ja = {}
+        for meal_id, row in crud.get_meal_translations(db, list(missing_ja), "ja").items():
+            if row.source_hash == description_hash(missing_ja[meal_id]):
+                ja[meal_id] = row.translated_text
+        ja.update(translate_descriptions(
+            model, {k: v for k, v in missing_ja.items() if k not in ja}, "Japanese"
+        ))
+        en = translate_descriptions(model, missing_en, "English")
+
+        values = []
+        for row in rows:
+            value = {}
+            if row.id in ja:
+                value["description_ja"] = ja[row.id]
+            if row.id in en:
+                value["description_en"] = en[row.id]
+            if value:
+                value["search_terms"] = search.index_terms(
+                    row.user_id, row.description, value.get("description_ja", row.description_ja),
+                    value.get("description_en", row.description_en),
+                )
+                values.append({"id": row.id, **value})
+
+        print(f"meals {rows[0].id}..{last_id}: {len(values)}/{len(rows)} rows filled")
+        if values and not dry_run:
+            # 主キーを含む辞書のリストを渡すと executemany の一括UPDATEになる
+            db.execute(update(models.Meal), values)
+            db.commit()
+        updated += len(values)
+    return updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="translate but do not write to the database")
+    args = parser.parse_args()
+
+    model = get_gemini_model()
+    db = SessionLocal()
+    try:
+        updated = backfill(db, model, batch_size=args.batch_size, dry_run=args.dry_run)
+    finally:
+        db.close()
+    print(f"Backfilled {updated} meals")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import json
+
+from . import metrics
+
+ANALYSIS_PROMPT = """
+Analyze the food item in the image and estimate its total calories.
+Respond in JSON format with three keys: 'description_ja' (a brief, one-sentence description of the food in Japanese), 'description_en' (the same description in English) and 'calories' (an integer representing the estimated total calories).
+Example: {"description_ja": "ラーメン一杯と餃子3個", "description_en": "A bowl of ramen and three gyoza dumplings.", "calories": 850}
+"""
+
+
+MEAL_ANALYSIS_PROMPT = """
+The images numbered below are the dishes of one meal (one image per dish). Analyze each dish and estimate its calories.
+Respond in JSON format with these keys: 'items' (an array with exactly one object per image, in the same order as the images, each with 'description_ja' (a brief, one-sentence description of the dish in Japanese), 'description_en' (the same description in English) and 'calories' (an integer representing the estimated calories of the dish)), 'description_ja' and 'description_en' (a brief, one-sentence description of the whole meal) and 'calories' (the total calories of all dishes).
+Example for two images: {"items": [{"description_ja": "ラーメン一杯", "description_en": "A bowl of ramen.", "calories": 600}, {"description_ja": "餃子3個", "description_en": "Three gyoza dumplings.", "calories": 250}], "description_ja": "ラーメン一杯と餃子3個", "description_en": "A bowl of ramen and three gyoza dumplings.", "calories": 850}
+"""
+
+
+def _load_json(text: str) -> dict:
+    # GeminiのレスポンスからJSONを抽出する
+    # レスポンスが ```json\n...\n``` のようなマークダウン形式で返ってくることがあるため
+    cleaned_response = text.strip().replace("```json", "").replace("```", "")
+    return json.loads(cleaned_response)
+
+
+def _analysis(result: dict) -> dict:
+    return {
+        "description_ja": result.get("description_ja") or result.get("description"),
+        "description_en": result.get("description_en") or result.get("description"),
+        "calories": int(result.get("calories", 0)),
+    }
+
+
+def parse_analysis(text: str) -> dict:
+    """
+    Geminiの解析結果から description_ja / description_en / calories を取り出す
+    """
+    return _analysis(_load_json(text))
+
+
+def combine_analyses(items: list[dict]) -> dict:
+    """
+    料理ごとの解析結果を1つの食事の解析結果にまとめる（calories は合計、description は各料理の description をつなげる）
+    """
+    return {
+        "description_ja": "、".join(item["description_ja"] for item in items if item["description_ja"]) or None,
+        "description_en": "; ".join(item["description_en"] for item in items if item["description_en"]) or None,
+        "calories": sum(item["calories"] for item in items),
+        "items": items,
+    }
+
+
+def parse_meal_analysis(text: str, count: int) -> dict:
+    """
+    複数の写真の解析結果から、食事全体の description_ja / description_en / calories と
+    写真ごとの解析結果（items）を取り出す。calories はモデルが返した合計ではなく items の合計にする
+    """
+    result = _load_json(text)
+    items = [_analysis(item) for item in result.get("items") or []]
+    if len(items) != count:
+        raise ValueError(f"Expected {count} items in the analysis, got {len(items)}")
+    combined = combine_analyses(items)
+    return {
+        **combined,
+        "description_ja": result.get("description_ja") or combined["description_ja"],
+        "description_en": result.get("description_en") or combined["description_en"],
+    }
+
+
+def analyze_image(model, image_bytes: bytes, mime_type: str) -> dict:
+    """
+    食事の画像をGeminiで解析する
+    """
+    image_parts = [{"mime_type": mime_type, "data": image_bytes}]
+    try:
+        with metrics.timed(metrics.MODEL_LATENCY.labels(call="analyze")):
+            response = model.generate_content([ANALYSIS_PROMPT, *image_parts])
+    except Exception:
+        metrics.MODEL_ERRORS.labels(call="analyze").inc()
+        raise
+    try:
+        return parse_analysis(response.text)
+    except Exception:
+        metrics.MODEL_PARSE_FAILURES.labels(call="analyze").inc()
+        raise
+
+
+def analyze_meal_images(model, images: list[tuple[bytes, str]]) -> dict:
+    """
+    1つの食事の複数の写真（(画像のバイト列, MIMEタイプ) のリスト）を、1回のGeminiの呼び出しでまとめて解析する
+    """
+    contents = [MEAL_ANALYSIS_PROMPT]
+    for number, (image_bytes, mime_type) in enumerate(images, start=1):
+        contents += [f"Image {number}:", {"mime_type": mime_type, "data": image_bytes}]
+    try:
+        with metrics.timed(metrics.MODEL_LATENCY.labels(call="analyze_meal")):
+            response = model.generate_content(contents)
+    except Exception:
+        metrics.MODEL_ERRORS.labels(call="analyze_meal").inc()
+        raise
+    try:
+        return parse_meal_analysis(response.text, len(images))
+    except Exception:
+        metrics.MODEL_PARSE_FAILURES.labels(call="analyze_meal").inc()
+        raise
@@ -13,15 +13,119 @@ class Settings:
     SECRET_KEY: str = os.getenv("SECRET_KEY", "a_super_secret_key_that_should_be_changed")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 7 days
+    # 認証済みユーザーをプロセス内にキャッシュする秒数（0 で無効）と最大件数
+    AUTH_CACHE_TTL_SECONDS: float = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "30"))
+    AUTH_CACHE_SIZE: int = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+    # bcrypt のコスト。上げると既存のユーザーは次のログイン時に新しいコストで再ハッシュされる
+    PASSWORD_BCRYPT_ROUNDS: int = int(os.getenv("PASSWORD_BCRYPT_ROUNDS", "12"))
+    # パスワードハッシュ（bcrypt）を実行するプロセス数と、処理待ちの上限。超えたログイン・登録には503を返す
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_QUEUE_LIMIT: int = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", str(PASSWORD_HASH_WORKERS * 8)))
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = int(os.getenv("PASSWORD_HASH_RETRY_AFTER_SECONDS", "2"))
 
     # Gemini API Key
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
+    GEMINI_MODEL_NAME: str = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
+    # APIのクォータ（1分あたりのリクエスト数）と、まとめて送れる数。0 で制限しない
+    GEMINI_REQUESTS_PER_MINUTE: float = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "300"))
+    GEMINI_BURST: int = int(os.getenv("GEMINI_BURST", "10"))
+    # 1回の呼び出し（リトライを含む）の期限
+    GEMINI_TIMEOUT_SECONDS: float = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+    # 429 / 5xx / タイムアウトのリトライ回数（最初の呼び出しを含む）と、バックオフの基準・上限（秒）
+    GEMINI_MAX_ATTEMPTS: int = int(os.getenv("GEMINI_MAX_ATTEMPTS", "3"))
+    GEMINI_RETRY_BASE_SECONDS: float = float(os.getenv("GEMINI_RETRY_BASE_SECONDS", "0.5"))
+    GEMINI_RETRY_MAX_SECONDS: float = float(os.getenv("GEMINI_RETRY_MAX_SECONDS", "8"))
+    # 連続してこの回数失敗したらサーキットブレーカーを開き、クールダウンの間はすぐに失敗させる。0 で無効
+    GEMINI_BREAKER_FAILURES: int = int(os.getenv("GEMINI_BREAKER_FAILURES", "5"))
+    GEMINI_BREAKER_COOLDOWN_SECONDS: float = float(os.getenv("GEMINI_BREAKER_COOLDOWN_SECONDS", "30"))
+    # この秒数以内に応答がなければ同じリクエストをもう1つ送る（ヘッジ）。0 で無効
+    GEMINI_HEDGE_AFTER_SECONDS: float = float(os.getenv("GEMINI_HEDGE_AFTER_SECONDS", "0"))
+    # プロセス内でGeminiに同時に送るリクエストの最大数
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
 
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "mysql+pymysql://user:password@db/app_db")
+    # 読み込み専用のクエリ（履歴・今日の食事・集計）を送るレプリカ。未設定ならプライマリを使う
+    DATABASE_REPLICA_URL: str | None = os.getenv("DATABASE_REPLICA_URL") or None
+    # コネクションプール（エンジンごと）
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT_SECONDS: float = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+    DB_POOL_RECYCLE_SECONDS: int = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    # APIサーバーの起動時（lifespan）にDBスキーマを作成・更新する。
+    # 複数のプロセスで起動する場合は false にして、デプロイ前に python -m app.migrations を実行する
+    DB_MIGRATE_ON_STARTUP: bool = os.getenv("DB_MIGRATE_ON_STARTUP", "true").lower() == "true"
+
+    # Prometheus のメトリクス（GET /metrics）
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
 
     # Uploads
     # コンテナ内のアップロードディレクトリのパス
     UPLOADS_DIR: str = "/app/uploads"
 
+    # ユーザーのタイムゾーンの初期値（日ごとの集計や「今日」の判定に使う）
+    DEFAULT_TIMEZONE: str = os.getenv("DEFAULT_TIMEZONE", "Asia/Tokyo")
+
+    # Meal analysis
+    # 画像解析ジョブを処理するワーカースレッド数（＝同時に実行するGemini呼び出しの上限）
+    ANALYSIS_WORKERS: int = int(os.getenv("ANALYSIS_WORKERS", "4"))
+    # APIサーバーのプロセス内でワーカーを起動するか（別プロセスで python -m app.worker を動かす場合は false）
+    ANALYSIS_WORKER_IN_APP: bool = os.getenv("ANALYSIS_WORKER_IN_APP", "true").lower() == "true"
+    # 未処理ジョブの上限。超えたアップロードには503を返す
+    ANALYSIS_QUEUE_LIMIT: int = int(os.getenv("ANALYSIS_QUEUE_LIMIT", "1000"))
+    # 503を返すときの Retry-After（秒）
+    ANALYSIS_RETRY_AFTER_SECONDS: int = int(os.getenv("ANALYSIS_RETRY_AFTER_SECONDS", "5"))
+    # 失敗したジョブの最大試行回数と、リトライ間隔（秒、試行ごとに2倍）
+    ANALYSIS_MAX_ATTEMPTS: int = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "5"))
+    ANALYSIS_RETRY_BASE_SECONDS: float = float(os.getenv("ANALYSIS_RETRY_BASE_SECONDS", "2"))
+    # running のまま放置されたジョブを再実行するまでの時間（秒）
+    ANALYSIS_JOB_TIMEOUT_SECONDS: int = int(os.getenv("ANALYSIS_JOB_TIMEOUT_SECONDS", "300"))
+    # ジョブがないときのポーリング間隔（秒）
+    ANALYSIS_POLL_INTERVAL_SECONDS: float = float(os.getenv("ANALYSIS_POLL_INTERVAL_SECONDS", "1"))
+    # GET /meals/{id}?wait= のロングポーリングで待てる最大秒数
+    MEAL_LONG_POLL_MAX_SECONDS: int = int(os.getenv("MEAL_LONG_POLL_MAX_SECONDS", "60"))
+    # アップロードをディスクに書き込むときのチャンクサイズ（バイト）
+    UPLOAD_CHUNK_SIZE: int = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    # アップロードできる画像1枚の最大バイト数。リクエストボディは MAX_UPLOAD_BYTES * MEAL_MAX_IMAGES に
+    # MAX_REQUEST_OVERHEAD_BYTES を足したサイズまでしか受け付けない（multipart のヘッダーやフォームの他のフィールドの分）
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    # 1つの食事記録として一度にアップロードできる写真の枚数
+    MEAL_MAX_IMAGES: int = int(os.getenv("MEAL_MAX_IMAGES", "6"))
+    MAX_REQUEST_OVERHEAD_BYTES: int = int(os.getenv("MAX_REQUEST_OVERHEAD_BYTES", str(64 * 1024)))
+    # python -m app.reconcile_storage で、どこからも参照されていないファイルを孤児とみなすまでの時間（秒）
+    STORAGE_ORPHAN_GRACE_SECONDS: float = float(os.getenv("STORAGE_ORPHAN_GRACE_SECONDS", str(24 * 60 * 60)))
+
+    # GET /meals/history の1ページあたりの最大件数
+    HISTORY_MAX_PAGE_SIZE: int = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "500"))
+    # GET /meals/search で指定できる offset の上限（深いページほど検索のコストが大きいため）
+    SEARCH_MAX_OFFSET: int = int(os.getenv("SEARCH_MAX_OFFSET", "1000"))
+    # 検索語に一致した記録のうち、関連度で並べる新しい方からの件数（よく出る語の検索を一定の時間で返すため）
+    SEARCH_RANK_WINDOW: int = int(os.getenv("SEARCH_RANK_WINDOW", "2000"))
+    # POST /meals/batch で1回に操作できる食事記録の最大件数
+    MEAL_BATCH_MAX_ITEMS: int = int(os.getenv("MEAL_BATCH_MAX_ITEMS", "500"))
+    # エクスポートでDBから一度に読む行数と、インポートで1回の INSERT にまとめる行数
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+    # GET /meals/summary で指定できる期間の最大日数
+    SUMMARY_MAX_DAYS: int = int(os.getenv("SUMMARY_MAX_DAYS", "1100"))
+
+    # Image preprocessing
+    # 解析・保存する画像の長辺の最大ピクセル数
+    IMAGE_MAX_EDGE: int = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+    # 再エンコードするフォーマット (JPEG / WEBP) と品質
+    IMAGE_FORMAT: str = os.getenv("IMAGE_FORMAT", "JPEG")
+    IMAGE_QUALITY: int = int(os.getenv("IMAGE_QUALITY", "85"))
+    # 一覧表示用サムネイルの一辺のピクセル数
+    THUMBNAIL_SIZE: int = int(os.getenv("THUMBNAIL_SIZE", "320"))
+
+    # Translation
+    # 1回のプロンプトにまとめて翻訳する description の件数
+    TRANSLATION_BATCH_SIZE: int = int(os.getenv("TRANSLATION_BATCH_SIZE", "40"))
+    # 同時にGeminiへ送る翻訳チャンク数の上限（全リクエスト共通）
+    TRANSLATION_CONCURRENCY: int = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+    # 1チャンクあたりのタイムアウト（秒）
+    TRANSLATION_TIMEOUT_SECONDS: float = float(os.getenv("TRANSLATION_TIMEOUT_SECONDS", "20"))
+
 settings = Settings()
@@ -0,0 +1,46 @@
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+def is_valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+def to_utc_naive(value: datetime) -> datetime:
+    """
+    タイムゾーン付きの日時を、DBと比較できるUTC（タイムゾーンなし）に変換する。
+    タイムゾーンなしの日時はUTCとみなしてそのまま返す
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_date(utc_datetime: datetime, tz_name: str) -> date:
+    """
+    DBに保存された日時（タイムゾーンなしはUTCとみなす）をユーザーのタイムゾーンの日付に変換する
+    """
+    if utc_datetime.tzinfo is None:
+        utc_datetime = utc_datetime.replace(tzinfo=timezone.utc)
+    return utc_datetime.astimezone(ZoneInfo(tz_name)).date()
+
+
+def local_today(tz_name: str) -> date:
+    return datetime.now(ZoneInfo(tz_name)).date()
+
+
+def utc_bounds_of_local_day(day: date, tz_name: str) -> tuple[datetime, datetime]:
+    """
+    ユーザーのタイムゾーンでの1日の始まりと翌日の始まりを、DBと比較できるUTC（タイムゾーンなし）で返す
+    """
+    tz = ZoneInfo(tz_name)
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+    return (
+        start.astimezone(timezone.utc).replace(tzinfo=None),
+        end.astimezone(timezone.utc).replace(tzinfo=None),
+    )
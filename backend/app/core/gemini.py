@@ -0,0 +1,38 @@
+from functools import lru_cache
+
+from fastapi import HTTPException
+
+from .config import settings
+from .model_client import ModelClient
+
+
+@lru_cache(maxsize=1)
+def _model_client() -> ModelClient:
+    # google.generativeai は依存するパッケージが多くインポートに時間がかかるので、最初に使うときに読み込む
+    # （APIサーバーやテストのプロセスの起動時に読み込まない）
+    import google.generativeai as genai
+
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    # レート制限やサーキットブレーカーの状態をプロセス全体で共有するため、1つだけ作る
+    return ModelClient(genai.GenerativeModel(settings.GEMINI_MODEL_NAME))
+
+
+def get_gemini_model():
+    if not settings.GEMINI_API_KEY:
+        raise HTTPException(status_code=503, detail="Gemini API key is not configured on the server.")
+    try:
+        return _model_client()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Could not initialize Gemini model: {e}")
+
+
+def model_status() -> str:
+    """
+    Geminiを使える状態か（readiness 用）。Geminiは呼ばず、SDKも読み込まない。
+    "ok"、"not_configured"（APIキーがない）、"circuit_open"（失敗が続いていて呼び出しを止めている）のいずれか
+    """
+    if not settings.GEMINI_API_KEY:
+        return "not_configured"
+    if _model_client.cache_info().currsize and _model_client().breaker.is_open:
+        return "circuit_open"
+    return "ok"
@@ -0,0 +1,51 @@
+import io
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from .config import settings
+
+# 再エンコード後のフォーマットごとの拡張子とMIMEタイプ
+OUTPUT_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "WEBP": (".webp", "image/webp"),
+}
+
+
+def output_format() -> tuple[str, str, str]:
+    """
+    設定された出力フォーマットの (PILのフォーマット名, 拡張子, MIMEタイプ) を返す
+    """
+    name = settings.IMAGE_FORMAT.upper()
+    if name not in OUTPUT_FORMATS:
+        name = "JPEG"
+    extension, mime_type = OUTPUT_FORMATS[name]
+    return name, extension, mime_type
+
+
+def _encode(image: Image.Image, format_name: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format_name, quality=settings.IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def preprocess_image(src: Path) -> tuple[bytes, bytes]:
+    """
+    解析・保存用に画像を前処理し、(本体, サムネイル) のエンコード済みバイト列を返す。
+
+    - EXIFの向き情報に従って回転し、向き情報は取り除く
+    - 長辺が IMAGE_MAX_EDGE を超える場合は縮小する
+    - IMAGE_FORMAT (JPEG / WEBP) で再エンコードする
+    - 一覧表示用に THUMBNAIL_SIZE の正方形サムネイルを作る
+
+    Pillowで開けない形式（HEICなど）の場合は例外を送出する。
+    """
+    format_name, _, _ = output_format()
+    with Image.open(src) as original:
+        # 縮小しながらデコードしてメモリと時間を節約する（JPEGのみ有効）
+        original.draft("RGB", (settings.IMAGE_MAX_EDGE, settings.IMAGE_MAX_EDGE))
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    image.thumbnail((settings.IMAGE_MAX_EDGE, settings.IMAGE_MAX_EDGE), Image.Resampling.LANCZOS)
+    thumbnail = ImageOps.fit(image, (settings.THUMBNAIL_SIZE, settings.THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+    return _encode(image, format_name), _encode(thumbnail, format_name)
@@ -0,0 +1,84 @@
+"""
+食事記録のエクスポート・インポートの形式（NDJSON / CSV）。
+
+エクスポートは GET /meals/export、インポートは python -m app.import_meals で行う。
+どちらも同じ列（EXPORT_COLUMNS）を使うので、エクスポートしたファイルをそのまま別の環境にインポートできる。
+画像は含まない（インポートした記録は画像なし、image_path は空になる）。
+"""
+import csv
+import enum
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from .. import models
+from .dates import to_utc_naive
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+EXPORT_COLUMNS = [
+    "id", "meal_type", "status", "calories", "description", "description_ja", "description_en", "created_at",
+]
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def encode_rows(rows: Iterable[tuple], format: str) -> str:
+    """
+    EXPORT_COLUMNS の順の行を、format の形式の文字列（行ごとに改行で終わる）にする
+    """
+    if format == "ndjson":
+        return "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_plain, row))), ensure_ascii=False) + "\n" for row in rows
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows([["" if value is None else _plain(value) for value in row] for row in rows])
+    return buffer.getvalue()
+
+
+def csv_header() -> str:
+    return ",".join(EXPORT_COLUMNS) + "\n"
+
+
+def _parse_meal(record: dict) -> dict:
+    # DBにはタイムゾーンなしのUTCで保存する
+    created_at = to_utc_naive(datetime.fromisoformat(record["created_at"]))
+    status = models.MealStatus(record.get("status") or models.MealStatus.analyzed.value)
+    if status == models.MealStatus.pending:
+        # インポートした記録には解析する画像がない
+        status = models.MealStatus.failed
+    return {
+        "meal_type": models.MealType(record["meal_type"]),
+        "calories": int(record.get("calories") or 0),
+        "description": record.get("description") or None,
+        "description_ja": record.get("description_ja") or None,
+        "description_en": record.get("description_en") or None,
+        "status": status,
+        "created_at": created_at,
+    }
+
+
+def read_meals(file: io.TextIOBase, format: str) -> Iterator[dict]:
+    """
+    エクスポートしたファイルを1行ずつ読み、crud.import_meals に渡せる辞書を返す。
+    不正な行は行番号付きの ValueError にする
+    """
+    if format == "ndjson":
+        records = ((number, line) for number, line in enumerate(file, 1) if line.strip())
+    else:
+        records = enumerate(csv.DictReader(file), 2)
+    for number, record in records:
+        try:
+            yield _parse_meal(json.loads(record) if format == "ndjson" else record)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"line {number}: invalid meal record ({e!r})") from e
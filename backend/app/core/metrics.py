@@ -0,0 +1,217 @@
+"""
+Prometheus のメトリクス。GET /metrics で公開する。
+
+ラベルの値は固定の集合（エンドポイント名、ステータスコードのクラス、処理の種類など）だけにして、
+ユーザーIDやURLそのものは入れない（時系列の数が増え続けないように）。
+"""
+import time
+from contextlib import contextmanager
+
+import orjson
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# 数ms のDBクエリから数十秒のGeminiの呼び出しまで測れるバケット
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram(
+    "caloriecam_http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "handler", "status"],
+    buckets=_BUCKETS,
+)
+STAGE_LATENCY = Histogram(
+    "caloriecam_stage_duration_seconds",
+    "Latency of a processing stage (upload_write, image_preprocess, serialization, password_hash, password_hash_queue)",
+    ["stage"],
+    buckets=_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "caloriecam_db_query_duration_seconds",
+    "Database statement latency by statement type",
+    ["statement"],
+    buckets=_BUCKETS,
+)
+MODEL_LATENCY = Histogram(
+    "caloriecam_model_call_duration_seconds",
+    "Gemini call latency by call type",
+    ["call"],
+    buckets=_BUCKETS,
+)
+MODEL_ERRORS = Counter(
+    "caloriecam_model_errors_total",
+    "Gemini calls that raised an error",
+    ["call"],
+)
+MODEL_PARSE_FAILURES = Counter(
+    "caloriecam_model_parse_failures_total",
+    "Gemini responses that could not be parsed",
+    ["call"],
+)
+MODEL_CLIENT_EVENTS = Counter(
+    "caloriecam_model_client_events_total",
+    "Gemini client events (retry, hedge, circuit_open, rate_limited, deadline_exceeded)",
+    ["event"],
+)
+MODEL_CIRCUIT_OPEN = Gauge(
+    "caloriecam_model_circuit_open",
+    "1 while the Gemini circuit breaker is open",
+)
+ANALYSIS_QUEUE_DEPTH = Gauge(
+    "caloriecam_analysis_queue_depth",
+    "Analysis jobs waiting to be processed (updated on upload)",
+)
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    "caloriecam_password_hash_queue_depth",
+    "Password hashes queued or running in the hashing pool",
+)
+FILE_CLEANUP_QUEUE_DEPTH = Gauge(
+    "caloriecam_file_cleanup_queue_depth",
+    "Image files waiting to be deleted by the background cleanup thread",
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "caloriecam_db_pool_connections",
+    "Database connection pool state",
+    ["engine", "state"],
+)
+
+_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+# ラベル付きの子を毎回 labels() で引くと遅いので、値が固定のものは先に作っておく
+_DB_QUERY_CHILDREN = {
+    statement: DB_QUERY_LATENCY.labels(statement=statement)
+    for statement in ("SELECT", "INSERT", "UPDATE", "DELETE", "OTHER")
+}
+_STAGE_CHILDREN: dict = {}
+_MODEL_CLIENT_EVENT_CHILDREN: dict = {}
+
+
+def stage(name: str):
+    """
+    STAGE_LATENCY の stage ラベルの子を返す
+    """
+    child = _STAGE_CHILDREN.get(name)
+    if child is None:
+        child = _STAGE_CHILDREN[name] = STAGE_LATENCY.labels(stage=name)
+    return child
+
+
+def model_client_event(name: str):
+    """
+    MODEL_CLIENT_EVENTS の event ラベルの子を返す
+    """
+    child = _MODEL_CLIENT_EVENT_CHILDREN.get(name)
+    if child is None:
+        child = _MODEL_CLIENT_EVENT_CHILDREN[name] = MODEL_CLIENT_EVENTS.labels(event=name)
+    return child
+
+
+@contextmanager
+def timed(histogram):
+    """
+    with ブロックの処理時間をヒストグラム（ラベル付きの子）に記録する
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start)
+
+
+def handler_label(scope: dict) -> str:
+    # マッチしたルートの名前（エンドポイントの関数名、マウントした静的ファイルなら "uploads"）。
+    # ルーターの prefix を含むパスのテンプレートは FastAPI のバージョンによって取れないため名前を使う
+    route = scope.get("route")
+    return getattr(route, "name", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    リクエストごとのレイテンシを、メソッド・エンドポイント・ステータスコードのクラス（2xx など）ごとに記録する
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def tracking_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tracking_send)
+        finally:
+            REQUEST_LATENCY.labels(
+                method=scope["method"] if scope["method"] in _METHODS else "OTHER", handler=handler_label(scope), status=f"{status_code // 100}xx"
+            ).observe(time.perf_counter() - start)
+
+
+class TimedJSONResponse(JSONResponse):
+    """
+    レスポンスボディのJSONへのエンコードにかかった時間を serialization として記録する
+    """
+
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = super().render(content)
+        stage("serialization").observe(time.perf_counter() - start)
+        return body
+
+
+class TimedORJSONResponse(JSONResponse):
+    """
+    orjson でエンコードする TimedJSONResponse（datetime や Enum はそのまま渡せる）。
+    件数の多い一覧を、pydantic を通さずに dict のリストから直接返すときに使う
+    """
+
+    def render(self, content) -> bytes:
+        start = time.perf_counter()
+        body = orjson.dumps(content)
+        stage("serialization").observe(time.perf_counter() - start)
+        return body
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start_time", None)
+    if start is None:
+        return
+    child = _DB_QUERY_CHILDREN.get(statement[:6].upper()) or _DB_QUERY_CHILDREN["OTHER"]
+    child.observe(time.perf_counter() - start)
+
+
+def instrument_sqlalchemy() -> None:
+    """
+    すべてのエンジン（後から database.configure で作り直したものも含む）のSQLの実行時間を記録する
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def render_latest(
+    pool_status: dict, password_hash_queue_depth: int, file_cleanup_queue_depth: int
+) -> tuple[bytes, str]:
+    """
+    収集時に値を読むゲージを更新してから、テキスト形式のメトリクスを返す
+    """
+    for engine_name, pool in pool_status.items():
+        for state, value in pool.items():
+            DB_POOL_CONNECTIONS.labels(engine=engine_name, state=state).set(value)
+    PASSWORD_HASH_QUEUE_DEPTH.set(password_hash_queue_depth)
+    FILE_CLEANUP_QUEUE_DEPTH.set(file_cleanup_queue_depth)
+    return generate_latest(), CONTENT_TYPE_LATEST
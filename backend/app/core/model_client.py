@@ -0,0 +1,235 @@
+"""
+Geminiの呼び出しをまとめて制御するクライアント。
+
+`genai.GenerativeModel` と同じ `generate_content` を持つラッパーで、プロセス内のすべての呼び出し
+（解析ワーカー・翻訳）で1つのインスタンスを共有する。
+
+- トークンバケットでAPIのクォータ（GEMINI_REQUESTS_PER_MINUTE）を超えないように待たせる
+- 1回の呼び出しごとに期限（GEMINI_TIMEOUT_SECONDS、呼び出し側の request_options の timeout）を設ける
+- 429 / 5xx / タイムアウトはジッター付きの指数バックオフでリトライする
+- 失敗が続いたらサーキットブレーカーを開き、クールダウンの間はGeminiを呼ばずにすぐ失敗させる
+- GEMINI_HEDGE_AFTER_SECONDS を設定すると、その時間内に応答がない場合に同じリクエストをもう1つ送り、
+  先に成功した方を使う（テールレイテンシ対策。クォータに余裕があるときだけ送る）
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import metrics
+from .config import settings
+
+
+class ModelUnavailable(Exception):
+    """
+    Geminiを呼ばずに失敗させた（サーキットブレーカーが開いている、クォータの待ちが期限を超える）
+    """
+
+
+class CircuitOpen(ModelUnavailable):
+    pass
+
+
+class RateLimitTimeout(ModelUnavailable):
+    pass
+
+
+class ModelDeadlineExceeded(TimeoutError):
+    """
+    呼び出しの期限までに応答がなかった
+    """
+
+
+def is_retryable(error: BaseException) -> bool:
+    # google.api_core は grpc を読み込むので、エラーが起きたときに初めてインポートする
+    from google.api_core import exceptions as api_exceptions
+
+    return isinstance(error, (
+        api_exceptions.TooManyRequests,
+        api_exceptions.ResourceExhausted,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.InternalServerError,
+        api_exceptions.GatewayTimeout,
+        api_exceptions.DeadlineExceeded,
+        TimeoutError,
+        ConnectionError,
+    ))
+
+
+class TokenBucket:
+    """
+    スレッドセーフなトークンバケット。rate_per_second が 0 以下なら制限しない
+    """
+
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self, deadline: float) -> None:
+        """
+        トークンを1つ取る。deadline（time.monotonic() の値）までに取れない場合は RateLimitTimeout
+        """
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            if now + wait_seconds > deadline:
+                raise RateLimitTimeout("Gemini request quota is exhausted")
+            time.sleep(wait_seconds)
+
+
+class CircuitBreaker:
+    """
+    連続して failure_threshold 回失敗したら開き、cooldown 秒の間は呼び出しを拒否する。
+    クールダウン後は1回だけ試し（half-open）、成功すれば閉じ、失敗すればまた開く
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_call(self) -> None:
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                metrics.model_client_event("circuit_open").inc()
+                raise CircuitOpen("Gemini is unavailable (circuit breaker is open)")
+            self._trial_in_flight = True
+
+    def cancel_trial(self) -> None:
+        # half-open の試行がGeminiを呼ばずに終わった場合（クォータ待ちのタイムアウト）
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+        metrics.MODEL_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or (self.failure_threshold > 0 and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                metrics.MODEL_CIRCUIT_OPEN.set(1)
+
+
+class ModelClient:
+    def __init__(
+        self,
+        model,
+        requests_per_minute: float = settings.GEMINI_REQUESTS_PER_MINUTE,
+        burst: int = settings.GEMINI_BURST,
+        timeout: float = settings.GEMINI_TIMEOUT_SECONDS,
+        max_attempts: int = settings.GEMINI_MAX_ATTEMPTS,
+        retry_base: float = settings.GEMINI_RETRY_BASE_SECONDS,
+        retry_max: float = settings.GEMINI_RETRY_MAX_SECONDS,
+        breaker_failures: int = settings.GEMINI_BREAKER_FAILURES,
+        breaker_cooldown: float = settings.GEMINI_BREAKER_COOLDOWN_SECONDS,
+        hedge_after: float = settings.GEMINI_HEDGE_AFTER_SECONDS,
+        max_concurrency: int = settings.GEMINI_MAX_CONCURRENCY,
+    ):
+        self.model = model
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.hedge_after = hedge_after
+        self.limiter = TokenBucket(requests_per_minute / 60, burst)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_cooldown)
+        # 期限を過ぎた呼び出しを待たずに戻れるよう、実際の呼び出しはこのプールで行う
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="gemini")
+
+    def generate_content(self, contents, request_options: dict | None = None, **kwargs):
+        request_options = dict(request_options or {})
+        timeout = min(self.timeout, request_options.pop("timeout", self.timeout))
+        deadline = time.monotonic() + timeout
+
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            try:
+                response = self._call_with_hedge(contents, request_options, kwargs, deadline)
+            except ModelUnavailable:
+                metrics.model_client_event("rate_limited").inc()
+                self.breaker.cancel_trial()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # リクエストの内容の問題（400など）はGeminiは応答しているので、障害には数えない
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempt - 1)))
+                if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                    raise
+                metrics.model_client_event("retry").inc()
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return response
+
+    def _invoke(self, contents, request_options: dict, kwargs: dict, deadline: float):
+        remaining = max(0.001, deadline - time.monotonic())
+        return self.model.generate_content(contents, request_options={**request_options, "timeout": remaining}, **kwargs)
+
+    def _call_with_hedge(self, contents, request_options: dict, kwargs: dict, deadline: float):
+        self.limiter.acquire(deadline)
+        pending = {self._executor.submit(self._invoke, contents, request_options, kwargs, deadline)}
+
+        if self.hedge_after > 0:
+            done, _ = wait(pending, timeout=min(self.hedge_after, max(0, deadline - time.monotonic())))
+            # クォータを待ってまでは送らない
+            if not done and self.limiter.try_acquire():
+                metrics.model_client_event("hedge").inc()
+                pending.add(self._executor.submit(self._invoke, contents, request_options, kwargs, deadline))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                metrics.model_client_event("deadline_exceeded").inc()
+                raise ModelDeadlineExceeded("Gemini did not respond before the deadline")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+        raise error
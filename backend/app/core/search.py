@@ -0,0 +1,82 @@
+"""
+食事の概要の全文検索用のトークン化。
+
+meals.search_terms に、description / description_ja / description_en を次のトークンに分けてスペース区切りで保存し、
+MySQL / MariaDB では FULLTEXT インデックス、SQLite では FTS5 のテーブルで検索する。
+
+- 日本語などのCJKの文字列は、2文字ずつ（bigram）と最後の1文字に分ける。
+  MariaDB には MySQL の ngram パーサーがないため、DB側ではなくここで分割する
+- それ以外は単語に分け、小文字にする（英語は前方一致で検索する）
+- 記録のユーザーのトークン（uid<ユーザーID>）を入れ、ユーザーの絞り込みもインデックスで行う
+
+CJKのトークンは文字コードの16進数（"j" + 1文字5桁）にする。DBのパーサーの文字の扱いや
+最小トークン長（InnoDB の innodb_ft_min_token_size = 3）によらず、1つの単語として索引されるようにするため。
+"""
+import re
+import unicodedata
+
+# ひらがな・カタカナ（長音記号を含む）・CJK統合漢字・ハングル
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯"
+_RUN = re.compile(f"([{_CJK}]+)|([^\\W_{_CJK}]+)")
+# InnoDB の FULLTEXT は3文字未満の単語と、この既定のストップワードを索引しない（どのDBでも同じ結果になるよう合わせる）
+_MIN_WORD_LENGTH = 3
+_USER_TOKEN = re.compile(r"uid\d+")
+_STOPWORDS = {
+    "about", "are", "com", "for", "from", "how", "that", "the", "this", "was", "what", "when", "where", "who",
+    "will", "with", "und", "www",
+}
+
+
+def _cjk_token(chars: str) -> str:
+    return "j" + "".join(f"{ord(char):05x}" for char in chars)
+
+
+def _runs(text: str):
+    """
+    (CJKの文字列, それ以外の単語) の組を返す（どちらか一方だけが空でない）
+    """
+    return _RUN.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+def _word(word: str) -> bool:
+    return len(word) >= _MIN_WORD_LENGTH and word not in _STOPWORDS and not _USER_TOKEN.fullmatch(word)
+
+
+def user_token(user_id: int) -> str:
+    return f"uid{user_id}"
+
+
+def index_terms(user_id: int, *texts: str | None) -> str:
+    """
+    search_terms に保存する文字列（ユーザーのトークンと、重複を除いたトークンのスペース区切り）
+    """
+    terms = {user_token(user_id): None}
+    for text in texts:
+        if not text:
+            continue
+        for cjk, word in _runs(text):
+            if cjk:
+                for i in range(len(cjk) - 1):
+                    terms[_cjk_token(cjk[i:i + 2])] = None
+                # 1文字の検索語が最後の文字にも一致するよう、最後の1文字も入れる
+                terms[_cjk_token(cjk[-1])] = None
+            elif _word(word):
+                terms[word] = None
+    return " ".join(terms)
+
+
+def query_terms(query: str) -> list[tuple[str, bool]]:
+    """
+    検索語を (トークン, 前方一致で検索するか) のリストにする。すべてのトークンを含む記録を検索する
+    """
+    terms = {}
+    for cjk, word in _runs(query):
+        if cjk and len(cjk) == 1:
+            # その文字で始まるトークン（bigram と最後の1文字）に前方一致させる
+            terms[_cjk_token(cjk)] = True
+        elif cjk:
+            for i in range(len(cjk) - 1):
+                terms.setdefault(_cjk_token(cjk[i:i + 2]), False)
+        elif _word(word):
+            terms[word] = True
+    return list(terms.items())
@@ -1,10 +1,22 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from . import metrics
 from .config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# PASSWORD_BCRYPT_ROUNDS より低いコストのハッシュは needs_update の対象になり、次のログイン時に再ハッシュする
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -12,6 +24,98 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def _verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    # コストなどの設定が変わっていれば、照合に成功したときに新しい設定でのハッシュも返す
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class HashingPoolFull(Exception):
+    """
+    パスワードハッシュの処理待ちが PASSWORD_HASH_QUEUE_LIMIT に達している
+    """
+
+
+# bcrypt はCPUを長く使うので、リクエストを処理するスレッドではなく専用のプロセスプールで実行する。
+# プールは最初に使うときに作る（ワーカースレッドがいる状態で fork しないよう spawn で起動する）
+_hash_pool: ProcessPoolExecutor | None = None
+_hash_lock = threading.Lock()
+_hash_in_flight = 0
+
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    with _hash_lock:
+        if _hash_pool is None:
+            _hash_pool = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _hash_pool
+
+
+def hashing_queue_depth() -> int:
+    """
+    プールで実行中・実行待ちのパスワードハッシュの件数
+    """
+    return _hash_in_flight
+
+
+def hashing_pool_full() -> bool:
+    """
+    処理待ちが上限に達しているか。DBを読む前に確認して、すぐに503を返すために使う
+    """
+    return _hash_in_flight >= settings.PASSWORD_HASH_QUEUE_LIMIT
+
+
+def _timed_call(fn, *args):
+    # プールのプロセスで実行し、bcrypt にかかった時間も返す（子プロセスのメトリクスは収集されないため）
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+async def _run_in_hash_pool(fn, *args):
+    global _hash_in_flight
+    with _hash_lock:
+        if _hash_in_flight >= settings.PASSWORD_HASH_QUEUE_LIMIT:
+            raise HashingPoolFull()
+        _hash_in_flight += 1
+    try:
+        start = time.perf_counter()
+        result, hash_seconds = await asyncio.wrap_future(_get_hash_pool().submit(_timed_call, fn, *args))
+        metrics.stage("password_hash").observe(hash_seconds)
+        metrics.stage("password_hash_queue").observe(
+            max(0.0, time.perf_counter() - start - hash_seconds)
+        )
+        return result
+    finally:
+        with _hash_lock:
+            _hash_in_flight -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """
+    パスワードをプロセスプールで照合する。(照合結果, 再ハッシュしたパスワード or None) を返す。
+    処理待ちが上限に達している場合は HashingPoolFull を送出する
+    """
+    return await _run_in_hash_pool(_verify_and_update, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    パスワードのハッシュをプロセスプールで計算する。
+    処理待ちが上限に達している場合は HashingPoolFull を送出する
+    """
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    with _hash_lock:
+        pool, _hash_pool = _hash_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
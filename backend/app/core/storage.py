@@ -0,0 +1,272 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import anyio
+from fastapi import UploadFile
+
+from . import metrics
+from .config import settings
+from .images import output_format, preprocess_image
+
+# アップロードされた画像のMIMEタイプと保存時の拡張子
+IMAGE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/heic": ".heic",
+    "image/heif": ".heif",
+}
+
+
+# HEIF系のファイルの ftyp ボックスのブランド
+_HEIC_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis"}
+_HEIF_BRANDS = {b"mif1", b"msf1"}
+
+
+class UploadTooLarge(Exception):
+    """
+    アップロードが MAX_UPLOAD_BYTES を超えた
+    """
+
+
+class UnsupportedImageType(Exception):
+    """
+    アップロードの内容が対応している画像形式ではない
+    """
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """
+    ファイル先頭のマジックバイトから画像のMIMEタイプを判定する。対応していない形式なら None
+    （クライアントが送る Content-Type は信用しない）
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in _HEIC_BRANDS:
+            return "image/heic"
+        if brand in _HEIF_BRANDS:
+            return "image/heif"
+    return None
+
+
+def image_path_for(digest: str, extension: str) -> Path:
+    """
+    内容のハッシュから画像の保存先を決める。
+    1つのディレクトリにファイルが集中しないよう、ハッシュの先頭4文字で2階層に分ける
+    （例: UPLOADS_DIR/ab/cd/abcd....jpg）
+    """
+    return Path(settings.UPLOADS_DIR) / digest[:2] / digest[2:4] / f"{digest}{extension}"
+
+
+class StoredImage:
+    def __init__(self, digest: str, path: Path, size: int, mime_type: str, thumbnail_path: Path | None):
+        self.digest = digest
+        self.path = path
+        self.size = size
+        self.mime_type = mime_type
+        self.thumbnail_path = thumbnail_path
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(settings.UPLOADS_DIR) / "tmp" / f"{uuid.uuid4().hex}.part"
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _touch(*paths: Path) -> None:
+    # 使い回したファイルは、その前に決まった削除のキューで消されないよう更新時刻を今にする
+    for path in paths:
+        if path.exists():
+            os.utime(path)
+
+
+def _store_preprocessed(
+    tmp_path: Path, digest: str, content_type: str, is_stored: Callable[[str], bool] | None
+) -> StoredImage:
+    """
+    一時ファイルの画像を前処理（縮小・再エンコード・サムネイル作成）して保存する。
+    Pillowで扱えない形式の場合は元の画像をそのまま保存する。
+    """
+    _, extension, mime_type = output_format()
+    path = image_path_for(digest, extension)
+    thumbnail_path = image_path_for(digest, f"_thumb{extension}")
+    raw_path = image_path_for(digest, IMAGE_EXTENSIONS.get(content_type, ""))
+
+    # 同じ内容の画像が images に登録済みなら、保存済みのファイルを使い前処理もしない。
+    # 登録がなければファイルが残っていても削除待ちかもしれないので、書き直す（削除のキューは書き直したファイルを消さない）
+    if is_stored is None or is_stored(digest):
+        try:
+            if path.exists():
+                _touch(path, thumbnail_path)
+                tmp_path.unlink()
+                return StoredImage(
+                    digest, path, path.stat().st_size, mime_type, thumbnail_path if thumbnail_path.exists() else None
+                )
+            if raw_path.exists():
+                _touch(raw_path)
+                tmp_path.unlink()
+                return StoredImage(digest, raw_path, raw_path.stat().st_size, content_type, None)
+        except FileNotFoundError:
+            # 確かめた直後に削除された場合は書き直す
+            pass
+
+    try:
+        with metrics.timed(metrics.stage("image_preprocess")):
+            image_bytes, thumbnail_bytes = preprocess_image(tmp_path)
+    except Exception as e:
+        print(f"Warning: Could not preprocess image {digest}, storing it as uploaded: {e}")
+        raw_path.parent.mkdir(parents=True, exist_ok=True)
+        # 同じ内容を同時に保存しても、rename はアトミックなので壊れたファイルにはならない
+        os.replace(tmp_path, raw_path)
+        # 一時ファイルは受信の開始時に作られるので、書き直した時刻にする
+        os.utime(raw_path)
+        return StoredImage(digest, raw_path, raw_path.stat().st_size, content_type, None)
+
+    _write_atomic(thumbnail_path, thumbnail_bytes)
+    _write_atomic(path, image_bytes)
+    tmp_path.unlink()
+    return StoredImage(digest, path, len(image_bytes), mime_type, thumbnail_path)
+
+
+async def store_upload(file: UploadFile, is_stored: Callable[[str], bool] | None = None) -> StoredImage:
+    """
+    アップロードを1回だけ先頭から読み、チャンクごとに次の処理をまとめて行う。
+
+    - 先頭のマジックバイトで画像の形式を判定する（対応していなければ UnsupportedImageType）
+    - 読み込んだバイト数が MAX_UPLOAD_BYTES を超えたら中断する（UploadTooLarge）
+    - SHA-256 を計算しながら一時ファイルに書き込む
+
+    書き終わったら前処理してハッシュで決まる保存先にアトミックに rename する。
+    ハッシュは元の画像の内容から計算するので、同じ写真は前処理せずに既存のファイルを使う。
+    is_stored（ハッシュの画像が images に登録済みか）を渡すと、登録済みの場合だけ既存のファイルを使う。
+    """
+    tmp_dir = anyio.Path(settings.UPLOADS_DIR) / "tmp"
+    await tmp_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = tmp_dir / f"{uuid.uuid4().hex}.part"
+
+    sha256 = hashlib.sha256()
+    size = 0
+    content_type = None
+    try:
+        write_start = time.perf_counter()
+        async with await anyio.open_file(tmp_path, "wb") as buffer:
+            while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+                if content_type is None:
+                    content_type = sniff_image_type(chunk[:16])
+                    if content_type is None:
+                        raise UnsupportedImageType()
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge()
+                sha256.update(chunk)
+                await buffer.write(chunk)
+        if content_type is None:
+            # 空のファイル
+            raise UnsupportedImageType()
+        metrics.stage("upload_write").observe(time.perf_counter() - write_start)
+
+        # 前処理はCPUを使うのでイベントループをブロックしないようスレッドで実行する
+        return await anyio.to_thread.run_sync(
+            _store_preprocessed, Path(tmp_path), sha256.hexdigest(), content_type, is_stored
+        )
+    except BaseException:
+        await tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def remove_image_file(path: str) -> None:
+    """
+    画像ファイルを削除する。失敗してもDBの操作は取り消さない
+    """
+    try:
+        Path(path).unlink(missing_ok=True)
+    except Exception as e:
+        # Log the error, but don't block the operation.
+        # The DB record is already deleted.
+        print(f"Error deleting file {path}: {e}")
+
+
+# 削除の commit の後に消すファイルを、レスポンスを待たせないよう1つのスレッドで順に削除する
+# （プロセスが途中で終了して消せなかったファイルは python -m app.reconcile_storage で孤児として削除される）
+_cleanup_pool: ThreadPoolExecutor | None = None
+_cleanup_lock = threading.Lock()
+_cleanup_pending = 0
+
+
+def _rewritten_since(path: str, since_ns: int) -> bool:
+    try:
+        return os.stat(path).st_mtime_ns > since_ns
+    except FileNotFoundError:
+        return False
+
+
+def _remove_files(
+    paths: list[str], since_ns: int, referenced: Callable[[list[str]], set[str]] | None
+) -> None:
+    global _cleanup_pending
+    try:
+        # 削除を決めた後に同じ画像がアップロードされ、参照されたり書き直されたりしたファイルは消さない
+        keep = referenced(paths) if referenced is not None else set()
+        for path in paths:
+            if path in keep or _rewritten_since(path, since_ns):
+                continue
+            remove_image_file(path)
+    except Exception as e:
+        print(f"Error removing files {paths}: {e}")
+    finally:
+        with _cleanup_lock:
+            _cleanup_pending -= len(paths)
+
+
+def schedule_removal(
+    paths: list[str], since_ns: int, referenced: Callable[[list[str]], set[str]] | None = None
+) -> None:
+    """
+    画像ファイルの削除をバックグラウンドのキューに入れる。DBの commit の後に呼ぶ。
+    since_ns には削除を決めたトランザクションの開始前の時刻（time.time_ns()）を渡す。
+    削除の直前に referenced（パスのうちDBから参照されているものを返す）で確かめ、参照されているファイルと
+    since_ns より後に書き直されたファイルは消さない
+    """
+    global _cleanup_pool, _cleanup_pending
+    paths = [path for path in paths if path]
+    if not paths:
+        return
+    with _cleanup_lock:
+        if _cleanup_pool is None:
+            _cleanup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-cleanup")
+        _cleanup_pending += len(paths)
+        _cleanup_pool.submit(_remove_files, paths, since_ns, referenced)
+
+
+def cleanup_queue_depth() -> int:
+    """
+    削除を待っているファイルの数
+    """
+    return _cleanup_pending
+
+
+def shutdown_cleanup() -> None:
+    """
+    キューに残っているファイルを削除し終えるまで待ってスレッドを止める
+    """
+    global _cleanup_pool
+    with _cleanup_lock:
+        pool, _cleanup_pool = _cleanup_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True)
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from . import metrics
+from .config import settings
+
+
+def description_hash(text: str) -> str:
+    """
+    description のハッシュを返す（同じ文をまとめて翻訳するためと、meal_translations.source_hash との照合に使う）
+    """
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+# 翻訳チャンクを並列に送るためのスレッドプール。
+# プロセス全体で共有し、Geminiへの同時リクエスト数を TRANSLATION_CONCURRENCY に制限する
+_executor = ThreadPoolExecutor(
+    max_workers=max(1, settings.TRANSLATION_CONCURRENCY),
+    thread_name_prefix="translation",
+)
+
+
+def _parse_batch_response(text: str) -> dict[str, str]:
+    # レスポンスが ```json\n...\n``` のようなマークダウン形式で返ってくることがあるため
+    cleaned = text.strip().replace("```json", "").replace("```", "")
+    items = json.loads(cleaned)
+    if not isinstance(items, list):
+        raise ValueError("Batch translation response is not a JSON array")
+    return {
+        str(item["id"]): str(item["text"]).strip()
+        for item in items
+        if isinstance(item, dict) and "id" in item and "text" in item
+    }
+
+
+def _translate_chunk(model, chunk: list[dict], language: str, timeout: float) -> dict[str, str]:
+    prompt = f"""
+    Translate the 'text' of each food description in the following JSON array to {language}.
+    Respond with only a JSON array of objects with the same 'id' and the translated 'text', in the same order.
+    Texts that are already in {language} must be returned unchanged.
+    Input: {json.dumps(chunk, ensure_ascii=False)}
+    """
+    try:
+        with metrics.timed(metrics.MODEL_LATENCY.labels(call="translate")):
+            response = model.generate_content(prompt, request_options={"timeout": timeout})
+    except Exception:
+        metrics.MODEL_ERRORS.labels(call="translate").inc()
+        raise
+    try:
+        return _parse_batch_response(response.text)
+    except Exception:
+        metrics.MODEL_PARSE_FAILURES.labels(call="translate").inc()
+        raise
+
+
+def translate_descriptions(model, texts: dict, language: str) -> dict:
+    """
+    複数の description をまとめて翻訳する。texts は任意のキー -> 翻訳元テキスト。
+
+    同じテキストは1回だけ翻訳し、TRANSLATION_BATCH_SIZE 件ずつJSON配列にまとめた
+    プロンプトをスレッドプールから並列にGeminiへ送る。
+    失敗・タイムアウトしたチャンクのキーは結果に含めない（呼び出し側で原文にフォールバックする）。
+    """
+    # 重複するテキストをまとめる。プロンプト内のIDはトークン節約のため連番にする
+    unique_texts: dict[str, str] = {}
+    for text in texts.values():
+        if text:
+            unique_texts.setdefault(description_hash(text), text)
+    if not unique_texts:
+        return {}
+
+    hashes = list(unique_texts)
+    items = [{"id": str(i), "text": unique_texts[source_hash]} for i, source_hash in enumerate(hashes)]
+    batch_size = max(1, settings.TRANSLATION_BATCH_SIZE)
+    chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+    timeout = settings.TRANSLATION_TIMEOUT_SECONDS
+    futures = {
+        _executor.submit(_translate_chunk, model, chunk, language, timeout): chunk
+        for chunk in chunks
+    }
+    # 同時実行数を超えたチャンクは前のチャンクの完了を待つので、その分だけ待ち時間を延ばす
+    rounds = math.ceil(len(chunks) / max(1, settings.TRANSLATION_CONCURRENCY))
+    done, not_done = wait(futures, timeout=timeout * rounds)
+    for future in not_done:
+        future.cancel()
+        print(f"Warning: Translation chunk of {len(futures[future])} descriptions timed out")
+
+    translated_by_hash: dict[str, str] = {}
+    for future in done:
+        chunk = futures[future]
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Warning: Could not translate chunk of {len(chunk)} descriptions: {e}")
+            continue
+        for item in chunk:
+            text = result.get(item["id"])
+            if text:
+                translated_by_hash[hashes[int(item["id"])]] = text
+
+    return {
+        key: translated_by_hash[description_hash(text)]
+        for key, text in texts.items()
+        if text and description_hash(text) in translated_by_hash
+    }
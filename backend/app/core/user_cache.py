@@ -0,0 +1,84 @@
+"""
+認証済みユーザーのプロセス内キャッシュ。
+
+認証の必要なリクエストのたびに users テーブルを読まないよう、ユーザーID -> (トークンバージョン, 期限, ユーザー)
+を AUTH_CACHE_TTL_SECONDS 秒だけ保持する。キャッシュはプロセスごとなので、別のプロセスでの
+ユーザー情報の変更・トークンの失効は最大で TTL だけ遅れて反映される。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Optional, TypeVar
+
+from .config import settings
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """
+    スレッドセーフな固定サイズのLRUキャッシュ。
+    FastAPIの同期エンドポイントはスレッドプールで実行されるため、ロックで保護する。
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: K) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+# ユーザーID -> (トークンバージョン, 期限（time.monotonic() の値）, ユーザー)
+_cache: LRUCache[int, tuple[int, float, object]] = LRUCache(settings.AUTH_CACHE_SIZE)
+
+
+def get(user_id: int, token_version: int):
+    """
+    キャッシュ済みのユーザーを返す。期限切れやトークンバージョンが違う場合は None
+    """
+    entry = _cache.get(user_id)
+    if entry is None:
+        return None
+    cached_version, expires_at, user = entry
+    if cached_version != token_version or expires_at < time.monotonic():
+        return None
+    return user
+
+
+def put(user_id: int, token_version: int, user) -> None:
+    ttl = settings.AUTH_CACHE_TTL_SECONDS
+    if ttl <= 0:
+        return
+    _cache.set(user_id, (token_version, time.monotonic() + ttl, user))
+
+
+def invalidate(user_id: int) -> None:
+    _cache.delete(user_id)
+
+
+def clear() -> None:
+    _cache.clear()
@@ -1,23 +1,35 @@
-from sqlalchemy.orm import Session
-from datetime import datetime
-from . import models, schemas
+import random
+import time
+from collections import defaultdict
+from sqlalchemy import and_, case, delete, insert, literal, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import Session, load_only, make_transient_to_detached, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from datetime import date, datetime, timedelta
+from . import database, models, schemas
+from .core.config import settings
+from .core import search, user_cache
+from .core.analysis import combine_analyses
+from .core.dates import local_date, to_utc_naive
 from .core.security import get_password_hash
-from pathlib import Path
+from .core.storage import StoredImage, schedule_removal
 
 # --- User CRUD ---
 
 def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    return db.get(models.User, user_id)
 
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, password_hash: str | None = None) -> models.User:
+    hashed_password = password_hash or get_password_hash(user.password)
     db_user = models.User(
         username=user.username,
         password_hash=hashed_password,
-        daily_calorie_limit=user.daily_calorie_limit
+        daily_calorie_limit=user.daily_calorie_limit,
+        timezone=user.timezone or settings.DEFAULT_TIMEZONE
     )
     db.add(db_user)
     db.commit()
@@ -27,25 +39,214 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
 def update_user(db: Session, db_user: models.User, user_in: schemas.UserUpdate) -> models.User:
     if user_in.daily_calorie_limit is not None:
         db_user.daily_calorie_limit = user_in.daily_calorie_limit
+    if user_in.timezone is not None and user_in.timezone != db_user.timezone:
+        db_user.timezone = user_in.timezone
+        # 日付の区切りが変わるので、日ごとの集計を作り直す
+        rebuild_daily_totals(db, db_user)
+    db_user.data_version = models.User.data_version + 1
     db.commit()
+    user_cache.invalidate(db_user.id)
     db.refresh(db_user)
     return db_user
 
+def update_password_hash(db: Session, user_id: int, password_hash: str) -> None:
+    """
+    パスワードのハッシュを置き換える（ハッシュの設定が変わったときのログイン時の再ハッシュ用）
+    """
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.password_hash: password_hash}, synchronize_session=False
+    )
+    db.commit()
+    user_cache.invalidate(user_id)
+
+def revoke_user_tokens(db: Session, db_user: models.User) -> models.User:
+    """
+    ユーザーの発行済みトークンをすべて失効させる
+    """
+    db_user.token_version = models.User.token_version + 1
+    db.commit()
+    user_cache.invalidate(db_user.id)
+    db.refresh(db_user)
+    return db_user
+
+def _bump_data_version(db: Session, user_id: int) -> None:
+    # ユーザーの食事記録が変わったことを記録する（一覧の ETag が変わる）。commit は呼び出し側で行う
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.data_version: models.User.data_version + 1}, synchronize_session=False
+    )
+
+def get_data_version(db: Session, user_id: int) -> int | None:
+    """
+    ユーザーのデータのバージョンを返す（食事記録は読まない）
+    """
+    return db.query(models.User.data_version).filter(models.User.id == user_id).scalar()
+
+def _detached_user(db_user: models.User) -> models.User:
+    # セッションから切り離したコピーを作る（キャッシュしたユーザーがリクエストをまたいで変更されないように）
+    copy = models.User(**{
+        attr.key: getattr(db_user, attr.key) for attr in sa_inspect(models.User).column_attrs
+    })
+    make_transient_to_detached(copy)
+    return copy
+
+def get_authenticated_user(db: Session, user_id: int, token_version: int) -> models.User | None:
+    """
+    トークンのユーザーを返す。トークンが失効している場合は None。
+    キャッシュにあれば SELECT せずにセッションへ登録したインスタンスを返す
+    """
+    cached = user_cache.get(user_id, token_version)
+    if cached is not None:
+        return db.merge(cached, load=False)
+
+    db_user = get_user(db, user_id)
+    if db_user is None or db_user.token_version != token_version:
+        return None
+    user_cache.put(user_id, token_version, _detached_user(db_user))
+    return db_user
+
 # --- Meal CRUD ---
 
 def create_meal(db: Session, meal: schemas.MealCreate, user_id: int, image_path: str) -> models.Meal:
     db_meal = models.Meal(
+        created_at=datetime.utcnow(),
         calories=meal.calories,
         description=meal.description,
+        description_ja=meal.description_ja,
+        description_en=meal.description_en,
+        search_terms=search.index_terms(user_id, meal.description, meal.description_ja, meal.description_en),
         meal_type=meal.meal_type,
         user_id=user_id,
         image_path=image_path
     )
     db.add(db_meal)
+    _add_to_daily_total(db, db_meal, calories=db_meal.calories, meal_count=1)
+    _bump_data_version(db, user_id)
+    db.commit()
+    db.refresh(db_meal)
+    return db_meal
+
+def create_uploaded_meal(
+    db: Session,
+    meal_type: models.MealType,
+    user_id: int,
+    image_path: str,
+    thumbnail_path: str | None,
+    image_hash: str,
+    image_size: int,
+    mime_type: str,
+    language: str
+) -> models.Meal:
+    """
+    アップロードされた画像の食事記録を作成する。
+    同じ画像の解析結果がキャッシュにあればそれを使って analyzed で作成し、
+    なければ pending の食事記録と画像解析ジョブを同じトランザクションで作成する。
+    """
+    _acquire_image(db, image_hash, image_path, thumbnail_path, image_size)
+    cached = get_analysis_result(db, image_hash)
+
+    db_meal = models.Meal(
+        created_at=datetime.utcnow(),
+        calories=0,
+        meal_type=meal_type,
+        user_id=user_id,
+        image_path=image_path,
+        thumbnail_path=thumbnail_path,
+        image_hash=image_hash,
+        status=models.MealStatus.pending
+    )
+    if cached is not None:
+        _apply_analysis(db_meal, cached.as_analysis(), language)
+    db.add(db_meal)
+    db.flush()
+    _add_to_daily_total(db, db_meal, calories=db_meal.calories, meal_count=1)
+    if cached is None:
+        db.add(models.AnalysisJob(
+            meal_id=db_meal.id,
+            status=models.JobStatus.queued,
+            mime_type=mime_type,
+            language=language,
+            next_run_at=datetime.utcnow()
+        ))
+    _bump_data_version(db, user_id)
+    db.commit()
+    db.refresh(db_meal)
+    # 1枚の写真の食事には items がない（レスポンスを作るときに読み込みのクエリを発行しないため）
+    set_committed_value(db_meal, "items", [])
+    return db_meal
+
+def create_uploaded_meal_with_items(
+    db: Session,
+    meal_type: models.MealType,
+    user_id: int,
+    images: list[StoredImage],
+    language: str
+) -> models.Meal:
+    """
+    複数の写真（料理）を1つの食事記録として作成する。写真ごとに meal_items を作り、
+    食事記録の画像は1枚目の写真にする。すべての写真の解析結果がキャッシュにあればそれを合わせて analyzed で作成し、
+    なければ pending の食事記録と、すべての写真を1回で解析するジョブを作成する。
+    """
+    for image in images:
+        _acquire_image(
+            db, image.digest, str(image.path),
+            str(image.thumbnail_path) if image.thumbnail_path else None, image.size
+        )
+
+    first = images[0]
+    db_meal = models.Meal(
+        created_at=datetime.utcnow(),
+        calories=0,
+        meal_type=meal_type,
+        user_id=user_id,
+        image_path=str(first.path),
+        thumbnail_path=str(first.thumbnail_path) if first.thumbnail_path else None,
+        image_hash=first.digest,
+        status=models.MealStatus.pending
+    )
+    db_meal.items = [
+        models.MealItem(
+            position=position,
+            image_path=str(image.path),
+            thumbnail_path=str(image.thumbnail_path) if image.thumbnail_path else None,
+            image_hash=image.digest,
+            mime_type=image.mime_type,
+            calories=0
+        )
+        for position, image in enumerate(images)
+    ]
+    cached = get_cached_analysis(db, db_meal)
+    if cached is not None:
+        _apply_analysis(db_meal, cached, language)
+    db.add(db_meal)
+    db.flush()
+    _add_to_daily_total(db, db_meal, calories=db_meal.calories, meal_count=1)
+    if cached is None:
+        db.add(models.AnalysisJob(
+            meal_id=db_meal.id,
+            status=models.JobStatus.queued,
+            mime_type=first.mime_type,
+            language=language,
+            next_run_at=datetime.utcnow()
+        ))
+    _bump_data_version(db, user_id)
     db.commit()
     db.refresh(db_meal)
+    # レスポンスに items を含めるため、セッションの中で読み込んでおく
+    db_meal.items
     return db_meal
 
+def get_meal(db: Session, meal_id: int, user_id: int, with_items: bool = False) -> models.Meal | None:
+    """
+    with_items=True なら写真ごとの記録（items）も読み込む（セッションを閉じた後にも使えるように）
+    """
+    query = db.query(models.Meal).filter(
+        models.Meal.id == meal_id,
+        models.Meal.user_id == user_id
+    )
+    if with_items:
+        query = query.options(selectinload(models.Meal.items))
+    return query.first()
+
 def get_meals_by_user_and_date(db: Session, user_id: int, start_date: datetime, end_date: datetime):
     return db.query(models.Meal).filter(
         models.Meal.user_id == user_id,
@@ -53,14 +254,77 @@ def get_meals_by_user_and_date(db: Session, user_id: int, start_date: datetime,
         models.Meal.created_at < end_date
     ).order_by(models.Meal.created_at.desc()).all()
 
-def get_all_meals_by_user(db: Session, user_id: int):
-    return db.query(models.Meal).filter(models.Meal.user_id == user_id).order_by(models.Meal.created_at.desc()).all()
+def _meals_page_conditions(
+    user_id: int,
+    before: tuple[datetime, int] | None,
+    start_date: datetime | None,
+    end_date: datetime | None
+) -> list:
+    conditions = [models.Meal.user_id == user_id]
+    # created_at はタイムゾーンなしのUTCで保存しているので、オフセット付きの日時はUTCにしてから比べる
+    if start_date is not None:
+        conditions.append(models.Meal.created_at >= to_utc_naive(start_date))
+    if end_date is not None:
+        conditions.append(models.Meal.created_at < to_utc_naive(end_date))
+    if before is not None:
+        before_created_at, before_id = before
+        # created_at <= :t を先頭に置き、(user_id, created_at) インデックスの範囲スキャンにする
+        conditions += [
+            models.Meal.created_at <= before_created_at,
+            or_(
+                models.Meal.created_at < before_created_at,
+                models.Meal.id < before_id
+            )
+        ]
+    return conditions
+
+def get_meals_page(
+    db: Session,
+    user_id: int,
+    limit: int,
+    before: tuple[datetime, int] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None,
+    columns: list[str] | None = None
+) -> list[models.Meal]:
+    """
+    食事記録を新しい順に最大 limit 件取得する（キーセットページング）。
+    before に前のページの最後の (created_at, id) を渡すと、その続きを返す。
+    columns を指定した場合はその列だけを読み込む（それ以外の属性にはアクセスしないこと）。
+    """
+    query = db.query(models.Meal).filter(*_meals_page_conditions(user_id, before, start_date, end_date))
+    if columns is not None:
+        query = query.options(load_only(
+            *[getattr(models.Meal, column) for column in {*columns, "created_at"}]
+        ))
+    return query.order_by(models.Meal.created_at.desc(), models.Meal.id.desc()).limit(limit).all()
+
+def get_meal_rows_page(
+    db: Session,
+    user_id: int,
+    limit: int,
+    columns: list[str],
+    before: tuple[datetime, int] | None = None,
+    start_date: datetime | None = None,
+    end_date: datetime | None = None
+) -> list:
+    """
+    get_meals_page と同じ条件・順序で、指定した列だけを Row（名前で読めるタプル）で返す。
+    ORM のオブジェクトを作らず identity map にも入れないので、大きな一覧を返すときに使う
+    """
+    return db.execute(
+        select(*[getattr(models.Meal, column) for column in columns])
+        .where(*_meals_page_conditions(user_id, before, start_date, end_date))
+        .order_by(models.Meal.created_at.desc(), models.Meal.id.desc())
+        .limit(limit)
+    ).all()
 
 def delete_meal(db: Session, meal_id: int, user_id: int) -> models.Meal | None:
     """
     Deletes a meal from the database and its associated image file.
     Ensures that a user can only delete their own meals.
     """
+    removal_since = time.time_ns()
     # First, get the meal to ensure it exists and belongs to the user
     db_meal = db.query(models.Meal).filter(
         models.Meal.id == meal_id,
@@ -71,22 +335,605 @@ def delete_meal(db: Session, meal_id: int, user_id: int) -> models.Meal | None:
         return None
 
     # Get the image path before deleting the DB record
-    image_path_str = db_meal.image_path
-    
+    paths_to_remove = [db_meal.image_path]
+    image_hash = db_meal.image_hash
+
+    # 旧バージョンの翻訳キャッシュ（meal_translations）の行も消す。SQLiteでは ON DELETE CASCADE が効かないため
+    db.query(models.MealTranslation).filter(
+        models.MealTranslation.meal_id == meal_id
+    ).delete(synchronize_session=False)
+    db.query(models.AnalysisJob).filter(
+        models.AnalysisJob.meal_id == meal_id
+    ).delete(synchronize_session=False)
+    # 複数の写真の食事なら、写真ごとの画像の参照を外す（1枚目は食事記録の image_hash と同じ）
+    item_hashes = [
+        item_hash for (item_hash,) in db.query(models.MealItem.image_hash).filter(
+            models.MealItem.meal_id == meal_id
+        )
+    ]
+    if item_hashes:
+        db.query(models.MealItem).filter(
+            models.MealItem.meal_id == meal_id
+        ).delete(synchronize_session=False)
+
+    _add_to_daily_total(db, db_meal, calories=-db_meal.calories, meal_count=-1)
+    _bump_data_version(db, user_id)
+
     # Delete the meal record from the database
     db.delete(db_meal)
+    # 同じ画像を参照する記録が残っている間はファイルを消さない
+    if item_hashes:
+        paths_to_remove = _release_images(db, {item_hash: 1 for item_hash in item_hashes})
+    elif image_hash:
+        paths_to_remove = _release_image(db, image_hash)
     db.commit()
 
-    # Delete the associated image file
-    if image_path_str:
-        try:
-            # The image_path is stored as an absolute path within the container
-            file_path = Path(image_path_str)
-            if file_path.exists():
-                file_path.unlink()
-        except Exception as e:
-            # Log the error, but don't block the operation.
-            # The DB record is already deleted.
-            print(f"Error deleting file {image_path_str}: {e}")
-
-    return db_meal
\ No newline at end of file
+    # Delete the associated image files in the background
+    # The image_path is stored as an absolute path within the container
+    schedule_removal(paths_to_remove, removal_since, referenced_image_paths)
+
+    return db_meal
+
+def apply_meal_batch(
+    db: Session, user_id: int, operations: list[schemas.MealBatchOperation]
+) -> list[dict]:
+    """
+    複数の食事記録の削除・更新を1つのトランザクションで行い、操作ごとの結果（schemas.MealBatchItemResult）を操作の順に返す。
+    対象の記録はユーザーのものだけを1回のクエリで読み、削除は1つの DELETE、更新は主キーごとの executemany で行う。
+    画像ファイルは commit の後にバックグラウンドで削除する
+    """
+    removal_since = time.time_ns()
+    owner = db.get(models.User, user_id)
+    owned = {
+        meal.id: meal for meal in db.query(models.Meal).filter(
+            models.Meal.user_id == user_id,
+            models.Meal.id.in_([operation.meal_id for operation in operations])
+        )
+    }
+
+    results = []
+    deleted, updates = [], []
+    day_deltas = defaultdict(lambda: [0, 0])
+    for operation in operations:
+        db_meal = owned.get(operation.meal_id)
+        if db_meal is None:
+            results.append({"meal_id": operation.meal_id, "status": "not_found"})
+            continue
+        day = day_deltas[local_date(db_meal.created_at, owner.timezone)]
+        if operation.action == "delete":
+            deleted.append(db_meal)
+            day[0] -= db_meal.calories
+            day[1] -= 1
+            results.append({"meal_id": db_meal.id, "status": "deleted"})
+            continue
+        if operation.calories is not None and db_meal.status == models.MealStatus.pending:
+            # 解析が終わるとカロリーは解析結果で上書きされる
+            results.append({
+                "meal_id": db_meal.id, "status": "conflict",
+                "detail": "Calories cannot be changed while the meal is being analyzed.",
+            })
+            continue
+        calories = db_meal.calories if operation.calories is None else operation.calories
+        day[0] += calories - db_meal.calories
+        updates.append({"id": db_meal.id, "meal_type": operation.meal_type or db_meal.meal_type, "calories": calories})
+        results.append({"meal_id": db_meal.id, "status": "updated"})
+
+    if not deleted and not updates:
+        return results
+
+    paths_to_remove = []
+    if deleted:
+        deleted_ids = [db_meal.id for db_meal in deleted]
+        # 旧バージョンの翻訳キャッシュ（meal_translations）の行も消す（delete_meal と同じ）
+        db.query(models.MealTranslation).filter(
+            models.MealTranslation.meal_id.in_(deleted_ids)
+        ).delete(synchronize_session=False)
+        db.query(models.AnalysisJob).filter(
+            models.AnalysisJob.meal_id.in_(deleted_ids)
+        ).delete(synchronize_session=False)
+        item_hashes = defaultdict(list)
+        for meal_id, item_hash in db.query(models.MealItem.meal_id, models.MealItem.image_hash).filter(
+            models.MealItem.meal_id.in_(deleted_ids)
+        ):
+            item_hashes[meal_id].append(item_hash)
+        if item_hashes:
+            db.query(models.MealItem).filter(
+                models.MealItem.meal_id.in_(list(item_hashes))
+            ).delete(synchronize_session=False)
+        db.execute(
+            delete(models.Meal).where(models.Meal.user_id == user_id, models.Meal.id.in_(deleted_ids)),
+            execution_options={"synchronize_session": False},
+        )
+        for db_meal in deleted:
+            db.expunge(db_meal)
+        # 同じ画像を参照する記録が残っている間はファイルを消さない
+        image_counts = defaultdict(int)
+        for db_meal in deleted:
+            if db_meal.id in item_hashes:
+                for item_hash in item_hashes[db_meal.id]:
+                    image_counts[item_hash] += 1
+            elif db_meal.image_hash:
+                image_counts[db_meal.image_hash] += 1
+            else:
+                paths_to_remove.append(db_meal.image_path)
+        paths_to_remove += _release_images(db, image_counts)
+    if updates:
+        db.execute(update(models.Meal), updates)
+
+    for day, (calories, meal_count) in day_deltas.items():
+        if calories or meal_count:
+            _add_to_day(db, user_id, day, calories, meal_count)
+    _bump_data_version(db, user_id)
+    db.commit()
+    schedule_removal(paths_to_remove, removal_since, referenced_image_paths)
+
+    # 更新した記録を1回のクエリで読み直す
+    if updates:
+        updated = {
+            meal.id: meal
+            for meal in db.query(models.Meal).filter(models.Meal.id.in_([values["id"] for values in updates]))
+        }
+        for result in results:
+            if result["status"] == "updated":
+                result["meal"] = updated.get(result["meal_id"])
+    return results
+
+def iter_meals_for_export(db: Session, user_id: int, columns: list[str], batch_size: int):
+    """
+    ユーザーの食事記録の指定した列を古い順に読み、batch_size 行ずつのリストで返すジェネレーター。
+    結果はサーバー側のカーソルから batch_size 行ずつ取り出すので、件数によらずメモリは一定になる
+    """
+    query = select(*[getattr(models.Meal, column) for column in columns]).where(
+        models.Meal.user_id == user_id
+    ).order_by(models.Meal.created_at, models.Meal.id).execution_options(yield_per=batch_size)
+    yield from db.execute(query).partitions()
+
+def import_meals(db: Session, db_user: models.User, meals: list[dict]) -> int:
+    """
+    食事記録をまとめて登録する（画像の解析は行わない）。
+    meals は meal_type, calories, description(_ja/_en), status, created_at を持つ辞書のリスト。
+    1回の executemany で INSERT し、日ごとの集計とデータのバージョンも同じトランザクションで更新する
+    """
+    if not meals:
+        return 0
+    totals = defaultdict(lambda: [0, 0])
+    for meal in meals:
+        total = totals[local_date(meal["created_at"], db_user.timezone)]
+        total[0] += meal["calories"]
+        total[1] += 1
+
+    db.execute(insert(models.Meal), [
+        {
+            **meal,
+            "user_id": db_user.id,
+            "image_path": "",
+            "search_terms": search.index_terms(
+                db_user.id, meal["description"], meal["description_ja"], meal["description_en"]
+            ),
+        }
+        for meal in meals
+    ])
+    for day, (calories, meal_count) in totals.items():
+        _add_to_day(db, db_user.id, day, calories, meal_count)
+    _bump_data_version(db, db_user.id)
+    db.commit()
+    return len(meals)
+
+def search_meals(db: Session, user_id: int, query: str, limit: int, offset: int = 0) -> list[models.Meal]:
+    """
+    概要に検索語（のすべてのトークン）を含む食事記録を、関連度の高い順（同じなら新しい順）に返す。
+    よく出る語でも一定の時間で返せるよう、一致した記録のうち新しい SEARCH_RANK_WINDOW 件だけを関連度で並べる。
+    MySQL / MariaDB は FULLTEXT インデックス、SQLite は FTS5 のテーブルを使う。それ以外のDBでは LIKE で探す
+    """
+    terms = search.query_terms(query)
+    if not terms:
+        return []
+    terms.insert(0, (search.user_token(user_id), False))
+    params = {"user_id": user_id, "window": settings.SEARCH_RANK_WINDOW, "limit": limit, "offset": offset}
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        params["match"] = " AND ".join(f'"{token}"' + ("*" if prefix else "") for token, prefix in terms)
+        # rowid の降順はインデックスの順なので、window 件を読んだところで止まる（bm25 もその分だけ計算する）
+        ids = db.execute(text(
+            "SELECT rowid FROM ("
+            "SELECT rowid, bm25(meals_fts) AS score FROM meals_fts WHERE meals_fts MATCH :match"
+            " ORDER BY rowid DESC LIMIT :window"
+            ") ORDER BY score, rowid DESC LIMIT :limit OFFSET :offset"
+        ), params).scalars().all()
+    elif dialect in ("mysql", "mariadb"):
+        params["match"] = " ".join(f"+{token}" + ("*" if prefix else "") for token, prefix in terms)
+        ids = db.execute(text(
+            "SELECT id FROM ("
+            "SELECT id, MATCH(search_terms) AGAINST(:match IN BOOLEAN MODE) AS score FROM meals"
+            " WHERE MATCH(search_terms) AGAINST(:match IN BOOLEAN MODE) AND user_id = :user_id"
+            " ORDER BY id DESC LIMIT :window"
+            ") AS recent ORDER BY score DESC, id DESC LIMIT :limit OFFSET :offset"
+        ), params).scalars().all()
+    else:
+        padded = literal(" ").concat(models.Meal.search_terms).concat(" ")
+        conditions = [padded.like(f"% {token}%" if prefix else f"% {token} %") for token, prefix in terms]
+        ids = db.execute(
+            select(models.Meal.id).where(models.Meal.user_id == user_id, *conditions)
+            .order_by(models.Meal.id.desc()).limit(limit).offset(offset)
+        ).scalars().all()
+    if not ids:
+        return []
+    # ユーザーのトークンは概要の単語とは重ならないが、念のため他のユーザーの記録は返さない
+    # （条件を SQL に入れると user_id のインデックスでユーザーの全件を読むことがあるので、ここで除く）
+    meals = {meal.id: meal for meal in db.query(models.Meal).filter(models.Meal.id.in_(ids))}
+    return [meals[meal_id] for meal_id in ids if meal_id in meals and meals[meal_id].user_id == user_id]
+
+def rebuild_search_terms(db: Session, batch_size: int = 1000) -> None:
+    """
+    すべての食事記録の search_terms を概要から作り直す（全文検索を追加する前の記録用）
+    """
+    last_id = 0
+    while True:
+        rows = db.query(
+            models.Meal.id, models.Meal.user_id, models.Meal.description, models.Meal.description_ja,
+            models.Meal.description_en
+        ).filter(models.Meal.id > last_id).order_by(models.Meal.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        db.execute(update(models.Meal), [
+            {
+                "id": row.id,
+                "search_terms": search.index_terms(row.user_id, row.description, row.description_ja, row.description_en),
+            }
+            for row in rows
+        ])
+        db.commit()
+
+# --- Daily Total CRUD ---
+
+def _add_to_daily_total(db: Session, db_meal: models.Meal, calories: int, meal_count: int) -> None:
+    """
+    食事記録の日付（ユーザーのタイムゾーン）の集計に差分を加える。commit は呼び出し側で行う
+    """
+    owner = db_meal.owner or db.get(models.User, db_meal.user_id)
+    _add_to_day(db, owner.id, local_date(db_meal.created_at, owner.timezone), calories, meal_count)
+
+def _add_to_day(db: Session, user_id: int, day: date, calories: int, meal_count: int) -> None:
+    values = {
+        models.MealDailyTotal.total_calories: models.MealDailyTotal.total_calories + calories,
+        models.MealDailyTotal.meal_count: models.MealDailyTotal.meal_count + meal_count
+    }
+    query = db.query(models.MealDailyTotal).filter(
+        models.MealDailyTotal.user_id == user_id,
+        models.MealDailyTotal.day == day
+    )
+    if query.update(values, synchronize_session=False):
+        return
+    try:
+        with db.begin_nested():
+            db.add(models.MealDailyTotal(
+                user_id=user_id, day=day, total_calories=calories, meal_count=meal_count
+            ))
+    except IntegrityError:
+        # 同じ日の集計行が同時に作成された場合
+        query.update(values, synchronize_session=False)
+
+def rebuild_daily_totals(db: Session, db_user: models.User) -> None:
+    """
+    ユーザーの日ごとの集計を食事記録から作り直す。commit は呼び出し側で行う
+    """
+    db.query(models.MealDailyTotal).filter(
+        models.MealDailyTotal.user_id == db_user.id
+    ).delete(synchronize_session=False)
+
+    totals = defaultdict(lambda: [0, 0])
+    rows = db.query(models.Meal.created_at, models.Meal.calories).filter(
+        models.Meal.user_id == db_user.id
+    ).yield_per(1000)
+    for created_at, calories in rows:
+        total = totals[local_date(created_at, db_user.timezone)]
+        total[0] += calories
+        total[1] += 1
+
+    db.bulk_insert_mappings(models.MealDailyTotal, [
+        {"user_id": db_user.id, "day": day, "total_calories": total_calories, "meal_count": meal_count}
+        for day, (total_calories, meal_count) in totals.items()
+    ])
+
+def get_daily_totals(db: Session, user_id: int, start_day: date, end_day: date) -> list[models.MealDailyTotal]:
+    """
+    start_day から end_day まで（両端を含む）の日ごとの集計を返す。記録のない日は含まれない
+    """
+    return db.query(models.MealDailyTotal).filter(
+        models.MealDailyTotal.user_id == user_id,
+        models.MealDailyTotal.day >= start_day,
+        models.MealDailyTotal.day <= end_day
+    ).order_by(models.MealDailyTotal.day).all()
+
+
+# --- Image CRUD ---
+
+def _acquire_image(db: Session, digest: str, path: str, thumbnail_path: str | None, size: int) -> None:
+    """
+    画像の参照カウントを1つ増やす（初めての画像なら images に登録する）。commit は呼び出し側で行う
+    """
+    updated = db.query(models.Image).filter(models.Image.sha256 == digest).update(
+        {models.Image.ref_count: models.Image.ref_count + 1}, synchronize_session=False
+    )
+    if updated:
+        return
+    try:
+        with db.begin_nested():
+            db.add(models.Image(sha256=digest, path=path, thumbnail_path=thumbnail_path, size=size, ref_count=1))
+    except IntegrityError:
+        # 同じ画像が同時にアップロードされ、先に登録された場合
+        db.query(models.Image).filter(models.Image.sha256 == digest).update(
+            {models.Image.ref_count: models.Image.ref_count + 1}, synchronize_session=False
+        )
+
+def _release_image(db: Session, digest: str) -> list[str]:
+    """
+    画像の参照カウントを1つ減らす。最後の参照だった場合は images から削除し、
+    削除すべきファイル（画像とサムネイル）のパスを返す（ファイルの削除は commit の後に呼び出し側で行う）
+    """
+    return _release_images(db, {digest: 1})
+
+def _release_images(db: Session, counts: dict[str, int]) -> list[str]:
+    """
+    画像ごとに参照カウントを counts の数だけ減らし、参照がなくなった画像の削除すべきファイルのパスを返す
+    """
+    if not counts:
+        return []
+    # 減らす数が同じ画像は1つの UPDATE にまとめる
+    by_count = defaultdict(list)
+    for digest, count in counts.items():
+        by_count[count].append(digest)
+    for count, digests in by_count.items():
+        db.query(models.Image).filter(models.Image.sha256.in_(digests)).update(
+            {models.Image.ref_count: models.Image.ref_count - count}, synchronize_session=False
+        )
+    images = db.query(models.Image).filter(
+        models.Image.sha256.in_(list(counts)),
+        models.Image.ref_count <= 0
+    ).all()
+    if not images:
+        return []
+    db.query(models.Image).filter(
+        models.Image.sha256.in_([image.sha256 for image in images])
+    ).delete(synchronize_session=False)
+    return [path for image in images for path in (image.path, image.thumbnail_path) if path]
+
+def iter_referenced_image_paths(db: Session, batch_size: int = 10000):
+    """
+    食事記録（写真ごとの記録を含む）と images が参照している画像ファイルのパス（サムネイルを含む）を、
+    batch_size 行ずつ読みながら返す
+    """
+    for table_columns in (
+        (models.Meal.image_path, models.Meal.thumbnail_path),
+        (models.MealItem.image_path, models.MealItem.thumbnail_path),
+        (models.Image.path, models.Image.thumbnail_path),
+    ):
+        for rows in db.execute(select(*table_columns).execution_options(yield_per=batch_size)).partitions():
+            for row in rows:
+                yield from (path for path in row if path)
+
+def get_referenced_image_paths(db: Session, paths: list[str]) -> set[str]:
+    """
+    paths のうち、食事記録（写真ごとの記録を含む）または images から参照されているものを返す
+    """
+    referenced = set()
+    for column in (
+        models.Meal.image_path, models.Meal.thumbnail_path,
+        models.MealItem.image_path, models.MealItem.thumbnail_path,
+        models.Image.path, models.Image.thumbnail_path,
+    ):
+        referenced.update(path for (path,) in db.execute(select(column).where(column.in_(paths)).distinct()))
+    return referenced
+
+def referenced_image_paths(paths: list[str]) -> set[str]:
+    """
+    get_referenced_image_paths を新しいセッションで実行する（ファイル削除のスレッドから呼ぶ）
+    """
+    db = database.SessionLocal()
+    try:
+        return get_referenced_image_paths(db, paths)
+    finally:
+        db.close()
+
+def is_image_stored(digest: str) -> bool:
+    """
+    画像が images に登録されているか（アップロードの保存中に新しいセッションで確かめる）
+    """
+    db = database.SessionLocal()
+    try:
+        return db.get(models.Image, digest) is not None
+    finally:
+        db.close()
+
+def get_meal_ids_by_image_path(db: Session, paths: list[str]) -> dict[str, list[int]]:
+    """
+    image_path または thumbnail_path が paths のいずれかである食事記録（写真ごとの記録を含む）の id をパスごとに返す
+    """
+    meal_ids = defaultdict(list)
+    wanted = set(paths)
+    for meal_id_column, image_column, thumbnail_column in (
+        (models.Meal.id, models.Meal.image_path, models.Meal.thumbnail_path),
+        (models.MealItem.meal_id, models.MealItem.image_path, models.MealItem.thumbnail_path),
+    ):
+        rows = db.query(meal_id_column, image_column, thumbnail_column).filter(
+            or_(image_column.in_(paths), thumbnail_column.in_(paths))
+        )
+        for meal_id, image_path, thumbnail_path in rows:
+            for path in (image_path, thumbnail_path):
+                # 複数の写真の食事の1枚目は、食事記録と写真ごとの記録の両方から参照されている
+                if path in wanted and meal_id not in meal_ids[path]:
+                    meal_ids[path].append(meal_id)
+    return dict(meal_ids)
+
+def get_analysis_result(db: Session, image_hash: str) -> models.AnalysisResult | None:
+    return db.get(models.AnalysisResult, image_hash)
+
+def get_cached_analysis(db: Session, db_meal: models.Meal) -> dict | None:
+    """
+    食事記録の画像の解析結果をキャッシュから返す。複数の写真の食事では、すべての写真の結果が
+    キャッシュにある場合だけ、それらを合わせた結果（写真ごとの結果は items）を返す
+    """
+    if db_meal.items:
+        hashes = [item.image_hash for item in db_meal.items]
+        results = {
+            result.image_hash: result for result in db.query(models.AnalysisResult).filter(
+                models.AnalysisResult.image_hash.in_(hashes)
+            )
+        }
+        if any(image_hash not in results for image_hash in hashes):
+            return None
+        return combine_analyses([results[image_hash].as_analysis() for image_hash in hashes])
+    if db_meal.image_hash:
+        cached = get_analysis_result(db, db_meal.image_hash)
+        return cached.as_analysis() if cached is not None else None
+    return None
+
+def _cache_analysis(db: Session, image_hash: str, analysis: dict) -> None:
+    if get_analysis_result(db, image_hash) is not None:
+        return
+    try:
+        with db.begin_nested():
+            db.add(models.AnalysisResult(
+                image_hash=image_hash,
+                description_ja=analysis["description_ja"],
+                description_en=analysis["description_en"],
+                calories=analysis["calories"]
+            ))
+    except IntegrityError:
+        # 同じ画像のジョブが同時に完了した場合
+        pass
+
+
+# --- Analysis Job CRUD ---
+
+def count_queued_analysis_jobs(db: Session) -> int:
+    return db.query(models.AnalysisJob).filter(
+        models.AnalysisJob.status.in_([models.JobStatus.queued, models.JobStatus.running])
+    ).count()
+
+def _claimable_job_condition(now: datetime):
+    # 実行時刻を過ぎた queued のジョブと、ワーカーが落ちて running のまま放置されたジョブ
+    stale_before = now - timedelta(seconds=settings.ANALYSIS_JOB_TIMEOUT_SECONDS)
+    return or_(
+        and_(models.AnalysisJob.status == models.JobStatus.queued, models.AnalysisJob.next_run_at <= now),
+        and_(models.AnalysisJob.status == models.JobStatus.running, models.AnalysisJob.locked_at < stale_before)
+    )
+
+def claim_analysis_job(db: Session) -> models.AnalysisJob | None:
+    """
+    実行可能なジョブを1件取得して running にする。
+    複数のワーカー（プロセス）が同時に取得しても1件のジョブを1つのワーカーだけが処理するよう、
+    条件付きUPDATEの更新件数で取得できたかを判定する（MariaDB・SQLiteの両方で動く）。
+    試行回数は試行が終わったとき（complete / fail）に数えるが、running のまま放置されたジョブは
+    前のワーカーが処理中に落ちたとみなし、取得するときにその試行を数える。
+    """
+    now = datetime.utcnow()
+    candidates = db.query(models.AnalysisJob.id).filter(
+        _claimable_job_condition(now)
+    ).order_by(models.AnalysisJob.next_run_at).limit(10).all()
+
+    for (job_id,) in candidates:
+        claimed = db.query(models.AnalysisJob).filter(
+            models.AnalysisJob.id == job_id,
+            _claimable_job_condition(now)
+        ).update({
+            models.AnalysisJob.status: models.JobStatus.running,
+            models.AnalysisJob.locked_at: now,
+            models.AnalysisJob.attempts: models.AnalysisJob.attempts + case(
+                (models.AnalysisJob.status == models.JobStatus.running, 1), else_=0
+            )
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.get(models.AnalysisJob, job_id)
+    return None
+
+def _apply_analysis(db_meal: models.Meal, analysis: dict, language: str) -> None:
+    """
+    解析結果を食事記録に反映する。複数の写真の食事では、写真ごとの結果（analysis["items"]）を items に反映し、
+    料理ごとの description も検索できるようにする
+    """
+    items = analysis.get("items", [])
+    for db_item, item in zip(db_meal.items if items else [], items):
+        db_item.description_ja = item["description_ja"]
+        db_item.description_en = item["description_en"]
+        db_item.description = item["description_ja"] if language == "ja" else item["description_en"]
+        db_item.calories = item["calories"]
+    db_meal.description_ja = analysis["description_ja"]
+    db_meal.description_en = analysis["description_en"]
+    db_meal.description = (
+        analysis["description_ja"] if language == "ja" else analysis["description_en"]
+    ) or "No description provided."
+    db_meal.search_terms = search.index_terms(
+        db_meal.user_id, db_meal.description, db_meal.description_ja, db_meal.description_en,
+        *[text for item in items for text in (item["description_ja"], item["description_en"])]
+    )
+    db_meal.calories = analysis["calories"]
+    db_meal.status = models.MealStatus.analyzed
+
+def complete_analysis_job(db: Session, job: models.AnalysisJob, analysis: dict) -> models.Meal:
+    """
+    解析結果を食事記録に保存し、ジョブを完了にする。結果は画像のハッシュをキーにキャッシュする
+    （複数の写真の食事では、食事全体ではなく写真ごとの結果をそれぞれの画像のハッシュでキャッシュする）
+    """
+    db_meal = job.meal
+    previous_calories = db_meal.calories
+    _apply_analysis(db_meal, analysis, job.language)
+    _add_to_daily_total(db, db_meal, calories=db_meal.calories - previous_calories, meal_count=0)
+    _bump_data_version(db, db_meal.user_id)
+    if analysis.get("items"):
+        for db_item, item in zip(db_meal.items, analysis["items"]):
+            _cache_analysis(db, db_item.image_hash, item)
+    elif db_meal.image_hash:
+        _cache_analysis(db, db_meal.image_hash, analysis)
+    job.status = models.JobStatus.done
+    job.attempts += 1
+    job.locked_at = None
+    job.last_error = None
+    db.commit()
+    return db_meal
+
+def fail_analysis_job(db: Session, job: models.AnalysisJob, error: str) -> None:
+    """
+    失敗したジョブを指数バックオフ（ジッター付き）で再スケジュールする。
+    最大試行回数に達した場合はジョブと食事記録を failed にする（画像は削除しない）。
+    """
+    job.attempts += 1
+    job.last_error = error
+    job.locked_at = None
+    if job.attempts >= settings.ANALYSIS_MAX_ATTEMPTS:
+        job.status = models.JobStatus.failed
+        job.meal.status = models.MealStatus.failed
+        _bump_data_version(db, job.meal.user_id)
+    else:
+        delay = settings.ANALYSIS_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+        job.status = models.JobStatus.queued
+        job.next_run_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+    db.commit()
+
+def postpone_analysis_job(db: Session, job: models.AnalysisJob, error: str, delay: float) -> None:
+    """
+    Geminiを呼べなかった（サーキットブレーカーが開いている、クォータ待ちが期限を超えた）ジョブを、
+    試行回数に数えずに delay 秒（ジッター付き）後に再スケジュールする。障害が長引いても failed にしないため
+    """
+    job.last_error = error
+    job.locked_at = None
+    job.status = models.JobStatus.queued
+    job.next_run_at = datetime.utcnow() + timedelta(seconds=delay * random.uniform(1.0, 1.2))
+    db.commit()
+
+
+# --- Legacy Translation CRUD ---
+
+def get_meal_translations(db: Session, meal_ids: list[int], language: str) -> dict[int, models.MealTranslation]:
+    """
+    指定した食事記録の旧バージョンの翻訳キャッシュを meal_id をキーにした辞書で返す（backfill_descriptions 用）
+    """
+    if not meal_ids:
+        return {}
+    rows = db.query(models.MealTranslation).filter(
+        models.MealTranslation.meal_id.in_(meal_ids),
+        models.MealTranslation.language == language
+    ).all()
+    return {row.meal_id: row for row in rows}
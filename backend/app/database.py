@@ -1,19 +1,100 @@
-import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 
-# docker-compose.ymlで設定する環境変数を参照するのが望ましい
-# DATABASE_URL = os.getenv("DATABASE_URL", "mysql+pymysql://user:password@db/app_db")
-# 現段階では直接記述しておく
-DATABASE_URL = "mysql+pymysql://user:password@db/app_db"
+from .core.config import settings
 
-engine = create_engine(DATABASE_URL)
+
+def create_db_engine(url: str) -> Engine:
+    """
+    設定のコネクションプールのパラメータでエンジンを作る。
+    SQLite（ローカルでの開発・ベンチマーク用）の場合はスレッドをまたいでコネクションを使えるようにする
+    """
+    if url.startswith("sqlite"):
+        if url in ("sqlite://", "sqlite:///:memory:"):
+            # インメモリDBはコネクションごとに別のDBになるので、1つのコネクションを共有する
+            return create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        return create_engine(
+            url,
+            connect_args={"check_same_thread": False},
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        )
+    return create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        # MySQL の wait_timeout で切られたコネクションを使わないよう、定期的に作り直す
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+
+
+# 書き込み用（プライマリ）のエンジン
+engine = create_db_engine(settings.DATABASE_URL)
+# 読み込み専用のクエリに使うエンジン。DATABASE_REPLICA_URL が未設定ならプライマリと同じ
+replica_engine = create_db_engine(settings.DATABASE_REPLICA_URL) if settings.DATABASE_REPLICA_URL else engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
 
 Base = declarative_base()
 
+
+def configure(url: str, replica_url: str | None = None) -> None:
+    """
+    エンジンを作り直してセッションの接続先を切り替える（テスト・ベンチマーク・ローカルでの確認用）
+    """
+    global engine, replica_engine
+    settings.DATABASE_URL = url
+    settings.DATABASE_REPLICA_URL = replica_url
+    engine = create_db_engine(url)
+    replica_engine = create_db_engine(replica_url) if replica_url else engine
+    SessionLocal.configure(bind=engine)
+    ReadSessionLocal.configure(bind=replica_engine)
+
+
+def pool_status() -> dict:
+    """
+    コネクションプールの状態（プールのサイズ、貸し出し中・待機中のコネクション数、オーバーフロー数）
+    """
+    engines = {"primary": engine}
+    if replica_engine is not engine:
+        engines["replica"] = replica_engine
+    status = {}
+    for name, db_engine in engines.items():
+        pool = db_engine.pool
+        status[name] = {
+            "size": pool.size() if hasattr(pool, "size") else 1,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else 0,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else 0,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else 0,
+        }
+    return status
+
+
+def ping() -> dict:
+    """
+    プライマリ（と、設定されていればレプリカ）に接続して SELECT 1 を実行し、エンジンごとに "ok" かエラーを返す
+    """
+    engines = {"primary": engine}
+    if replica_engine is not engine:
+        engines["replica"] = replica_engine
+    results = {}
+    for name, db_engine in engines.items():
+        try:
+            with db_engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            results[name] = "ok"
+        except Exception as e:
+            results[name] = f"error: {type(e).__name__}"
+    return results
+
+
 # Dependency to get the DB session
 def get_db():
     db = SessionLocal()
@@ -21,3 +102,15 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """
+    読み込み専用のエンドポイント用のセッション（レプリカがあればレプリカに接続する）。
+    レプリカは遅延することがあるので、書き込み直後の状態を読む必要があるところでは get_db を使う
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,61 @@
+"""
+GET /meals/export でエクスポートしたファイル（NDJSON / CSV）を、指定したユーザーの食事記録としてインポートする。
+
+画像の解析（Gemini）は行わず、カロリーと概要はファイルの値をそのまま使う。
+IMPORT_BATCH_SIZE 行ごとに1回の executemany の INSERT と commit を行うので、途中で失敗した場合は
+それまでのバッチは登録済みになる（表示される行数以降のファイルで再実行する）。
+
+    python -m app.import_meals --username alice meals.ndjson
+    python -m app.import_meals --username alice --format csv meals.csv
+"""
+import argparse
+import time
+from itertools import islice
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .core import meal_io
+from .core.config import settings
+from .database import SessionLocal
+
+
+def import_file(db: Session, username: str, path: str, format: str, batch_size: int = settings.IMPORT_BATCH_SIZE) -> int:
+    """
+    ファイルの食事記録を batch_size 行ずつ登録し、登録した行数を返す
+    """
+    db_user = crud.get_user_by_username(db, username=username)
+    if db_user is None:
+        raise SystemExit(f"User not found: {username}")
+
+    imported = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        meals = meal_io.read_meals(f, format)
+        try:
+            while batch := list(islice(meals, batch_size)):
+                imported += crud.import_meals(db, db_user, batch)
+        except ValueError as e:
+            raise SystemExit(f"{e} ({imported} meals were imported before this error)")
+    return imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--format", choices=sorted(meal_io.FORMATS), help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        imported = import_file(db, args.username, args.path, format, batch_size=args.batch_size)
+    finally:
+        db.close()
+    print(f"Imported {imported} meals in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
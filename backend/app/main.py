@@ -1,20 +1,57 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.middleware.cors import CORSMiddleware
 import os
 
 from .api.v1.api import api_router
+from .core import metrics, security, storage
 from .core.config import settings
-from .database import Base, engine
+from .core.gemini import get_gemini_model, model_status
+from . import database
+from .middleware import BodySizeLimitMiddleware
+from .migrations import upgrade
+from .worker import AnalysisWorker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # モデルの定義に合わせてDBテーブルを作成・更新する。インポート時にはDBに接続しない
+    # （複数のプロセスで起動する場合は DB_MIGRATE_ON_STARTUP=false にして、
+    # デプロイ前に python -m app.migrations を1回だけ実行する）
+    if settings.DB_MIGRATE_ON_STARTUP:
+        await run_in_threadpool(upgrade, database.engine)
+    # 画像解析ジョブのワーカーをプロセス内で起動する
+    # dependency_overrides でモデルを差し替えた場合はワーカーも同じモデルを使う
+    analysis_worker = None
+    if settings.ANALYSIS_WORKER_IN_APP:
+        analysis_worker = AnalysisWorker(
+            model_factory=lambda: app.dependency_overrides.get(get_gemini_model, get_gemini_model)()
+        )
+        analysis_worker.start()
+    yield
+    if analysis_worker:
+        analysis_worker.stop(timeout=5)
+    security.shutdown_hash_pool()
+    storage.shutdown_cleanup()
 
-# アプリケーション起動時に、定義したモデルに基づいてDBテーブルを作成する
-# 本番環境ではAlembicなどのマイグレーションツールを使うのが一般的
-Base.metadata.create_all(bind=engine)
 
 # FastAPIアプリケーションインスタンスを作成
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
+    default_response_class=metrics.TimedJSONResponse,
+)
+
+# 上限を超えるアップロードは受信の途中で打ち切る
+# （後から追加したミドルウェアが外側になるので、413のレスポンスにもCORSのヘッダーが付く）
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_bytes=settings.MAX_UPLOAD_BYTES * settings.MEAL_MAX_IMAGES + settings.MAX_REQUEST_OVERHEAD_BYTES,
 )
 
 # CORS (Cross-Origin Resource Sharing) の設定
@@ -25,15 +62,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],  # 履歴のページング・条件付きGETでフロントエンドから読めるようにする
 )
 
+class ImmutableStaticFiles(StaticFiles):
+    """
+    画像のファイル名は内容のハッシュで、同じURLの内容が変わることはないので、ブラウザやCDNに期限なしでキャッシュさせる。
+    コンテンツアドレス方式になる前の記録のファイル（<user_id>/<アップロード日時（秒）>_<元のファイル名>）も、
+    今は新しく書き込まれることがないので同じように扱う
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+
+# リクエストごとのレイテンシとSQLの実行時間を記録する（一番外側で測るよう最後に追加する）
+if settings.METRICS_ENABLED:
+    metrics.instrument_sqlalchemy()
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # APIルーターをアプリケーションに登録
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 # アップロードされた画像ファイルを配信するための静的ファイルルート
 # /uploads というパスでアクセスされた場合に、UPLOADS_DIR ディレクトリの内容を返す
 os.makedirs(settings.UPLOADS_DIR, exist_ok=True)
-app.mount(f"/{os.path.basename(settings.UPLOADS_DIR)}", StaticFiles(directory=settings.UPLOADS_DIR), name="uploads")
+app.mount(f"/{os.path.basename(settings.UPLOADS_DIR)}", ImmutableStaticFiles(directory=settings.UPLOADS_DIR), name="uploads")
 
 
 @app.get("/", tags=["Root"])
@@ -42,3 +98,45 @@ def read_root():
     ルートエンドポイント。APIの生存確認に利用できる。
     """
     return {"message": f"Welcome to {settings.PROJECT_NAME}"}
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def read_metrics():
+        """
+        Prometheus のテキスト形式のメトリクス
+        """
+        body, content_type = metrics.render_latest(
+            database.pool_status(), security.hashing_queue_depth(), storage.cleanup_queue_depth()
+        )
+        return Response(content=body, media_type=content_type)
+
+
+@app.get("/health/live", tags=["Root"])
+def read_liveness():
+    """
+    プロセスが起動していれば200を返す（DBやGeminiには接続しない）
+    """
+    return {"status": "ok"}
+
+
+@app.get("/health/ready", tags=["Root"])
+def read_readiness():
+    """
+    リクエストを処理できる状態か。DB（プライマリと、設定されていればレプリカ）に接続でき、
+    Geminiを使える状態なら200、そうでなければ503を返す（Geminiへのリクエストは送らない）
+    """
+    checks = {**database.ping(), "model": model_status()}
+    ready = all(result == "ok" for result in checks.values())
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ok" if ready else "unavailable", "checks": checks},
+    )
+
+
+@app.get("/health/db", tags=["Root"])
+def read_db_pool_status():
+    """
+    DBのコネクションプールの状態を返す（プライマリと、設定されていればレプリカ）
+    """
+    return database.pool_status()
@@ -0,0 +1,66 @@
+import json
+
+from starlette.exceptions import HTTPException
+
+
+class _BodyTooLarge(HTTPException):
+    # HTTPException にしておくと、フォームの解析中に送出されてもFastAPIが400に変換せず413のまま返す
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Request body is too large (max {max_bytes} bytes).")
+
+
+class BodySizeLimitMiddleware:
+    """
+    リクエストボディのサイズを制限するASGIミドルウェア。
+
+    Content-Length が上限を超えていればボディを読まずに413を返す。
+    Content-Length がない（chunked の）場合も、受信したバイト数が上限を超えた時点で受信を打ち切る。
+    multipart のパーサーが上限を超えるアップロードを一時ファイルに書き込み続けないようにするため。
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._send_413(send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise _BodyTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            if not response_started:
+                await self._send_413(send)
+
+    async def _send_413(self, send):
+        body = json.dumps({"detail": _BodyTooLarge(self.max_bytes).detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,76 @@
+"""
+DBスキーマの作成・更新。APIサーバーの起動時（DB_MIGRATE_ON_STARTUP=true）に実行されるほか、単体でも実行できる。
+
+    python -m app.migrations
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from .database import Base
+from . import crud, database, models
+
+
+def _column_ddl(column, dialect) -> str:
+    ddl = f"{column.name} {column.type.compile(dialect=dialect)}"
+    default = column.server_default
+    if default is not None:
+        arg = default.arg
+        ddl += f" DEFAULT {arg.text if isinstance(arg, TextClause) else repr(str(arg))}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    return ddl
+
+
+def upgrade(engine: Engine) -> None:
+    """
+    モデル定義に合わせてDBスキーマを更新する。
+    create_all は既存テーブルに列やインデックスを追加しないため、足りない列は ALTER TABLE で、
+    足りないインデックスは CREATE INDEX で追加する。
+    （追加する列は NULL 許可かデフォルト値付きであること）
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    added_columns = set()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {_column_ddl(column, engine.dialect)}"))
+                    added_columns.add(f"{table.name}.{column.name}")
+
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+
+    # 集計テーブルを新しく作った場合は、既存の食事記録から集計する
+    if models.MealDailyTotal.__tablename__ not in existing_tables:
+        with Session(bind=engine) as db:
+            for db_user in db.query(models.User).all():
+                crud.rebuild_daily_totals(db, db_user)
+            db.commit()
+
+    # 全文検索の列を追加した場合は、既存の食事記録の概要から作る
+    if "meals.search_terms" in added_columns:
+        with Session(bind=engine) as db:
+            crud.rebuild_search_terms(db)
+    # SQLite の FTS5 テーブルは、既存の meals テーブルには create_all で作られないのでここで作る
+    if engine.dialect.name == "sqlite" and "meals_fts" not in existing_tables:
+        with engine.begin() as conn:
+            for statement in models.MEALS_FTS_DDL:
+                conn.execute(text(statement))
+            conn.execute(text("INSERT INTO meals_fts(meals_fts) VALUES ('rebuild')"))
+
+
+def main() -> None:
+    upgrade(database.engine)
+    print("Database schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Enum
+from sqlalchemy import DDL, Column, Integer, String, ForeignKey, Date, DateTime, Text, Enum, Index, UniqueConstraint, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from .core.config import settings
 from .database import Base
 import enum as py_enum
 
@@ -9,6 +10,17 @@ class MealType(py_enum.Enum):
     lunch = "lunch"
     dinner = "dinner"
 
+class MealStatus(py_enum.Enum):
+    pending = "pending"
+    analyzed = "analyzed"
+    failed = "failed"
+
+class JobStatus(py_enum.Enum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -16,19 +28,178 @@ class User(Base):
     username = Column(String(255), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     daily_calorie_limit = Column(Integer, nullable=False, server_default="2000")
+    # IANAのタイムゾーン名（例: Asia/Tokyo）。日ごとの集計はこのタイムゾーンの日付で行う
+    timezone = Column(String(64), nullable=False, server_default=settings.DEFAULT_TIMEZONE)
+    # 発行済みのトークンを失効させるたびに増やす。トークンの "ver" と一致しなければ認証しない
+    token_version = Column(Integer, nullable=False, server_default="0")
+    # 食事記録やユーザー設定が変わるたびに増やす。一覧のレスポンスの ETag に使う
+    data_version = Column(Integer, nullable=False, server_default="0")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     meals = relationship("Meal", back_populates="owner")
 
 class Meal(Base):
     __tablename__ = "meals"
+    __table_args__ = (
+        # ユーザーごとの日付範囲・ページングの検索をインデックスの範囲スキャンにする
+        Index("ix_meals_user_id_created_at", "user_id", "created_at"),
+        # GET /meals/search 用の全文検索インデックス（SQLite では代わりに FTS5 の meals_fts を使う）
+        Index("ix_meals_search_terms", "search_terms", mysql_prefix="FULLTEXT").ddl_if(dialect=("mysql", "mariadb")),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     meal_type = Column(Enum(MealType), nullable=False)
     image_path = Column(String(255), nullable=False)
+    # 画像内容の SHA-256（images.sha256）。コンテンツアドレス方式になる前の記録は NULL
+    image_hash = Column(String(64), nullable=True, index=True)
+    # 一覧表示用のサムネイル。前処理できなかった画像や古い記録は NULL
+    thumbnail_path = Column(String(255), nullable=True)
     calories = Column(Integer, nullable=False)
     description = Column(Text, nullable=True)
+    # 解析時に日本語・英語の両方で保存する。読み出し時に翻訳しないため
+    description_ja = Column(Text, nullable=True)
+    description_en = Column(Text, nullable=True)
+    # 全文検索用に description / description_ja / description_en をトークンに分けたもの（core.search.index_terms）
+    search_terms = Column(Text, nullable=True)
+    # 画像解析はバックグラウンドで行うため、解析が終わるまでは pending（calories は 0）
+    status = Column(Enum(MealStatus), nullable=False, server_default=MealStatus.analyzed.value)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     owner = relationship("User", back_populates="meals")
+    # 複数の写真で登録した食事の、写真（料理）ごとの記録。1枚の写真の食事では空
+    items = relationship("MealItem", back_populates="meal", order_by="MealItem.position", passive_deletes=True)
+
+    def description_for(self, language: str) -> str | None:
+        """
+        指定した言語 ("ja" / "en") の description を返す。未設定なら元の description を返す
+        """
+        localized = self.description_ja if language == "ja" else self.description_en
+        return localized or self.description
+
+# SQLite の全文検索用の FTS5 テーブル。meals.search_terms の内容をトリガーで同期する
+MEALS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS meals_fts USING fts5(search_terms, content='meals', content_rowid='id')",
+    """CREATE TRIGGER IF NOT EXISTS meals_fts_insert AFTER INSERT ON meals BEGIN
+        INSERT INTO meals_fts(rowid, search_terms) VALUES (new.id, new.search_terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS meals_fts_delete AFTER DELETE ON meals BEGIN
+        INSERT INTO meals_fts(meals_fts, rowid, search_terms) VALUES ('delete', old.id, old.search_terms);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS meals_fts_update AFTER UPDATE OF search_terms ON meals BEGIN
+        INSERT INTO meals_fts(meals_fts, rowid, search_terms) VALUES ('delete', old.id, old.search_terms);
+        INSERT INTO meals_fts(rowid, search_terms) VALUES (new.id, new.search_terms);
+    END""",
+]
+for _statement in MEALS_FTS_DDL:
+    event.listen(Meal.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+
+class MealItem(Base):
+    """
+    複数の写真で登録した食事の、写真（料理）ごとの画像と解析結果。
+    食事記録（meals）の image_path / image_hash は1枚目の写真、calories は全品の合計、description は食事全体の概要になる
+    """
+    __tablename__ = "meal_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    meal_id = Column(Integer, ForeignKey("meals.id", ondelete="CASCADE"), nullable=False, index=True)
+    # アップロードされた順番（0から）
+    position = Column(Integer, nullable=False)
+    image_path = Column(String(255), nullable=False)
+    image_hash = Column(String(64), nullable=False, index=True)
+    thumbnail_path = Column(String(255), nullable=True)
+    mime_type = Column(String(64), nullable=False)
+    # 解析が終わるまでは 0
+    calories = Column(Integer, nullable=False, default=0)
+    description = Column(Text, nullable=True)
+    description_ja = Column(Text, nullable=True)
+    description_en = Column(Text, nullable=True)
+
+    meal = relationship("Meal", back_populates="items")
+
+    def description_for(self, language: str) -> str | None:
+        localized = self.description_ja if language == "ja" else self.description_en
+        return localized or self.description
+
+# 旧バージョン（読み出し時に翻訳していた頃）の翻訳キャッシュ。今は書き込まない。
+# 既存の食事記録の description_ja / description_en を埋める一回限りの backfill_descriptions が、
+# 保存済みの訳を再利用するためだけに読む
+class MealTranslation(Base):
+    __tablename__ = "meal_translations"
+    __table_args__ = (
+        UniqueConstraint("meal_id", "language", name="uq_meal_translations_meal_id_language"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    meal_id = Column(Integer, ForeignKey("meals.id", ondelete="CASCADE"), nullable=False)
+    language = Column(String(16), nullable=False)
+    # 翻訳元の description のハッシュ。description が変わった場合に古い翻訳を使わないため
+    source_hash = Column(String(64), nullable=False)
+    translated_text = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Image(Base):
+    """
+    内容のハッシュで保存した画像ファイル。同じ画像を参照する食事記録の数を ref_count で数え、
+    最後の参照がなくなったときにファイルを削除する
+    """
+    __tablename__ = "images"
+
+    sha256 = Column(String(64), primary_key=True)
+    path = Column(String(255), nullable=False)
+    thumbnail_path = Column(String(255), nullable=True)
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class AnalysisResult(Base):
+    """
+    画像ごとの解析結果のキャッシュ。同じ写真が再アップロードされたときにGeminiを呼ばずに使う。
+    description は日本語・英語の両方を持つため、言語ごとには分けない
+    """
+    __tablename__ = "analysis_results"
+
+    image_hash = Column(String(64), primary_key=True)
+    description_ja = Column(Text, nullable=True)
+    description_en = Column(Text, nullable=True)
+    calories = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def as_analysis(self) -> dict:
+        return {
+            "description_ja": self.description_ja,
+            "description_en": self.description_en,
+            "calories": self.calories,
+        }
+
+class MealDailyTotal(Base):
+    """
+    ユーザーごと・日ごと（ユーザーのタイムゾーンの日付）の摂取カロリーと食事数の集計。
+    食事記録の作成・解析・削除のたびに crud で差分を反映する
+    """
+    __tablename__ = "meal_daily_totals"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    total_calories = Column(Integer, nullable=False, default=0)
+    meal_count = Column(Integer, nullable=False, default=0)
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    meal_id = Column(Integer, ForeignKey("meals.id", ondelete="CASCADE"), nullable=False, index=True)
+    status = Column(Enum(JobStatus), nullable=False, index=True, default=JobStatus.queued)
+    # 画像のMIMEタイプと、レスポンスの description に使う言語 ("ja" / "en")
+    mime_type = Column(String(64), nullable=False)
+    language = Column(String(8), nullable=False, default="ja")
+    # 終わった（またはワーカーが落ちて中断された）解析の試行の回数。Geminiを呼ばずに先送りした分は数えない
+    attempts = Column(Integer, nullable=False, default=0)
+    # 次に実行できる時刻（リトライ時は指数バックオフで先送りする）
+    next_run_at = Column(DateTime(timezone=True), nullable=False)
+    # ワーカーが取得した時刻。一定時間以上 running のままならワーカーが落ちたとみなして再実行する
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    meal = relationship("Meal")
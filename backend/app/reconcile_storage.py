@@ -0,0 +1,177 @@
+"""
+UPLOADS_DIR のファイルとDBの参照（meals・meal_items の image_path / thumbnail_path、images.path / thumbnail_path）を突き合わせる。
+
+- どこからも参照されていないファイル（削除の失敗、DBへの登録前に落ちたアップロード、tmp に残った .part など）のうち、
+  更新から STORAGE_ORPHAN_GRACE_SECONDS 以上経ったものを孤児として削除する（--quarantine を指定すると移動する）
+- ファイルが存在しない参照を、参照している食事記録の id と一緒に表示する
+
+DBの参照をストリーミングで読んで集合にし、ディレクトリを1回だけ走査しながら集合と照合するので、
+ファイルごとにクエリは発行しない。孤児は削除の直前にバッチごとにもう一度DBで参照がないことを確認する
+（走査中に同じ内容の画像がアップロードされ、既存のファイルが再利用された場合に消さないため）。
+
+何も指定しなければ削除せずに結果だけを表示する（dry run）。
+
+    python -m app.reconcile_storage
+    python -m app.reconcile_storage --delete
+    python -m app.reconcile_storage --quarantine /app/uploads-quarantine
+"""
+import argparse
+import os
+import shutil
+import time
+
+from sqlalchemy.orm import Session
+
+from . import crud
+from .core.config import settings
+from .database import SessionLocal
+
+
+def _walk_files(directory: str):
+    """
+    directory 以下のファイルを os.DirEntry で返す（シンボリックリンクはたどらない）
+    """
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:
+            # 走査中に削除されたディレクトリ
+            continue
+
+
+def _dispose(db: Session, report: dict, candidates: list[tuple[str, int]], uploads_dir: str,
+             dry_run: bool, quarantine_dir: str | None) -> None:
+    # 最新の状態を読むため、参照を読んだときのトランザクションを終わらせてから確認する
+    db.rollback()
+    still_referenced = crud.get_referenced_image_paths(db, [path for path, _ in candidates])
+    for path, size in candidates:
+        if path in still_referenced:
+            continue
+        report["orphans"] += 1
+        report["orphan_bytes"] += size
+        if dry_run:
+            continue
+        try:
+            if quarantine_dir:
+                destination = os.path.join(quarantine_dir, os.path.relpath(path, uploads_dir))
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                shutil.move(path, destination)
+            else:
+                os.unlink(path)
+            report["removed"] += 1
+        except FileNotFoundError:
+            pass
+
+
+def reconcile(
+    db: Session,
+    uploads_dir: str = settings.UPLOADS_DIR,
+    grace_seconds: float = settings.STORAGE_ORPHAN_GRACE_SECONDS,
+    dry_run: bool = True,
+    quarantine_dir: str | None = None,
+    batch_size: int = 1000,
+) -> dict:
+    """
+    UPLOADS_DIR とDBの参照を突き合わせ、孤児のファイルを削除（または移動）して結果を返す。
+    missing にはファイルが存在しない参照のパスと、そのパスを参照している食事記録の id を入れる
+    """
+    uploads_dir = os.path.abspath(uploads_dir)
+    quarantine_dir = os.path.abspath(quarantine_dir) if quarantine_dir else None
+    prefix = uploads_dir + os.sep
+    report = {"files": 0, "referenced": 0, "recent": 0, "orphans": 0, "orphan_bytes": 0, "removed": 0, "missing": {}}
+
+    # UPLOADS_DIR の外を指すパス（インポートした記録の空のパスなど）は照合しない
+    unseen = {
+        path for path in map(os.path.abspath, crud.iter_referenced_image_paths(db, batch_size=batch_size * 10))
+        if path.startswith(prefix)
+    }
+    cutoff = time.time() - grace_seconds
+
+    candidates = []
+    for entry in _walk_files(uploads_dir):
+        report["files"] += 1
+        if entry.path in unseen:
+            # 見つかった参照は集合から消していき、最後に残ったものがファイルのない参照になる
+            unseen.remove(entry.path)
+            report["referenced"] += 1
+            continue
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime > cutoff:
+            # 保存した直後でDBへの登録がまだ終わっていないアップロードの可能性がある
+            report["recent"] += 1
+            continue
+        candidates.append((entry.path, stat.st_size))
+        if len(candidates) >= batch_size:
+            _dispose(db, report, candidates, uploads_dir, dry_run, quarantine_dir)
+            candidates = []
+    if candidates:
+        _dispose(db, report, candidates, uploads_dir, dry_run, quarantine_dir)
+
+    # 走査中に食事記録と一緒に削除された参照は除く
+    db.rollback()
+    missing = sorted(path for path in unseen if not os.path.exists(path))
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        still_referenced = crud.get_referenced_image_paths(db, batch)
+        meal_ids = crud.get_meal_ids_by_image_path(db, batch)
+        for path in batch:
+            if path in still_referenced:
+                report["missing"][path] = meal_ids.get(path, [])
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--delete", action="store_true", help="delete orphaned files")
+    action.add_argument("--quarantine", metavar="DIR", help="move orphaned files to DIR instead of deleting them")
+    parser.add_argument("--uploads-dir", default=settings.UPLOADS_DIR)
+    parser.add_argument("--grace-seconds", type=float, default=settings.STORAGE_ORPHAN_GRACE_SECONDS)
+    parser.add_argument("--show-missing", type=int, default=20, help="number of missing files to list")
+    args = parser.parse_args()
+    if args.quarantine and os.path.abspath(args.quarantine).startswith(os.path.abspath(args.uploads_dir) + os.sep):
+        # UPLOADS_DIR の中は静的ファイルとして公開され、次の実行でまた孤児として扱われる
+        parser.error("--quarantine must be outside the uploads directory")
+
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        report = reconcile(
+            db,
+            uploads_dir=args.uploads_dir,
+            grace_seconds=args.grace_seconds,
+            dry_run=not (args.delete or args.quarantine),
+            quarantine_dir=args.quarantine,
+        )
+    finally:
+        db.close()
+
+    if args.quarantine:
+        action = f"{report['removed']} moved to {args.quarantine}"
+    elif args.delete:
+        action = f"{report['removed']} deleted"
+    else:
+        action = "dry run, nothing removed"
+    print(
+        f"Scanned {report['files']} files in {time.perf_counter() - start:.1f}s: "
+        f"{report['referenced']} referenced, {report['recent']} newer than the grace period, "
+        f"{report['orphans']} orphaned ({report['orphan_bytes'] / 1024 / 1024:.1f}MiB, {action})"
+    )
+    missing = report["missing"]
+    print(f"{len(missing)} referenced files are missing")
+    for path in list(missing)[:args.show_missing]:
+        print(f"  {path}: meals {missing[path] or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
-from .models import MealType
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from datetime import date, datetime
+from .models import MealStatus, MealType
 
 # --- Base Schemas ---
 class MealBase(BaseModel):
@@ -14,22 +14,40 @@ class UserBase(BaseModel):
 
 # --- Schemas for Creating Data (Request) ---
 class MealCreate(MealBase):
-    pass
+    description_ja: Optional[str] = None
+    description_en: Optional[str] = None
 
 class UserCreate(UserBase):
     password: str
     daily_calorie_limit: Optional[int] = 2000
+    timezone: Optional[str] = None
 
 # --- Schemas for Reading Data (Response) ---
 class Meal(MealBase):
     id: int
     user_id: int
     image_path: str
+    thumbnail_path: Optional[str] = None
+    status: MealStatus = MealStatus.analyzed
     created_at: datetime
 
     class Config:
         orm_mode = True
 
+class MealItem(BaseModel):
+    position: int
+    image_path: str
+    thumbnail_path: Optional[str] = None
+    description: Optional[str] = None
+    calories: int
+
+    class Config:
+        orm_mode = True
+
+class MealWithItems(Meal):
+    # 複数の写真で登録した食事の、写真（料理）ごとの解析結果。1枚の写真の食事では空
+    items: List[MealItem] = []
+
 class User(UserBase):
     id: int
     daily_calorie_limit: int
@@ -42,6 +60,7 @@ class User(UserBase):
 class UserInfo(UserBase):
     id: int
     daily_calorie_limit: int
+    timezone: str
     created_at: datetime
 
     class Config:
@@ -51,6 +70,35 @@ class UserInfo(UserBase):
 # --- Schemas for Updating Data ---
 class UserUpdate(BaseModel):
     daily_calorie_limit: Optional[int] = None
+    timezone: Optional[str] = None
+
+
+class MealBatchOperation(BaseModel):
+    meal_id: int
+    action: Literal["delete", "update"]
+    # action が update のときに変更する項目（指定したものだけ変更する）
+    meal_type: Optional[MealType] = None
+    calories: Optional[int] = Field(None, ge=0)
+
+class MealBatchRequest(BaseModel):
+    operations: List[MealBatchOperation]
+
+class MealBatchItemResult(BaseModel):
+    meal_id: int
+    status: Literal["deleted", "updated", "not_found", "conflict"]
+    detail: Optional[str] = None
+    meal: Optional[Meal] = None  # 更新後の食事記録（status が updated のとき）
+
+
+# --- Schemas for Summaries ---
+class CalorieSummaryBucket(BaseModel):
+    start: date  # 集計期間の初日（ユーザーのタイムゾーンの日付）
+    end: date  # 集計期間の最終日（この日を含む）
+    total_calories: int
+    meal_count: int
+    calorie_limit: int  # daily_calorie_limit × 期間の日数
+    difference: int  # calorie_limit - total_calories（マイナスなら超過）
+    days_over_limit: int
 
 
 # --- Schemas for Authentication ---
@@ -60,3 +108,5 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     username: Optional[str] = None
+    user_id: Optional[int] = None
+    token_version: int = 0
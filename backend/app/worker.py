@@ -0,0 +1,129 @@
+"""
+画像解析ジョブのワーカー。
+
+analysis_jobs テーブルをキューとして使い、pending の食事記録の画像をGeminiで解析する。
+APIサーバーのプロセス内で起動する（ANALYSIS_WORKER_IN_APP=true）ほか、単体でも実行できる。
+
+    python -m app.worker --workers 4
+"""
+import argparse
+import signal
+import threading
+from pathlib import Path
+
+from . import crud, database
+from .core.analysis import analyze_image, analyze_meal_images
+from .core.config import settings
+from .core.gemini import get_gemini_model
+from .core.model_client import ModelUnavailable
+
+# 新しいジョブが登録されたことをプロセス内のワーカーに知らせる（ポーリング間隔を待たずに処理するため）
+_wake_event = threading.Event()
+
+
+def notify() -> None:
+    _wake_event.set()
+
+
+def process_next_job(db, model) -> bool:
+    """
+    ジョブを1件処理する。処理するジョブがなかった場合は False を返す
+    """
+    job = crud.claim_analysis_job(db)
+    if job is None:
+        return False
+
+    # 解析待ちの間に同じ画像の解析が終わっていれば、その結果を使う
+    meal = job.meal
+    cached = crud.get_cached_analysis(db, meal)
+    try:
+        if cached is not None:
+            analysis = cached
+        elif meal.items:
+            # 複数の写真の食事は、すべての写真を1回の呼び出しでまとめて解析する
+            analysis = analyze_meal_images(
+                model, [(Path(item.image_path).read_bytes(), item.mime_type) for item in meal.items]
+            )
+        else:
+            image_bytes = Path(meal.image_path).read_bytes()
+            analysis = analyze_image(model, image_bytes, job.mime_type)
+    except ModelUnavailable as e:
+        # Geminiを呼んでいないので試行回数に数えず、サーキットブレーカーのクールダウンの後に回す
+        print(f"Warning: Analysis of meal {job.meal_id} postponed: {e}")
+        crud.postpone_analysis_job(db, job, str(e), settings.GEMINI_BREAKER_COOLDOWN_SECONDS)
+        return True
+    except Exception as e:
+        crud.fail_analysis_job(db, job, str(e))
+        print(f"Warning: Analysis of meal {job.meal_id} failed (attempt {job.attempts}): {e}")
+        return True
+
+    try:
+        crud.complete_analysis_job(db, job, analysis)
+    except Exception as e:
+        # 解析中に食事記録が削除された場合など
+        db.rollback()
+        print(f"Warning: Could not store analysis of meal {job.meal_id}: {e}")
+    return True
+
+
+class AnalysisWorker:
+    """
+    ジョブを処理するスレッドを指定数だけ起動する
+    """
+
+    def __init__(self, model_factory=get_gemini_model, workers: int = settings.ANALYSIS_WORKERS):
+        self.model_factory = model_factory
+        self.workers = workers
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> None:
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"analysis-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopping.set()
+        _wake_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+
+    def _run(self) -> None:
+        model = None
+        while not self._stopping.is_set():
+            processed = False
+            db = database.SessionLocal()
+            try:
+                if model is None:
+                    model = self.model_factory()
+                processed = process_next_job(db, model)
+            except Exception as e:
+                print(f"Warning: Analysis worker error: {e}")
+            finally:
+                db.close()
+
+            if not processed:
+                _wake_event.wait(settings.ANALYSIS_POLL_INTERVAL_SECONDS)
+                _wake_event.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=settings.ANALYSIS_WORKERS)
+    args = parser.parse_args()
+
+    worker = AnalysisWorker(workers=args.workers)
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+
+    worker.start()
+    print(f"Analysis worker started with {args.workers} threads")
+    stopped.wait()
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()
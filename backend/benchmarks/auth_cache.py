@@ -0,0 +1,85 @@
+"""
+認証の必要なリクエストのスループットのベンチマーク。
+
+同じトークンで GET /users/me を同時に投げ続け、ユーザーキャッシュあり・なし（AUTH_CACHE_TTL_SECONDS=0）の
+スループット(req/s)・レイテンシと、1リクエストあたりのSQLの実行回数を比較する。
+ローカルの SQLite ではDBの往復が速すぎるので、--db-latency でSQLごとの往復時間を上乗せできる。
+
+    cd backend
+    python -m benchmarks.auth_cache --concurrency 32 --duration 5 --db-latency 0.001
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from sqlalchemy import event
+
+from .common import configure_local_app, percentile
+
+
+async def _client_loop(client: httpx.AsyncClient, headers: dict, deadline: float, latencies: list) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/api/v1/users/me", headers=headers)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def _measure(name: str, client: httpx.AsyncClient, headers: dict, args, queries: list) -> None:
+    latencies: list = []
+    queries[0] = 0
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*[_client_loop(client, headers, deadline, latencies) for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>10}: {len(latencies) / elapsed:8.1f} req/s "
+        f"p50={statistics.median(latencies) * 1000:6.1f}ms p99={percentile(latencies, 99) * 1000:6.1f}ms "
+        f"queries/req={queries[0] / max(1, len(latencies)):.2f}"
+    )
+
+
+async def run(args) -> None:
+    configure_local_app()
+    from app import database
+    from app.core import user_cache
+    from app.core.config import settings
+    from app.main import app
+
+    queries = [0]
+
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def _count(*_):
+        queries[0] += 1
+        if args.db_latency:
+            time.sleep(args.db_latency)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/v1/auth/signup", json={"username": "bench", "password": "bench"})
+        token = (await client.post(
+            "/api/v1/auth/login/token", data={"username": "bench", "password": "bench"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        ttl = settings.AUTH_CACHE_TTL_SECONDS
+        settings.AUTH_CACHE_TTL_SECONDS = 0
+        user_cache.clear()
+        await _measure("no cache", client, headers, args, queries)
+
+        settings.AUTH_CACHE_TTL_SECONDS = ttl or 30
+        await _measure("cache", client, headers, args, queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="simulated DB round trip per query (seconds)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
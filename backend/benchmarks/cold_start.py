@@ -0,0 +1,90 @@
+"""
+コールドスタートのベンチマーク。
+
+新しいプロセスで次の時間を --runs 回測り、中央値を表示する（DBは一時ディレクトリの SQLite）。
+
+- import: `import app.main` にかかる時間
+- startup: lifespan の起動処理（マイグレーションなど）にかかる時間
+- first request: 起動後の最初の GET /health/ready のレイテンシ
+
+続けて `python -X importtime -c "import app.main"` の結果から、累積のインポート時間が長いモジュールを表示する。
+変更前後のコミットで同じコマンドを実行して比較する。
+
+    cd backend
+    python -m benchmarks.cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# 子プロセスで実行するスクリプト。計測の対象以外のモジュールを先に読み込まないよう、標準ライブラリだけで書く
+_CHILD = """
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from starlette.testclient import TestClient
+client = TestClient(app.main.app)
+before_startup = time.perf_counter()
+with client:
+    started = time.perf_counter()
+    status = client.get("/health/ready").status_code
+    first = time.perf_counter()
+print(json.dumps({
+    "import": imported - start, "startup": started - before_startup, "first_request": first - started, "status": status,
+}))
+"""
+
+
+def _env() -> dict:
+    workdir = tempfile.mkdtemp(prefix="caloriecam-bench-")
+    return {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "ANALYSIS_WORKER_IN_APP": "false",
+        "PYTHONWARNINGS": "ignore",
+    }
+
+
+def _import_times(env: dict) -> list[tuple[int, str]]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], env=env, capture_output=True, text=True, check=True,
+    ).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times.append((int(cumulative), name.rstrip()))
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="number of modules to list from -X importtime")
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-c", _CHILD], env=_env(), capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    for key in ("import", "startup", "first_request"):
+        print(f"{key:>14}: {statistics.median(result[key] for result in results) * 1000:8.1f}ms")
+    print(f"{'ready status':>14}: {results[-1]['status']}")
+
+    times = _import_times(_env())
+    total = next(cumulative for cumulative, name in times if name.strip() == "app.main")
+    print(f"\n-X importtime: app.main {total / 1000:.1f}ms cumulative")
+    for cumulative, name in sorted(times, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:10.1f}ms {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+ベンチマーク用にアプリをローカルのSQLiteと一時ディレクトリで起動するためのヘルパー。
+`app.main` をインポートする前に呼ぶこと。
+"""
+import io
+import os
+import random
+import tempfile
+
+
+def configure_local_app(workdir: str | None = None, database_url: str | None = None) -> str:
+    """
+    DB を一時ディレクトリの SQLite（database_url を指定した場合はそのDB）に、UPLOADS_DIR を一時ディレクトリに向けて
+    テーブルを作る。作業ディレクトリを返す
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="caloriecam-bench-")
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{workdir}/bench.db"
+
+    from app import database
+    from app.core.config import settings
+    from app.migrations import upgrade
+
+    settings.UPLOADS_DIR = os.path.join(workdir, "uploads")
+    database.configure(os.environ["DATABASE_URL"])
+    # httpx.ASGITransport は lifespan を実行しないので、起動時のマイグレーションの代わりにここで作る
+    upgrade(database.engine)
+    return workdir
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def make_images(count: int, size: int, seed: int) -> list[bytes]:
+    """
+    アップロードする JPEG を count 枚作る（内容はランダムなので、seed が同じなら同じ画像、違えば別の画像になる）
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    width, height = size, size * 3 // 4
+    images = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3)).save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
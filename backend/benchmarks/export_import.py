@@ -0,0 +1,114 @@
+"""
+食事記録のエクスポート・インポートのベンチマーク。
+
+1. N行の NDJSON ファイルを作り、1行ずつ ORM で add + commit する方法（--baseline-rows 行だけ測って1秒あたりの行数を出す）と
+   app.import_meals（IMPORT_BATCH_SIZE 行ごとの executemany）のスループットを比較する
+2. インポートしたN行を、全件を ORM で読み込んで JSON にする方法（変更前の /meals/history と同じ）と
+   GET /meals/export のストリーミング（NDJSON / CSV）でエクスポートし、時間と Python のピークメモリ（tracemalloc）を比較する
+
+    cd backend
+    python -m benchmarks.export_import --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from .common import configure_local_app
+
+
+def _write_file(path: str, rows: int) -> None:
+    rng = random.Random(0)
+    start = datetime(2022, 1, 1)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            f.write(json.dumps({
+                "id": i + 1,
+                "meal_type": rng.choice(["breakfast", "lunch", "dinner"]),
+                "status": "analyzed",
+                "calories": rng.randint(200, 1200),
+                "description": "A bowl of ramen and three gyoza dumplings.",
+                "description_ja": "ラーメン一杯と餃子3個",
+                "description_en": "A bowl of ramen and three gyoza dumplings.",
+                "created_at": (start + timedelta(minutes=i)).isoformat(),
+            }, ensure_ascii=False) + "\n")
+
+
+def _measure(name: str, fn, rows_label: str = "rows") -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"{name:>24}: {rows_label}={count:>8} time={elapsed:7.2f}s ({count / elapsed:9,.0f} rows/s) "
+        f"peak={peak / 1024 / 1024:7.1f}MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--baseline-rows", type=int, default=5000, help="rows for the row-by-row import")
+    args = parser.parse_args()
+
+    workdir = configure_local_app()
+    from app import crud, database, models, schemas
+    from app.api.v1.endpoints.meals import _export_chunks
+    from app.core import meal_io
+    from app.import_meals import import_file
+    from fastapi.encoders import jsonable_encoder
+
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    baseline_user = crud.create_user(db, schemas.UserCreate(username="baseline", password="bench"))
+    crud.create_user(db, schemas.UserCreate(username="bench", password="bench"))
+
+    path = os.path.join(workdir, "meals.ndjson")
+    _write_file(path, args.rows)
+    print(f"{args.rows} rows, {os.path.getsize(path) / 1024 / 1024:.0f}MiB NDJSON")
+
+    def row_by_row() -> int:
+        with open(path, encoding="utf-8") as f:
+            for i, meal in enumerate(meal_io.read_meals(f, "ndjson")):
+                if i >= args.baseline_rows:
+                    return i
+                crud.create_meal(db, schemas.MealCreate(
+                    meal_type=meal["meal_type"], calories=meal["calories"], description=meal["description"],
+                    description_ja=meal["description_ja"], description_en=meal["description_en"],
+                ), user_id=baseline_user.id, image_path="")
+        return args.baseline_rows
+
+    _measure("import row by row", row_by_row)
+    _measure("import batched", lambda: import_file(db, "bench", path, "ndjson"))
+    bench_user = crud.get_user_by_username(db, "bench")
+    db.close()
+
+    def load_all() -> int:
+        session = database.SessionLocal()
+        try:
+            meals = session.query(models.Meal).filter(models.Meal.user_id == bench_user.id).all()
+            body = json.dumps(jsonable_encoder([schemas.Meal.model_validate(meal, from_attributes=True) for meal in meals]))
+            return len(meals) if body else 0
+        finally:
+            session.close()
+
+    def stream(format: str):
+        def run() -> int:
+            lines = 0
+            for chunk in _export_chunks(bench_user.id, format):
+                lines += chunk.count("\n")
+            return lines - (format == "csv")
+        return run
+
+    _measure("export load all + json", load_all)
+    _measure("export stream ndjson", stream("ndjson"))
+    _measure("export stream csv", stream("csv"))
+
+
+if __name__ == "__main__":
+    main()
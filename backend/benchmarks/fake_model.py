@@ -0,0 +1,94 @@
+"""
+ベンチマーク・ローカル検証用のGemini代替モデル。
+
+`genai.GenerativeModel` と同じ `generate_content` を持ち、
+`app.dependency_overrides[get_gemini_model]` に差し込んで使う。
+レイテンシ、エラー率、返すJSONを設定でき、呼び出し回数を数える。
+error_status を指定すると、注入するエラーをそのHTTPステータスの google.api_core の例外
+（429 なら TooManyRequests）にする。tail_rate の割合の呼び出しは tail_latency 秒遅くなる。
+画像1枚ごとに image_latency 秒を足す（複数の写真をまとめて送る呼び出しは、その枚数分だけ遅くなる）。
+"""
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from google.api_core import exceptions as api_exceptions
+
+
+@dataclass
+class FakeResponse:
+    text: str
+
+
+class FakeGenerativeModel:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        analysis: dict | None = None,
+        seed: int | None = None,
+        error_status: int | None = None,
+        tail_rate: float = 0.0,
+        tail_latency: float = 0.0,
+        image_latency: float = 0.0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.image_latency = image_latency
+        self.analysis = analysis or {
+            "description_ja": "ラーメン一杯と餃子3個",
+            "description_en": "A bowl of ramen and three gyoza dumplings.",
+            "calories": 850,
+        }
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+
+    def _delay(self, contents) -> float:
+        images = sum(isinstance(part, dict) for part in contents) if isinstance(contents, list) else 0
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter) + self.image_latency * images
+            if self._random.random() < self.tail_rate:
+                delay += self.tail_latency
+        if fail:
+            if self.error_status is not None:
+                raise api_exceptions.from_http_status(self.error_status, "FakeGenerativeModel: injected error")
+            raise RuntimeError("FakeGenerativeModel: injected error")
+        return delay
+
+    def _answer(self, contents) -> FakeResponse:
+        prompt = contents if isinstance(contents, str) else str(contents[0])
+        if "Input:" in prompt:
+            # バッチ翻訳: 受け取ったJSON配列の各要素をそのまま「翻訳」して返す
+            items = json.loads(prompt.split("Input:", 1)[1].strip())
+            return FakeResponse(json.dumps(
+                [{"id": item["id"], "text": f"[ja] {item['text']}"} for item in items],
+                ensure_ascii=False,
+            ))
+        if "'items'" in prompt:
+            # 複数の写真の解析: 写真ごとに同じ結果を返し、合計も返す
+            items = [self.analysis for part in contents if isinstance(part, dict)]
+            return FakeResponse(json.dumps({
+                "items": items,
+                "description_ja": "、".join(item["description_ja"] for item in items),
+                "description_en": "; ".join(item["description_en"] for item in items),
+                "calories": sum(item["calories"] for item in items),
+            }, ensure_ascii=False))
+        return FakeResponse(json.dumps(self.analysis, ensure_ascii=False))
+
+    def generate_content(self, contents, **kwargs) -> FakeResponse:
+        time.sleep(self._delay(contents))
+        return self._answer(contents)
@@ -0,0 +1,97 @@
+"""
+GET /meals/history のページングのベンチマーク。
+
+1ユーザーに大量の食事記録を登録し、変更前の全件取得（ORMで全件読み込み + スキーマ変換）と
+キーセットページング（先頭ページ・深いページ・fields 指定）のレイテンシとピークメモリを比較する。
+
+    cd backend
+    python -m benchmarks.history_pagination --meals 100000
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from .common import configure_local_app
+
+
+def _measure(name: str, fn, repeat: int) -> None:
+    timings = []
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        count = fn()
+        timings.append(time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    print(f"{name:>28}: rows={count:>6} p50={statistics.median(timings) * 1000:8.1f}ms peak={peak / 1024 / 1024:7.1f}MiB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    configure_local_app()
+    from app import crud, database, models, schemas
+    from app.migrations import upgrade
+
+    upgrade(database.engine)
+    db = database.SessionLocal()
+    db.add(models.User(username="bench", password_hash="x"))
+    db.commit()
+
+    base = datetime(2020, 1, 1)
+    rows = [
+        {
+            "user_id": 1,
+            "meal_type": models.MealType.lunch,
+            "image_path": f"/app/uploads/{i:064x}.jpg",
+            "calories": 300 + i % 700,
+            "description": "ラーメン一杯と餃子3個" * 3,
+            "description_ja": "ラーメン一杯と餃子3個" * 3,
+            "description_en": "A bowl of ramen and three gyoza dumplings." * 3,
+            "status": models.MealStatus.analyzed,
+            "created_at": base + timedelta(minutes=30 * i),
+        }
+        for i in range(args.meals)
+    ]
+    db.bulk_insert_mappings(models.Meal, rows)
+    db.commit()
+    del rows
+
+    if hasattr(schemas.Meal, "model_validate"):
+        def validate(meal):
+            return schemas.Meal.model_validate(meal, from_attributes=True)
+    else:
+        validate = schemas.Meal.from_orm
+
+    def full_history():
+        # 変更前の /meals/history と同じく全件をORMで読み込んでスキーマに変換する
+        db.expunge_all()
+        meals = db.query(models.Meal).filter(models.Meal.user_id == 1).order_by(models.Meal.created_at.desc()).all()
+        return len([validate(meal) for meal in meals])
+
+    middle = db.query(models.Meal).order_by(models.Meal.id).offset(args.meals // 2).first()
+    cursor = (middle.created_at, middle.id)
+
+    def page(before=None, columns=None):
+        db.expunge_all()
+        meals = crud.get_meals_page(db, user_id=1, limit=args.page_size + 1, before=before, columns=columns)
+        if columns is None:
+            return len([validate(meal) for meal in meals[:args.page_size]])
+        return len([{c: getattr(meal, c) for c in columns} for meal in meals[:args.page_size]])
+
+    _measure("full history (before)", full_history, args.repeat)
+    _measure("first page", page, args.repeat)
+    _measure("middle page (cursor)", lambda: page(before=cursor), args.repeat)
+    _measure("middle page, no description", lambda: page(before=cursor, columns=["id", "calories", "created_at"]), args.repeat)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+ログインが集中したときのベンチマーク。
+
+多数のクライアントから POST /auth/login/token を同時に投げ続けながら、GET /users/me と
+GET /meals/today を叩いて、ログインのスループット(req/s)・503の件数と、通常のAPIのレイテンシを表示する。
+変更前後のコミットで同じコマンドを実行して比較する。
+
+    cd backend
+    python -m benchmarks.login_storm --logins 200 --duration 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from .common import configure_local_app, percentile
+
+
+async def _login_loop(client: httpx.AsyncClient, deadline: float, stats: dict) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/v1/auth/login/token", data={"username": "bench", "password": "bench"})
+        stats.setdefault(response.status_code, []).append(time.perf_counter() - start)
+        if response.status_code == 503:
+            # 実際のクライアントと同じく Retry-After の間は待つ
+            await asyncio.sleep(float(response.headers.get("retry-after", 1)))
+
+
+async def _api_loop(client: httpx.AsyncClient, headers: dict, deadline: float, latencies: list) -> None:
+    while time.perf_counter() < deadline:
+        for path in ("/api/v1/users/me", "/api/v1/meals/today"):
+            start = time.perf_counter()
+            await client.get(path, headers=headers)
+            latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+async def run(args) -> None:
+    configure_local_app()
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/v1/auth/signup", json={"username": "bench", "password": "bench"})
+        token = (await client.post(
+            "/api/v1/auth/login/token", data={"username": "bench", "password": "bench"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        stats: dict = {}
+        api_latencies: list = []
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *[_api_loop(client, headers, deadline, api_latencies) for _ in range(args.api_clients)],
+            *[_login_loop(client, deadline, stats) for _ in range(args.logins)],
+        )
+        elapsed = time.perf_counter() - start
+
+    ok = stats.get(200, [])
+    print(f"logins: {len(ok) / elapsed:.1f} req/s ok, status counts={ {k: len(v) for k, v in stats.items()} }")
+    if ok:
+        print(f"login latency: p50={statistics.median(ok) * 1000:.0f}ms p99={percentile(ok, 99) * 1000:.0f}ms")
+    if api_latencies:
+        print(
+            f"API under login storm: {len(api_latencies) / elapsed:.1f} req/s "
+            f"p50={statistics.median(api_latencies) * 1000:.1f}ms p99={percentile(api_latencies, 99) * 1000:.1f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200, help="concurrent login clients")
+    parser.add_argument("--api-clients", type=int, default=4, help="concurrent clients of the normal API")
+    parser.add_argument("--duration", type=float, default=10.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+食事記録の一括操作（POST /meals/batch）のベンチマーク。
+
+1ユーザーにN件の食事記録（それぞれ画像ファイルとサムネイル付き）を登録し、半分を DELETE /meals/{id} で1件ずつ、
+残りを POST /meals/batch（MEAL_BATCH_MAX_ITEMS 件ずつ）で削除して、時間・リクエスト数・SQLの実行回数を比較する。
+--unlink-latency でファイル削除の遅いストレージ（NFSなど）を模擬する。ファイルはバックグラウンドで削除されるので、
+レスポンスの時間とは別に、キューが空になるまでの時間も表示する。
+続けて一括更新（カロリーの修正）の時間を測り、最後に日ごとの集計と残ったファイルが正しいことを確認する。
+
+    cd backend
+    python -m benchmarks.meal_batch --meals 2000 --unlink-latency 0.002
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import time
+
+import httpx
+from sqlalchemy import event, func, insert
+
+from .common import configure_local_app
+
+
+def _create_meals(db, user_id: int, uploads: str, count: int) -> list[int]:
+    from app import models
+
+    meals, images = [], []
+    for i in range(count):
+        digest = hashlib.sha256(str(i).encode()).hexdigest()
+        directory = os.path.join(uploads, digest[:2], digest[2:4])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{digest}.webp")
+        thumbnail = os.path.join(directory, f"{digest}_thumb.webp")
+        for file in (path, thumbnail):
+            with open(file, "wb") as f:
+                f.write(b"RIFF")
+        images.append({"sha256": digest, "path": path, "thumbnail_path": thumbnail, "size": 4, "ref_count": 1})
+        meals.append({
+            "user_id": user_id, "meal_type": models.MealType.lunch, "calories": 500, "description": "ramen",
+            "image_path": path, "thumbnail_path": thumbnail, "image_hash": digest, "status": models.MealStatus.analyzed,
+        })
+    db.execute(insert(models.Image), images)
+    db.execute(insert(models.Meal), meals)
+    db.commit()
+    return [meal_id for (meal_id,) in db.query(models.Meal.id).filter(models.Meal.user_id == user_id).order_by(models.Meal.id)]
+
+
+async def _drain_cleanup(started: float) -> float:
+    from app.core import storage
+
+    while storage.cleanup_queue_depth():
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - started
+
+
+async def run(args) -> None:
+    workdir = configure_local_app()
+    from app import crud, database, models
+    from app.core import storage
+    from app.core.config import settings
+    from app.main import app
+
+    if args.unlink_latency:
+        remove_image_file = storage.remove_image_file
+
+        def slow_remove(path: str) -> None:
+            time.sleep(args.unlink_latency)
+            remove_image_file(path)
+
+        storage.remove_image_file = slow_remove
+
+    queries = [0]
+
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def _count(*_):
+        queries[0] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/v1/auth/signup", json={"username": "bench", "password": "bench"})
+        token = (await client.post(
+            "/api/v1/auth/login/token", data={"username": "bench", "password": "bench"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        db = database.SessionLocal()
+        user = crud.get_user_by_username(db, "bench")
+        user_id = user.id
+        meal_ids = _create_meals(db, user_id, settings.UPLOADS_DIR, args.meals)
+        crud.rebuild_daily_totals(db, user)
+        db.commit()
+        half = len(meal_ids) // 2
+        per_meal, batched = meal_ids[:half], meal_ids[half:]
+
+        queries[0] = 0
+        started = time.perf_counter()
+        for meal_id in per_meal:
+            response = await client.delete(f"/api/v1/meals/{meal_id}", headers=headers)
+            response.raise_for_status()
+        responded = time.perf_counter() - started
+        drained = await _drain_cleanup(started)
+        print(f"{'DELETE per meal':>18}: {len(per_meal)} meals in {responded * 1000:8.1f}ms "
+              f"({len(per_meal)} requests, {queries[0]} queries), files removed after {drained * 1000:.1f}ms")
+
+        chunk = settings.MEAL_BATCH_MAX_ITEMS
+        queries[0] = 0
+        requests = 0
+        started = time.perf_counter()
+        for offset in range(0, len(batched), chunk):
+            response = await client.post("/api/v1/meals/batch", headers=headers, json={"operations": [
+                {"meal_id": meal_id, "action": "delete"} for meal_id in batched[offset:offset + chunk]
+            ]})
+            response.raise_for_status()
+            requests += 1
+        responded = time.perf_counter() - started
+        drained = await _drain_cleanup(started)
+        print(f"{'POST /meals/batch':>18}: {len(batched)} meals in {responded * 1000:8.1f}ms "
+              f"({requests} requests, {queries[0]} queries), files removed after {drained * 1000:.1f}ms")
+
+        remaining = _create_meals(db, user_id, os.path.join(workdir, "uploads-update"), args.meals)
+        crud.rebuild_daily_totals(db, user)
+        db.commit()
+        queries[0] = 0
+        started = time.perf_counter()
+        for offset in range(0, len(remaining), chunk):
+            response = await client.post("/api/v1/meals/batch", headers=headers, json={"operations": [
+                {"meal_id": meal_id, "action": "update", "calories": 300} for meal_id in remaining[offset:offset + chunk]
+            ]})
+            response.raise_for_status()
+        print(f"{'batch update':>18}: {len(remaining)} meals in {(time.perf_counter() - started) * 1000:8.1f}ms "
+              f"({queries[0]} queries)")
+
+        db.expire_all()
+        total = db.query(func.sum(models.MealDailyTotal.total_calories)).filter(
+            models.MealDailyTotal.user_id == user_id
+        ).scalar()
+        files = sum(len(names) for _, _, names in os.walk(settings.UPLOADS_DIR))
+        ok = total == 300 * len(remaining) and files == 0 and db.query(models.Image).count() == len(remaining)
+        print(f"daily total={total} files left in deleted set={files} -> {'OK' if ok else 'MISMATCH'}")
+        db.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=2000)
+    parser.add_argument("--unlink-latency", type=float, default=0.0, help="simulated seconds per file deletion")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
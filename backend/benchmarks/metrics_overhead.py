@@ -0,0 +1,97 @@
+"""
+メトリクスのオーバーヘッドのマイクロベンチマーク。
+
+1. ヒストグラムへの記録・SQLのイベントフック1回あたりのコスト
+2. GET /meals/today・/meals/history を順番に叩いたときのスループットを、METRICS_ENABLED を
+   true / false にしたプロセスで比較する（ミドルウェアの追加は import 時に決まるため別プロセスで測る）
+
+    cd backend
+    python -m benchmarks.metrics_overhead --requests 3000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import timeit
+
+import httpx
+
+from .common import configure_local_app
+
+
+async def _run_case(requests: int) -> dict:
+    configure_local_app()
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/v1/auth/signup", json={"username": "bench", "password": "bench"})
+        token = (await client.post(
+            "/api/v1/auth/login/token", data={"username": "bench", "password": "bench"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        paths = ["/api/v1/meals/today", "/api/v1/meals/history"]
+        for path in paths:
+            await client.get(path, headers=headers)
+
+        start = time.perf_counter()
+        for i in range(requests):
+            response = await client.get(paths[i % len(paths)], headers=headers)
+            response.raise_for_status()
+        elapsed = time.perf_counter() - start
+    return {"rps": requests / elapsed, "us_per_request": elapsed / requests * 1e6}
+
+
+def _observation_costs() -> None:
+    from sqlalchemy import create_engine, text
+
+    from app.core import metrics
+
+    number = 100_000
+    child = metrics.stage("serialization")
+    observe = timeit.timeit(lambda: child.observe(0.001), number=number)
+    print(f"histogram observe: {observe / number * 1e9:.0f}ns")
+
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        statement = text("SELECT 1")
+        number = 20_000
+        plain = timeit.timeit(lambda: conn.execute(statement), number=number)
+        metrics.instrument_sqlalchemy()
+        hooked = timeit.timeit(lambda: conn.execute(statement), number=number)
+    print(f"SQLite 'SELECT 1': {plain / number * 1e6:.1f}us -> {hooked / number * 1e6:.1f}us with query hooks")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=3, help="alternating runs per setting; the best run is reported")
+    parser.add_argument("--case", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(asyncio.run(_run_case(args.requests))))
+        return
+
+    _observation_costs()
+    # 1CPUの環境などでは揺れが大きいので、交互に複数回実行して一番速い回を比べる
+    results: dict = {"false": [], "true": []}
+    for _ in range(args.rounds):
+        for enabled in results:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.metrics_overhead", "--case", "--requests", str(args.requests)],
+                check=True, capture_output=True, text=True, env={**os.environ, "METRICS_ENABLED": enabled},
+            ).stdout
+            results[enabled].append(json.loads(output.strip().splitlines()[-1])["us_per_request"])
+    best = {enabled: min(runs) for enabled, runs in results.items()}
+    for enabled, us in best.items():
+        print(f"METRICS_ENABLED={enabled:>5}: {1e6 / us:7.1f} req/s ({us:.0f}us/request)")
+    overhead = best["true"] - best["false"]
+    print(f"overhead: {overhead:.0f}us/request ({overhead / best['false'] * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Geminiクライアント（app.core.model_client.ModelClient）のベンチマーク。
+
+同じ偽モデルを直接呼んだ場合（raw）と ModelClient 経由の場合（client）で、
+次のシナリオの成功率・Geminiへの呼び出し回数・レイテンシ(p50/p99)を比較する。
+
+- throttled: 一定の割合で429が返る。リトライで成功率が上がる
+- outage: すべて503が返る。サーキットブレーカーが開いた後はGeminiを呼ばずにすぐ失敗する
+- tail: 一部の呼び出しだけ極端に遅い。ヘッジでp99が下がる
+- quota: 同時に大量のリクエストが来る。トークンバケットで1分あたりの呼び出し数を超えない
+
+    cd backend
+    python -m benchmarks.model_client --requests 200 --concurrency 8
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.model_client import ModelClient
+
+from .fake_model import FakeGenerativeModel
+
+
+def _run(name: str, model: FakeGenerativeModel, target, requests: int, concurrency: int) -> None:
+    model.reset()
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            target.generate_content("Describe this meal.")
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for _, latency in results)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    succeeded = sum(ok for ok, _ in results)
+    print(
+        f"{name:>18}: ok={succeeded:>4}/{requests} upstream calls={model.calls:>4} "
+        f"p50={statistics.median(latencies) * 1000:7.1f}ms p99={p99 * 1000:7.1f}ms "
+        f"({model.calls / elapsed * 60:,.0f} calls/min)"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake model latency per call (seconds)")
+    args = parser.parse_args()
+    n, c = args.requests, args.concurrency
+
+    def client(**overrides) -> ModelClient:
+        options = dict(
+            requests_per_minute=0, timeout=10, max_attempts=4, retry_base=0.02, retry_max=0.2,
+            breaker_failures=5, breaker_cooldown=60, hedge_after=0, max_concurrency=32,
+        )
+        options.update(overrides)
+        return ModelClient(model, **options)
+
+    print("throttled (20% 429)")
+    model = FakeGenerativeModel(latency=args.latency, error_rate=0.2, error_status=429, seed=0)
+    _run("raw", model, model, n, c)
+    # 429 はランダムに起きるので、ブレーカーが開かないよう閾値を上げる
+    _run("client", model, client(breaker_failures=50), n, c)
+
+    print("outage (100% 503)")
+    model = FakeGenerativeModel(latency=args.latency, error_rate=1.0, error_status=503, seed=0)
+    _run("raw", model, model, n, c)
+    _run("client", model, client(), n, c)
+
+    print("tail (5% +0.5s)")
+    model = FakeGenerativeModel(latency=args.latency, tail_rate=0.05, tail_latency=0.5, seed=0)
+    _run("raw", model, model, n, c)
+    _run("client, no hedge", model, client(), n, c)
+    _run("client, hedge", model, client(hedge_after=args.latency * 3), n, c)
+
+    print("quota (6000 requests/min, burst 10)")
+    model = FakeGenerativeModel(latency=args.latency, seed=0)
+    _run("raw", model, model, n, c)
+    _run("client", model, client(requests_per_minute=6000, burst=10), n, c)
+
+
+if __name__ == "__main__":
+    main()
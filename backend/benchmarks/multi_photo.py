@@ -0,0 +1,128 @@
+"""
+複数の料理の食事の登録（POST /meals に写真を複数送る）のベンチマーク。
+
+フェイクモデル（1回の呼び出しに --latency 秒、写真1枚ごとに --image-latency 秒）で解析ワーカーを動かし、
+--dishes 品の食事を --meals 回、次の3つの方法で登録して、1食分の解析が終わるまでの時間（中央値・p95）、
+モデルの呼び出し回数、作られた食事記録の数を比較する。写真はすべて別の画像にして、解析結果のキャッシュは効かせない。
+
+- sequential: 料理ごとに POST /meals し、GET /meals/{id}?wait で解析が終わるのを待ってから次の料理を送る
+- parallel: 料理ごとの POST /meals を同時に送り、すべての解析が終わるのを待つ
+- multi-photo: 1回の POST /meals にすべての写真を送り、1つの記録の解析が終わるのを待つ
+
+最後に、どの方法でも1食分のカロリーの合計が同じになることを確認する。
+
+    cd backend
+    python -m benchmarks.multi_photo --meals 10 --dishes 3 --latency 1.0 --image-latency 0.2
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from .common import configure_local_app, make_images, percentile
+from .fake_model import FakeGenerativeModel
+
+
+async def _login(client: httpx.AsyncClient, username: str) -> dict:
+    await client.post("/api/v1/auth/signup", json={"username": username, "password": "bench"})
+    token = (await client.post(
+        "/api/v1/auth/login/token", data={"username": username, "password": "bench"}
+    )).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def _upload(client: httpx.AsyncClient, headers: dict, images: list[bytes]) -> dict:
+    response = await client.post(
+        "/api/v1/meals",
+        data={"meal_type": "dinner"},
+        files=[("file", (f"dish{i}.jpg", image, "image/jpeg")) for i, image in enumerate(images)],
+        headers=headers,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+async def _wait_analyzed(client: httpx.AsyncClient, headers: dict, meal: dict) -> dict:
+    while meal["status"] == "pending":
+        response = await client.get(f"/api/v1/meals/{meal['id']}", params={"wait": 30}, headers=headers)
+        response.raise_for_status()
+        meal = response.json()
+    return meal
+
+
+async def _sequential(client: httpx.AsyncClient, headers: dict, dishes: list[bytes]) -> int:
+    calories = 0
+    for image in dishes:
+        meal = await _wait_analyzed(client, headers, await _upload(client, headers, [image]))
+        calories += meal["calories"]
+    return calories
+
+
+async def _parallel(client: httpx.AsyncClient, headers: dict, dishes: list[bytes]) -> int:
+    meals = await asyncio.gather(*[_upload(client, headers, [image]) for image in dishes])
+    meals = await asyncio.gather(*[_wait_analyzed(client, headers, meal) for meal in meals])
+    return sum(meal["calories"] for meal in meals)
+
+
+async def _multi_photo(client: httpx.AsyncClient, headers: dict, dishes: list[bytes]) -> int:
+    meal = await _wait_analyzed(client, headers, await _upload(client, headers, dishes))
+    assert len(meal["items"]) == len(dishes), meal
+    return meal["calories"]
+
+
+async def run(args) -> None:
+    configure_local_app()
+    from app import database, models
+    from app.core.gemini import get_gemini_model
+    from app.main import app
+    from app.worker import AnalysisWorker
+
+    model = FakeGenerativeModel(latency=args.latency, image_latency=args.image_latency)
+    app.dependency_overrides[get_gemini_model] = lambda: model
+    # ASGITransport は lifespan を実行しないのでワーカーは自分で起動する
+    analysis_worker = AnalysisWorker(model_factory=lambda: model, workers=args.workers)
+
+    strategies = (("sequential", _sequential), ("parallel", _parallel), ("multi-photo", _multi_photo))
+    print(f"{args.meals} meals x {args.dishes} dishes, model latency {args.latency}s + {args.image_latency}s/image, "
+          f"{args.workers} workers")
+    print(f"{'method':>12} {'p50':>9} {'p95':>9} {'model calls':>12} {'meal rows':>10} {'kcal/meal':>10}")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        analysis_worker.start()
+        totals = set()
+        for index, (name, strategy) in enumerate(strategies):
+            headers = await _login(client, f"bench-{name}")
+            # 方法ごとに別の画像にして、前の方法の解析結果のキャッシュを使わないようにする
+            images = make_images(args.meals * args.dishes, args.image_size, seed=index)
+            model.reset()
+            latencies, calories = [], set()
+            for meal in range(args.meals):
+                start = time.perf_counter()
+                calories.add(await strategy(client, headers, images[meal * args.dishes:(meal + 1) * args.dishes]))
+                latencies.append(time.perf_counter() - start)
+
+            db = database.SessionLocal()
+            rows = db.query(models.Meal).join(models.User).filter(models.User.username == f"bench-{name}").count()
+            db.close()
+            totals |= calories
+            print(f"{name:>12} {statistics.median(latencies) * 1000:7.0f}ms {percentile(latencies, 95) * 1000:7.0f}ms "
+                  f"{model.calls:>12} {rows:>10} {'/'.join(map(str, sorted(calories))):>10}")
+        analysis_worker.stop(timeout=5)
+    print(f"same calories per meal: {'OK' if len(totals) == 1 else 'MISMATCH'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=10)
+    parser.add_argument("--dishes", type=int, default=3, help="photos per meal")
+    parser.add_argument("--latency", type=float, default=1.0, help="fake model latency per call (seconds)")
+    parser.add_argument("--image-latency", type=float, default=0.2, help="extra fake model latency per image (seconds)")
+    parser.add_argument("--workers", type=int, default=4, help="analysis worker threads")
+    parser.add_argument("--image-size", type=int, default=640, help="width of the generated JPEGs (pixels)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+画像前処理のベンチマーク。
+
+サンプル画像のディレクトリ（指定しない場合はスマホ写真相当の合成画像）を前処理し、
+Geminiに送るバイト数（元画像 vs 前処理後）、ディスク使用量、一覧ページの転送量
+（元画像 vs サムネイル）と1枚あたりの処理時間を表示する。
+
+    cd backend
+    python -m benchmarks.preprocess --corpus ~/Pictures/meals
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from app.core.images import preprocess_image
+
+
+def _synthetic_corpus(directory: Path, count: int) -> list[Path]:
+    # ノイズ入りの 4032x3024 JPEG（12MP のスマホ写真と同程度のサイズになる）
+    paths = []
+    for i in range(count):
+        image = Image.effect_noise((4032, 3024), 40 + i).convert("RGB")
+        path = directory / f"sample_{i}.jpg"
+        image.save(path, format="JPEG", quality=95)
+        paths.append(path)
+    return paths
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, help="directory of sample meal photos")
+    parser.add_argument("--synthetic", type=int, default=5, help="number of synthetic photos when --corpus is omitted")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.corpus:
+            paths = sorted(p for p in args.corpus.iterdir() if p.is_file())
+        else:
+            paths = _synthetic_corpus(Path(tmp), args.synthetic)
+
+        raw_total = processed_total = thumbnail_total = 0
+        timings = []
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                image_bytes, thumbnail_bytes = preprocess_image(path)
+            except Exception as e:
+                print(f"skip {path.name}: {e}")
+                continue
+            timings.append(time.perf_counter() - start)
+            raw_total += path.stat().st_size
+            processed_total += len(image_bytes)
+            thumbnail_total += len(thumbnail_bytes)
+
+    if not timings:
+        print("no images processed")
+        return
+    n = len(timings)
+    print(f"images: {n}, preprocessing p50={statistics.median(timings) * 1000:.0f}ms max={max(timings) * 1000:.0f}ms")
+    print(f"payload per analysis / disk per image: {raw_total / n / 1024:.0f} KiB -> {processed_total / n / 1024:.0f} KiB "
+          f"({processed_total / raw_total:.1%})")
+    print(f"history page weight per meal: {raw_total / n / 1024:.0f} KiB -> {thumbnail_total / n / 1024:.1f} KiB "
+          f"({thumbnail_total / raw_total:.2%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+GET /meals/search の全文検索のベンチマーク。
+
+1ユーザーにN件の食事記録（料理の出現頻度に偏りをつける）を登録し、概要の LIKE '%...%' による走査
+（新しい順に limit 件）と crud.search_meals（SQLite の FTS5）で、よく出る語・まれな語・存在しない語・
+日本語・英語を検索したレイテンシを比較する。
+LIKE は limit 件見つかった時点で止まるのでよく出る語では速いが、まれな語や存在しない語では全件を走査する。
+全文検索は一致した記録のうち新しい SEARCH_RANK_WINDOW 件だけを関連度で並べるので、よく出る語でも一定の時間で返る。
+
+    cd backend
+    python -m benchmarks.search --meals 100000
+"""
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+
+from .common import configure_local_app
+
+_DISHES = [
+    ("醤油ラーメン", "soy sauce ramen"), ("味噌ラーメン", "miso ramen"), ("シーザーサラダ", "caesar salad"),
+    ("カレーライス", "curry and rice"), ("カツ丼", "pork cutlet bowl"), ("寿司", "sushi"), ("天ぷらそば", "tempura soba"),
+    ("親子丼", "chicken and egg bowl"), ("焼き魚定食", "grilled fish set meal"), ("オムライス", "omelette rice"),
+    ("餃子", "gyoza dumplings"), ("ポテトサラダ", "potato salad"), ("ハンバーグ", "hamburg steak"),
+    ("うどん", "udon noodles"), ("パンケーキ", "pancakes"), ("ビビンバ", "bibimbap"), ("フォー", "pho"),
+]
+# 先頭の料理ほどよく出る（Zipf 分布）
+_WEIGHTS = [1 / (rank + 1) ** 1.5 for rank in range(len(_DISHES))]
+_QUERIES = ["ラーメン", "salad", "サラダ 餃子", "ビビンバ", "pho", "トムヤムクン"]
+
+
+def _meal(rng: random.Random, created_at: datetime) -> dict:
+    from app import models
+
+    dishes = list(dict.fromkeys(rng.choices(_DISHES, weights=_WEIGHTS, k=rng.randint(1, 3))))
+    return {
+        "meal_type": models.MealType.lunch,
+        "status": models.MealStatus.analyzed,
+        "calories": rng.randint(200, 1200),
+        "description": None,
+        "description_ja": "と".join(ja for ja, _ in dishes),
+        "description_en": " with ".join(en for _, en in dishes).capitalize() + ".",
+        "created_at": created_at,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=100_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    configure_local_app()
+    from app import crud, database, models, schemas
+
+    db = database.SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(username="bench", password="bench"))
+    rng = random.Random(0)
+    start = datetime(2022, 1, 1)
+    for offset in range(0, args.meals, 10_000):
+        crud.import_meals(db, user, [
+            _meal(rng, start + timedelta(hours=i)) for i in range(offset, min(args.meals, offset + 10_000))
+        ])
+
+    def like_scan(query: str) -> int:
+        conditions = [
+            or_(models.Meal.description_ja.like(f"%{word}%"), models.Meal.description_en.like(f"%{word}%"))
+            for word in query.split()
+        ]
+        return len(db.query(models.Meal).filter(models.Meal.user_id == user.id, *conditions).order_by(
+            models.Meal.created_at.desc()
+        ).limit(args.limit).all())
+
+    def full_text(query: str) -> int:
+        return len(crud.search_meals(db, user_id=user.id, query=query, limit=args.limit))
+
+    for query in _QUERIES:
+        for name, fn in (("LIKE scan", like_scan), ("full-text", full_text)):
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                hits = fn(query)
+                timings.append(time.perf_counter() - started)
+            print(f"{query:>12} {name:>10}: hits={hits:>3} p50={statistics.median(timings) * 1000:8.2f}ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
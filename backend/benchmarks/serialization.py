@@ -0,0 +1,133 @@
+"""
+食事記録の一覧のシリアライズのベンチマーク。
+
+1ユーザーに --sizes の最大件数の食事記録を登録し、件数ごとに次の2つの方法で一覧をJSONにする時間（中央値）、
+1秒あたりの件数、Python のピークメモリ（tracemalloc）と世代0のGCの回数（作られたオブジェクトの数の目安）を比較する。
+
+- orm + pydantic: 変更前の GET /meals/history と同じ。ORM のオブジェクトを読み込み、list[schemas.Meal] として
+  検証・変換してから JSONResponse（標準の json）でエンコードする
+- rows + orjson: 変更後。必要な列だけを Row で読み、dict にして TimedORJSONResponse でエンコードする
+
+どちらもクエリとエンコードの時間を分けて表示し、最後に2つの出力が同じJSONになることを確認する。
+
+    cd backend
+    python -m benchmarks.serialization --sizes 1000,10000,100000
+"""
+import argparse
+import gc
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from .common import configure_local_app
+
+
+def _orm_pydantic(db, user_id: int, limit: int, language: str) -> tuple[float, bytes]:
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    from app import crud, schemas
+
+    start = time.perf_counter()
+    meals = crud.get_meals_page(db, user_id=user_id, limit=limit)
+    queried = time.perf_counter() - start
+    for meal in meals:
+        meal.description = meal.description_for(language)
+    adapter = TypeAdapter(list[schemas.Meal])
+    content = adapter.dump_python(adapter.validate_python(meals, from_attributes=True), mode="json")
+    body = JSONResponse(content=content).body
+    db.expunge_all()
+    return queried, body
+
+
+def _rows_orjson(db, user_id: int, limit: int, language: str) -> tuple[float, bytes]:
+    from app import crud
+    from app.api.v1.endpoints.meals import MEAL_FIELDS
+    from app.core import metrics
+
+    start = time.perf_counter()
+    rows = crud.get_meal_rows_page(
+        db, user_id=user_id, limit=limit, columns=MEAL_FIELDS + ["description_ja", "description_en"]
+    )
+    queried = time.perf_counter() - start
+    # GET /meals/history と同じ組み立て方
+    content = [dict(zip(MEAL_FIELDS, row)) for row in rows]
+    for item, row in zip(content, rows):
+        item["description"] = (row.description_ja if language == "ja" else row.description_en) or row.description
+    return queried, metrics.TimedORJSONResponse(content=content).body
+
+
+def _measure(fn, db, user_id: int, size: int, repeat: int) -> dict:
+    totals, queries = [], []
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        queried, body = fn(db, user_id, size, "ja")
+        totals.append(time.perf_counter() - start)
+        queries.append(queried)
+        db.rollback()
+
+    # 世代0のGCの回数は、作られたコンテナオブジェクト（ORM のオブジェクト、dict、pydantic のモデルなど）の数に比例する
+    collections = gc.get_stats()[0]["collections"]
+    tracemalloc.start()
+    fn(db, user_id, size, "ja")
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    gen0 = gc.get_stats()[0]["collections"] - collections
+    db.rollback()
+
+    total = statistics.median(totals)
+    query = statistics.median(queries)
+    return {"total": total, "query": query, "encode": total - query, "peak": peak, "gen0": gen0, "body": body}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma-separated numbers of meals per list")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    configure_local_app()
+    from app import crud, database, models, schemas
+
+    db = database.SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(username="bench", password="bench"))
+    rng = random.Random(0)
+    start = datetime(2022, 1, 1)
+    for offset in range(0, max(sizes), 10_000):
+        crud.import_meals(db, user, [
+            {
+                "meal_type": rng.choice(list(models.MealType)),
+                "status": models.MealStatus.analyzed,
+                "calories": rng.randint(200, 1200),
+                "description": "ラーメン一杯と餃子3個",
+                "description_ja": "ラーメン一杯と餃子3個",
+                "description_en": "A bowl of ramen and three gyoza dumplings.",
+                "created_at": start + timedelta(minutes=i, microseconds=rng.randint(0, 999_999)),
+            }
+            for i in range(offset, min(max(sizes), offset + 10_000))
+        ])
+    user_id = user.id
+
+    print(f"{'meals':>7} {'method':>16} {'total':>10} {'query':>10} {'encode':>10} {'meals/s':>10} "
+          f"{'peak':>9} {'gc gen0':>8}")
+    for size in sizes:
+        results = {}
+        for name, fn in (("orm + pydantic", _orm_pydantic), ("rows + orjson", _rows_orjson)):
+            result = results[name] = _measure(fn, db, user_id, size, args.repeat)
+            print(
+                f"{size:>7} {name:>16} {result['total'] * 1000:8.1f}ms {result['query'] * 1000:8.1f}ms "
+                f"{result['encode'] * 1000:8.1f}ms {size / result['total']:10.0f} "
+                f"{result['peak'] / 1024 / 1024:7.1f}Mi {result['gen0']:8d}"
+            )
+        same = json.loads(results["orm + pydantic"]["body"]) == json.loads(results["rows + orjson"]["body"])
+        print(f"{size:>7} {'same JSON':>16} {'OK' if same else 'MISMATCH'}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+ストレージの突き合わせ（app.reconcile_storage）のベンチマーク。
+
+一時ディレクトリの UPLOADS_DIR にN個の画像ファイル（コンテンツアドレス方式 + 古いユーザーごとのディレクトリ）を作り、
+一部を孤児（DBに参照なし）、一部を欠損（参照はあるがファイルなし）、一部を最近作られた孤児、tmp に残った .part にする。
+ファイルごとにDBへ問い合わせる方法（per-file query）と reconcile の dry run の時間を比較し、
+最後に --delete 相当で実行して、孤児だけが消え、参照されているファイルと猶予期間内のファイルが残ることを確認する。
+
+    cd backend
+    python -m benchmarks.storage_reconcile --files 200000
+"""
+import argparse
+import hashlib
+import os
+import random
+import time
+
+from sqlalchemy import insert, select
+
+from .common import configure_local_app
+
+
+def _touch(path: str, mtime: float | None) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0")
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200_000)
+    parser.add_argument("--orphan-rate", type=float, default=0.02)
+    parser.add_argument("--missing-rate", type=float, default=0.01)
+    parser.add_argument("--per-file-sample", type=int, default=20_000, help="files checked by the per-file query baseline")
+    args = parser.parse_args()
+
+    configure_local_app()
+    from app import crud, database, models, schemas
+    from app.core.config import settings
+    from app.reconcile_storage import _walk_files, reconcile
+
+    database.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(username="bench", password="bench"))
+    uploads = os.path.abspath(settings.UPLOADS_DIR)
+    old = time.time() - 7 * 24 * 60 * 60
+    rng = random.Random(0)
+
+    meals, images = [], []
+    expected_orphans = expected_missing = expected_recent = 0
+    start = time.perf_counter()
+    for i in range(args.files):
+        if i % 10 == 0:
+            # 変更前の保存先（UPLOADS_DIR/<user_id>/<timestamp>_<name>）
+            path = os.path.join(uploads, str(user.id), f"20240101{i:08d}_meal.jpg")
+            thumbnail = None
+        else:
+            digest = hashlib.sha256(str(i).encode()).hexdigest()
+            path = os.path.join(uploads, digest[:2], digest[2:4], f"{digest}.webp")
+            thumbnail = os.path.join(uploads, digest[:2], digest[2:4], f"{digest}_thumb.webp")
+        roll = rng.random()
+        if roll < args.orphan_rate:
+            # 参照のないファイル（1割は猶予期間内）
+            recent = rng.random() < 0.1
+            _touch(path, None if recent else old)
+            expected_recent += recent
+            expected_orphans += not recent
+            continue
+        if roll < args.orphan_rate + args.missing_rate:
+            expected_missing += 2 if thumbnail else 1
+        else:
+            _touch(path, old)
+            if thumbnail:
+                _touch(thumbnail, old)
+        meals.append({
+            "user_id": user.id, "meal_type": models.MealType.lunch, "calories": 500,
+            "image_path": path, "thumbnail_path": thumbnail,
+        })
+        if thumbnail:
+            images.append({"sha256": os.path.basename(thumbnail)[:64], "path": path, "thumbnail_path": thumbnail,
+                           "size": 4, "ref_count": 1})
+    for i in range(50):
+        _touch(os.path.join(uploads, "tmp", f"{i:032x}.part"), old)
+        expected_orphans += 1
+    for offset in range(0, len(meals), 10_000):
+        db.execute(insert(models.Meal), meals[offset:offset + 10_000])
+    for offset in range(0, len(images), 10_000):
+        db.execute(insert(models.Image), images[offset:offset + 10_000])
+    db.commit()
+    files = sum(1 for _ in _walk_files(uploads))
+    print(f"created {files} files and {len(meals)} meals in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    checked = 0
+    for entry in _walk_files(uploads):
+        if checked >= args.per_file_sample:
+            break
+        db.execute(select(models.Meal.id).where(
+            (models.Meal.image_path == entry.path) | (models.Meal.thumbnail_path == entry.path)
+        ).limit(1)).first()
+        checked += 1
+    per_file = (time.perf_counter() - start) / checked
+    print(f"{'per-file query':>16}: {per_file * files:7.2f}s (extrapolated from {checked} files)")
+
+    start = time.perf_counter()
+    report = reconcile(db, uploads_dir=uploads, grace_seconds=24 * 60 * 60, dry_run=True)
+    print(f"{'reconcile (dry)':>16}: {time.perf_counter() - start:7.2f}s "
+          f"orphans={report['orphans']} recent={report['recent']} missing={len(report['missing'])}")
+
+    report = reconcile(db, uploads_dir=uploads, grace_seconds=24 * 60 * 60, dry_run=False)
+    remaining = sum(1 for _ in _walk_files(uploads))
+    ok = (
+        report["orphans"] == report["removed"] == expected_orphans
+        and report["recent"] == expected_recent
+        and len(report["missing"]) == expected_missing
+        and all(report["missing"].values())
+        and remaining == files - expected_orphans
+    )
+    print(
+        f"{'reconcile':>16}: removed={report['removed']} remaining files={remaining} -> {'OK' if ok else 'MISMATCH'} "
+        f"(expected orphans={expected_orphans} recent={expected_recent} missing={expected_missing})"
+    )
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
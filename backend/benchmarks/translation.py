@@ -0,0 +1,64 @@
+"""
+翻訳ステージのベンチマーク。
+
+N件の description を「1件ずつ直列に翻訳する旧実装」と `translate_descriptions`
+（バッチ + 並列）で翻訳し、1リクエストあたりのモデル呼び出し回数とレイテンシ(p50/p99)を比較する。
+
+    cd backend
+    python -m benchmarks.translation --meals 500 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import statistics
+import time
+
+from app.core.translation import translate_descriptions
+
+from .fake_model import FakeGenerativeModel
+
+
+def _serial(model, texts: dict) -> dict:
+    result = {}
+    for key, text in texts.items():
+        try:
+            result[key] = model.generate_content(f"Translate the following food description to Japanese. Description: '{text}'").text
+        except Exception:
+            pass
+    return result
+
+
+def _run(name: str, fn, model: FakeGenerativeModel, texts: dict, repeat: int) -> None:
+    latencies = []
+    calls = []
+    translated = []
+    for _ in range(repeat):
+        model.reset()
+        start = time.perf_counter()
+        result = fn(model, texts)
+        latencies.append(time.perf_counter() - start)
+        calls.append(model.calls)
+        translated.append(len(result))
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:>8}: calls/request={statistics.mean(calls):.1f} "
+        f"translated={statistics.mean(translated):.0f}/{len(texts)} "
+        f"p50={statistics.median(latencies) * 1000:.1f}ms p99={p99 * 1000:.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meals", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency per call (seconds)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = {i: f"Meal number {i} with rice and miso soup." for i in range(args.meals)}
+    model = FakeGenerativeModel(latency=args.latency, error_rate=args.error_rate, seed=0)
+    _run("serial", lambda m, t: _serial(m, t), model, texts, max(1, args.repeat // 5))
+    _run("batched", lambda m, t: translate_descriptions(m, t, "Japanese"), model, texts, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
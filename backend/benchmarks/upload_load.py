@@ -0,0 +1,94 @@
+"""
+POST /meals の負荷テスト。
+
+フェイクモデル（固定レイテンシ）で解析ワーカーを動かし、アップロードを同時に投げ続けながら
+/users/me を叩いて、アップロードのスループット(req/s)、503の件数、/users/me のレイテンシを表示する。
+変更前後のコミットで同じコマンドを実行して比較する。
+
+    cd backend
+    python -m benchmarks.upload_load --concurrency 64 --duration 10 --latency 1.0
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from .common import configure_local_app, percentile
+from .fake_model import FakeGenerativeModel
+
+IMAGE = b"\xff\xd8\xff\xe0" + b"\x00" * (64 * 1024)
+
+
+async def _uploader(client: httpx.AsyncClient, headers: dict, deadline: float, stats: dict) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post(
+            "/api/v1/meals",
+            data={"meal_type": "lunch"},
+            files={"file": ("meal.jpg", IMAGE, "image/jpeg")},
+            headers=headers,
+        )
+        stats.setdefault(response.status_code, []).append(time.perf_counter() - start)
+        if response.status_code == 503:
+            await asyncio.sleep(0.05)
+
+
+async def _prober(client: httpx.AsyncClient, headers: dict, deadline: float, latencies: list) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get("/api/v1/users/me", headers=headers)
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(0.05)
+
+
+async def run(args) -> None:
+    configure_local_app()
+    from app.core.gemini import get_gemini_model
+    from app.main import app
+    from app.worker import AnalysisWorker
+
+    model = FakeGenerativeModel(latency=args.latency)
+    app.dependency_overrides[get_gemini_model] = lambda: model
+    # ASGITransport は lifespan を実行しないのでワーカーは自分で起動する
+    analysis_worker = AnalysisWorker(model_factory=lambda: model)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/v1/auth/signup", json={"username": "bench", "password": "bench"})
+        token = (await client.post(
+            "/api/v1/auth/login/token", data={"username": "bench", "password": "bench"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        stats: dict = {}
+        probe: list = []
+        analysis_worker.start()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            _prober(client, headers, deadline, probe),
+            *[_uploader(client, headers, deadline, stats) for _ in range(args.concurrency)],
+        )
+        elapsed = time.perf_counter() - start
+        analysis_worker.stop()
+
+    ok = stats.get(202, []) + stats.get(200, [])
+    print(f"uploads: {len(ok) / elapsed:.1f} req/s ok, status counts={ {k: len(v) for k, v in stats.items()} }")
+    if ok:
+        print(f"upload latency: p50={statistics.median(ok) * 1000:.0f}ms p99={percentile(ok, 99) * 1000:.0f}ms")
+    if probe:
+        print(f"/users/me under load: p50={statistics.median(probe) * 1000:.1f}ms p99={percentile(probe, 99) * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake model latency per analysis (seconds)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
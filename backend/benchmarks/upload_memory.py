@@ -0,0 +1,114 @@
+"""
+大きなファイルをアップロードしたときのピークメモリ(RSS)のベンチマーク。
+
+サイズごとに別のプロセスでアプリを起動し、POST /meals に1回アップロードして、
+アップロード前後のピークRSS（ru_maxrss）の増分とステータスコードを表示する。
+MAX_UPLOAD_BYTES を超えるファイルは413で受信の途中で打ち切られ、RSSも増えないことを確認する。
+変更前後のコミットで同じコマンドを実行して比較する。
+
+    cd backend
+    python -m benchmarks.upload_memory --sizes 5,15,19,100
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from .common import configure_local_app
+from .fake_model import FakeGenerativeModel
+
+MiB = 1024 * 1024
+
+
+def _peak_rss_mib() -> float:
+    # Linux の ru_maxrss は KiB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _write_payload(path: Path, size: int) -> None:
+    # JPEG のマジックバイトで始まる（内容の判定は通るが Pillow ではデコードできない）ファイル
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0")
+        block = bytes(range(256)) * 4096
+        remaining = size - 4
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+async def _run_case(size_mib: float) -> dict:
+    configure_local_app()
+    from app.core.gemini import get_gemini_model
+    from app.main import app
+
+    model = FakeGenerativeModel(latency=0)
+    app.dependency_overrides[get_gemini_model] = lambda: model
+
+    payload = Path(tempfile.mkdtemp()) / "upload.jpg"
+    _write_payload(payload, int(size_mib * MiB))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/api/v1/auth/signup", json={"username": "bench", "password": "bench"})
+        token = (await client.post(
+            "/api/v1/auth/login/token", data={"username": "bench", "password": "bench"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # 初回のリクエストで読み込まれるモジュールなどの分を除くため、小さい画像で1回アップロードしておく
+        await client.post(
+            "/api/v1/meals", data={"meal_type": "lunch"},
+            files={"file": ("warmup.jpg", b"\xff\xd8\xff\xe0" + b"\x00" * 1024, "image/jpeg")}, headers=headers,
+        )
+
+        before = _peak_rss_mib()
+        start = time.perf_counter()
+        with open(payload, "rb") as f:
+            response = await client.post(
+                "/api/v1/meals", data={"meal_type": "lunch"}, files={"file": ("meal.jpg", f, "image/jpeg")},
+                headers=headers,
+            )
+        elapsed = time.perf_counter() - start
+        after = _peak_rss_mib()
+
+    payload.unlink()
+    return {
+        "size_mib": size_mib,
+        "status": response.status_code,
+        "seconds": elapsed,
+        "peak_rss_mib": after,
+        "peak_rss_growth_mib": after - before,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="5,15,19,100", help="comma separated upload sizes in MiB")
+    parser.add_argument("--case", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        print(json.dumps(asyncio.run(_run_case(args.case))))
+        return
+
+    for size in args.sizes.split(","):
+        # ru_maxrss はプロセスの生存期間全体のピークなので、サイズごとに別のプロセスで測る
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.upload_memory", "--case", size],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{result['size_mib']:>7.1f}MiB: status={result['status']} time={result['seconds'] * 1000:7.0f}ms "
+            f"peak RSS={result['peak_rss_mib']:7.1f}MiB (+{result['peak_rss_growth_mib']:.1f}MiB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+テスト共通のフィクスチャ。
+
+テストごとに一時ディレクトリの SQLite と UPLOADS_DIR でアプリを動かし、Gemini の代わりに
+tests/fakes.py のフェイクモデルを使う。TestClient は with を使わずに作るので lifespan
+（解析ワーカーの起動など）は実行されない。ジョブはテストの中で worker.process_next_job を呼んで処理する。
+
+    cd backend
+    python -m pytest
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from tests.fakes import FakeGenerativeModel, configure_app, make_images
+
+
+@pytest.fixture
+def workdir(tmp_path):
+    configure_app(str(tmp_path))
+    from app import database
+    from app.core import user_cache
+
+    # DBはテストごとに新しいので、前のテストで同じ id だったユーザーのキャッシュを消す
+    user_cache.clear()
+    yield tmp_path
+    database.engine.dispose()
+
+
+@pytest.fixture
+def model():
+    return FakeGenerativeModel()
+
+
+@pytest.fixture
+def client(workdir, model):
+    from app.core.gemini import get_gemini_model
+    from app.main import app
+
+    app.dependency_overrides[get_gemini_model] = lambda: model
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def db(workdir):
+    from app import database
+
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def auth_headers(client):
+    client.post("/api/v1/auth/signup", json={"username": "test", "password": "test"})
+    token = client.post(
+        "/api/v1/auth/login/token", data={"username": "test", "password": "test"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def images():
+    # 内容の違う小さな JPEG（同じ画像は解析結果のキャッシュが効くので、テストごとに別の画像を使う）
+    return make_images(4, 64, seed=0)
+
+
+@pytest.fixture
+def upload(client, auth_headers):
+    def _upload(content: bytes, filename: str = "meal.jpg"):
+        return client.post(
+            "/api/v1/meals",
+            data={"meal_type": "lunch"},
+            files={"file": (filename, content, "image/jpeg")},
+            headers=auth_headers,
+        )
+    return _upload
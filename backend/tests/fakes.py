@@ -0,0 +1,87 @@
+"""
+テスト用のGemini代替モデルと、アプリをテストごとの一時ディレクトリで動かすためのヘルパー。
+"""
+import io
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class FakeResponse:
+    text: str
+
+
+class FakeGenerativeModel:
+    """
+    `genai.GenerativeModel` の代わりに `app.dependency_overrides[get_gemini_model]` に差し込むモデル。
+    latency 秒待ってから analysis を JSON にして返し、呼び出し回数を数える。error_rate の割合の呼び出しはエラーにする
+    （error_status を指定すると、そのHTTPステータスの google.api_core の例外にする。429 なら TooManyRequests）
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int | None = None,
+        analysis: dict | None = None,
+        seed: int | None = None,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.analysis = analysis or {
+            "description_ja": "ラーメン一杯と餃子3個",
+            "description_en": "A bowl of ramen and three gyoza dumplings.",
+            "calories": 850,
+        }
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, **kwargs) -> FakeResponse:
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+        time.sleep(self.latency)
+        if fail:
+            if self.error_status is not None:
+                from google.api_core import exceptions as api_exceptions
+
+                raise api_exceptions.from_http_status(self.error_status, "FakeGenerativeModel: injected error")
+            raise RuntimeError("FakeGenerativeModel: injected error")
+        return FakeResponse(json.dumps(self.analysis, ensure_ascii=False))
+
+
+def configure_app(workdir: str) -> None:
+    """
+    DB を workdir の SQLite に、UPLOADS_DIR を workdir/uploads に向けてテーブルを作る。
+    `app.main` をインポートする前に呼ぶこと
+    """
+    from app import database
+    from app.core.config import settings
+    from app.migrations import upgrade
+
+    settings.UPLOADS_DIR = os.path.join(workdir, "uploads")
+    database.configure(f"sqlite:///{workdir}/test.db")
+    upgrade(database.engine)
+
+
+
+def make_images(count: int, size: int, seed: int) -> list[bytes]:
+    """
+    JPEG を count 枚作る（内容はランダムなので、seed が同じなら同じ画像、違えば別の画像になる）
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    width, height = size, size * 3 // 4
+    images = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.frombytes("RGB", (width, height), rng.randbytes(width * height * 3)).save(buffer, "JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
@@ -0,0 +1,140 @@
+"""
+画像解析のジョブキュー（POST /meals の非同期化）のテスト
+"""
+from datetime import datetime, timedelta
+
+from app import crud, models, worker
+from app.core.config import settings
+from app.core.model_client import ModelClient
+
+
+def _job(db, meal_id: int) -> models.AnalysisJob:
+    db.expire_all()
+    return db.query(models.AnalysisJob).filter(models.AnalysisJob.meal_id == meal_id).one()
+
+
+def _make_runnable(db, job: models.AnalysisJob) -> None:
+    # バックオフを待たずに次の試行を実行できるようにする
+    job.next_run_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+
+
+def test_upload_returns_pending_meal(upload, images, db):
+    response = upload(images[0])
+
+    assert response.status_code == 202
+    meal = response.json()
+    assert meal["status"] == "pending"
+    assert meal["calories"] == 0
+    job = _job(db, meal["id"])
+    assert job.status == models.JobStatus.queued
+    assert job.mime_type == "image/jpeg"
+
+
+def test_process_next_job_analyzes_meal(client, auth_headers, upload, images, db, model):
+    meal_id = upload(images[0]).json()["id"]
+
+    assert worker.process_next_job(db, model) is True
+    assert worker.process_next_job(db, model) is False
+
+    meal = client.get(f"/api/v1/meals/{meal_id}", headers=auth_headers).json()
+    assert meal["status"] == "analyzed"
+    assert meal["calories"] == model.analysis["calories"]
+    assert meal["description"] == model.analysis["description_ja"]
+    assert _job(db, meal_id).status == models.JobStatus.done
+    assert model.calls == 1
+
+
+def test_analyzed_image_is_reused_without_model_call(upload, images, db, model):
+    upload(images[0])
+    worker.process_next_job(db, model)
+
+    meal = upload(images[0]).json()
+
+    assert meal["status"] == "analyzed"
+    assert meal["calories"] == model.analysis["calories"]
+    assert model.calls == 1
+
+
+def test_failed_job_backs_off_until_failed(monkeypatch, upload, images, db, model):
+    monkeypatch.setattr(settings, "ANALYSIS_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "ANALYSIS_RETRY_BASE_SECONDS", 10)
+    model.error_rate = 1.0
+    meal_id = upload(images[0]).json()["id"]
+
+    for attempt in (1, 2):
+        before = datetime.utcnow()
+        worker.process_next_job(db, model)
+        job = _job(db, meal_id)
+        assert job.status == models.JobStatus.queued
+        assert job.attempts == attempt
+        assert "injected error" in job.last_error
+        # 指数バックオフ（±20%のジッター）
+        delay = (job.next_run_at - before).total_seconds()
+        expected = settings.ANALYSIS_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+        assert expected * 0.8 - 1 <= delay <= expected * 1.2 + 1
+        assert worker.process_next_job(db, model) is False
+        _make_runnable(db, job)
+
+    worker.process_next_job(db, model)
+    job = _job(db, meal_id)
+    assert job.status == models.JobStatus.failed
+    assert job.attempts == 3
+    assert db.get(models.Meal, meal_id).status == models.MealStatus.failed
+    assert model.calls == 3
+
+
+def test_stale_running_job_is_reclaimed(monkeypatch, upload, images, db, model):
+    monkeypatch.setattr(settings, "ANALYSIS_JOB_TIMEOUT_SECONDS", 60)
+    meal_id = upload(images[0]).json()["id"]
+
+    # ワーカーがジョブを取得した後に落ちた状態
+    job = crud.claim_analysis_job(db)
+    assert job.status == models.JobStatus.running
+    assert crud.claim_analysis_job(db) is None
+
+    job.locked_at = datetime.utcnow() - timedelta(seconds=61)
+    db.commit()
+
+    assert worker.process_next_job(db, model) is True
+    job = _job(db, meal_id)
+    assert job.status == models.JobStatus.done
+    # 落ちたワーカーの試行と、取得し直した後の試行
+    assert job.attempts == 2
+    assert db.get(models.Meal, meal_id).status == models.MealStatus.analyzed
+
+
+def test_job_is_postponed_without_attempt_while_circuit_is_open(monkeypatch, upload, images, db, model):
+    monkeypatch.setattr(settings, "GEMINI_BREAKER_COOLDOWN_SECONDS", 60)
+    client = ModelClient(model, requests_per_minute=0, breaker_failures=1, breaker_cooldown=60, hedge_after=0)
+    client.breaker.record_failure()
+    meal_id = upload(images[0]).json()["id"]
+
+    before = datetime.utcnow()
+    assert worker.process_next_job(db, client) is True
+    job = _job(db, meal_id)
+    # Geminiを呼んでいないので、失敗にも試行にも数えずにクールダウンの後に回す
+    assert job.status == models.JobStatus.queued
+    assert job.attempts == 0
+    assert "circuit breaker" in job.last_error
+    assert (job.next_run_at - before).total_seconds() >= 60
+    assert db.get(models.Meal, meal_id).status == models.MealStatus.pending
+    assert model.calls == 0
+
+    client.breaker.record_success()
+    _make_runnable(db, job)
+    assert worker.process_next_job(db, client) is True
+    job = _job(db, meal_id)
+    assert job.status == models.JobStatus.done
+    assert job.attempts == 1
+
+
+def test_upload_returns_503_when_queue_is_full(monkeypatch, upload, images):
+    monkeypatch.setattr(settings, "ANALYSIS_QUEUE_LIMIT", 2)
+    assert upload(images[0]).status_code == 202
+    assert upload(images[1]).status_code == 202
+
+    response = upload(images[2])
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(settings.ANALYSIS_RETRY_AFTER_SECONDS)
@@ -0,0 +1,52 @@
+"""
+食事記録の履歴（GET /meals/history）のテスト
+"""
+from datetime import datetime
+
+import pytest
+
+from app import models
+
+
+@pytest.fixture
+def meals(auth_headers, db):
+    """
+    日本時間の10月16日 23:00 と 10月17日 01:00（UTCではどちらも10月16日）の食事記録を作る
+    """
+    user = db.query(models.User).filter(models.User.username == "test").one()
+    late_dinner = models.Meal(
+        user_id=user.id, meal_type=models.MealType.dinner, image_path="", calories=700,
+        created_at=datetime(2026, 10, 16, 14, 0),
+    )
+    after_midnight = models.Meal(
+        user_id=user.id, meal_type=models.MealType.dinner, image_path="", calories=200,
+        created_at=datetime(2026, 10, 16, 16, 0),
+    )
+    db.add_all([late_dinner, after_midnight])
+    db.commit()
+    return {"late_dinner": late_dinner.id, "after_midnight": after_midnight.id}
+
+
+def _history_ids(client, auth_headers, **params) -> list[int]:
+    response = client.get("/api/v1/meals/history", params=params, headers=auth_headers)
+    assert response.status_code == 200
+    return [meal["id"] for meal in response.json()]
+
+
+def test_history_from_with_utc_offset(client, auth_headers, meals):
+    # 日本時間の10月17日 0:00（UTCでは10月16日 15:00）以降
+    ids = _history_ids(client, auth_headers, **{"from": "2026-10-17T00:00:00+09:00"})
+
+    assert ids == [meals["after_midnight"]]
+
+
+def test_history_to_with_utc_offset(client, auth_headers, meals):
+    ids = _history_ids(client, auth_headers, to="2026-10-17T00:00:00+09:00")
+
+    assert ids == [meals["late_dinner"]]
+
+
+def test_history_naive_from_is_utc(client, auth_headers, meals):
+    ids = _history_ids(client, auth_headers, **{"from": "2026-10-16T15:00:00"})
+
+    assert ids == [meals["after_midnight"]]
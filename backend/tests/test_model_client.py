@@ -0,0 +1,177 @@
+"""
+Geminiの呼び出しを制御するクライアント（app.core.model_client.ModelClient）のテスト。
+レイテンシと返すエラーのHTTPステータスを設定できるフェイクモデルを包んで使う
+"""
+import threading
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from app.core.model_client import CircuitOpen, ModelClient, ModelDeadlineExceeded, RateLimitTimeout
+from tests.fakes import FakeGenerativeModel
+
+
+def _client(model: FakeGenerativeModel, **options) -> ModelClient:
+    # 環境変数の設定に左右されないよう、使わない機能（クォータ・リトライ・ブレーカー・ヘッジ）は無効にしておく
+    defaults = {
+        "requests_per_minute": 0, "burst": 1, "timeout": 5, "max_attempts": 1, "retry_base": 0.001,
+        "retry_max": 0.01, "breaker_failures": 0, "breaker_cooldown": 60, "hedge_after": 0, "max_concurrency": 4,
+    }
+    return ModelClient(model, **{**defaults, **options})
+
+
+def test_circuit_opens_after_failures_and_closes_after_successful_trial():
+    model = FakeGenerativeModel(error_rate=1.0, error_status=503)
+    client = _client(model, breaker_failures=3, breaker_cooldown=0.2)
+
+    for _ in range(3):
+        with pytest.raises(api_exceptions.ServiceUnavailable):
+            client.generate_content("prompt")
+    assert client.breaker.is_open
+
+    # クールダウンの間はGeminiを呼ばずにすぐ失敗する
+    with pytest.raises(CircuitOpen):
+        client.generate_content("prompt")
+    assert model.calls == 3
+
+    # クールダウンの後の1回（half-open）が成功すれば閉じる
+    time.sleep(0.25)
+    model.error_rate = 0.0
+    client.generate_content("prompt")
+    assert not client.breaker.is_open
+    client.generate_content("prompt")
+    assert model.calls == 5
+
+
+def test_failed_half_open_trial_opens_circuit_again():
+    model = FakeGenerativeModel(error_rate=1.0, error_status=503)
+    client = _client(model, breaker_failures=2, breaker_cooldown=0.2)
+    for _ in range(2):
+        with pytest.raises(api_exceptions.ServiceUnavailable):
+            client.generate_content("prompt")
+
+    time.sleep(0.25)
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate_content("prompt")
+
+    # 1回の失敗ですぐにまた開く
+    assert client.breaker.is_open
+    with pytest.raises(CircuitOpen):
+        client.generate_content("prompt")
+    assert model.calls == 3
+
+
+def test_half_open_circuit_lets_only_one_trial_through():
+    model = FakeGenerativeModel(error_rate=1.0, error_status=503)
+    client = _client(model, breaker_failures=1, breaker_cooldown=0.1)
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        client.generate_content("prompt")
+
+    time.sleep(0.15)
+    model.error_rate, model.latency = 0.0, 0.3
+    trial = threading.Thread(target=client.generate_content, args=("prompt",))
+    trial.start()
+    time.sleep(0.05)
+    # 試行の応答を待っている間のほかの呼び出しは、Geminiを呼ばずに失敗する
+    with pytest.raises(CircuitOpen):
+        client.generate_content("prompt")
+    trial.join()
+
+    assert not client.breaker.is_open
+    assert model.calls == 2
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retryable_errors_are_retried(status):
+    model = FakeGenerativeModel(error_rate=1.0, error_status=status)
+    client = _client(model, max_attempts=3)
+
+    with pytest.raises(api_exceptions.GoogleAPICallError):
+        client.generate_content("prompt")
+
+    assert model.calls == 3
+
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_non_retryable_errors_are_not_retried(status):
+    model = FakeGenerativeModel(error_rate=1.0, error_status=status)
+    client = _client(model, max_attempts=5, breaker_failures=1)
+
+    with pytest.raises(api_exceptions.ClientError):
+        client.generate_content("prompt")
+
+    assert model.calls == 1
+    # Geminiは応答しているので、障害には数えない
+    assert not client.breaker.is_open
+
+
+def test_deadline_bounds_slow_call():
+    model = FakeGenerativeModel(latency=2.0)
+    client = _client(model, timeout=0.2)
+
+    start = time.monotonic()
+    with pytest.raises(ModelDeadlineExceeded):
+        client.generate_content("prompt")
+
+    assert time.monotonic() - start < 0.5
+
+
+def test_deadline_bounds_retries():
+    model = FakeGenerativeModel(latency=0.02, error_rate=1.0, error_status=503)
+    client = _client(model, timeout=0.3, max_attempts=100, retry_base=0.05, retry_max=0.1)
+
+    start = time.monotonic()
+    with pytest.raises((api_exceptions.ServiceUnavailable, ModelDeadlineExceeded)):
+        client.generate_content("prompt")
+
+    # リトライは期限の中でだけ行う
+    assert time.monotonic() - start < 0.5
+    assert 1 < model.calls < 100
+
+
+def test_rate_limit_waits_for_token_within_deadline():
+    model = FakeGenerativeModel()
+    client = _client(model, requests_per_minute=600, burst=1)
+
+    client.generate_content("prompt")
+    start = time.monotonic()
+    client.generate_content("prompt")
+
+    # 1秒に10回までなので、2回目はトークンが貯まるまで約0.1秒待つ
+    assert time.monotonic() - start >= 0.05
+    assert model.calls == 2
+
+
+def test_rate_limit_fails_fast_when_token_comes_after_deadline():
+    model = FakeGenerativeModel()
+    client = _client(model, requests_per_minute=6, burst=1, timeout=0.2, breaker_failures=1)
+
+    client.generate_content("prompt")
+    start = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        client.generate_content("prompt")
+
+    # 次のトークンは10秒後なので、期限まで待たずにすぐ失敗する
+    assert time.monotonic() - start < 0.1
+    assert model.calls == 1
+    assert not client.breaker.is_open
+
+
+def test_hedge_is_sent_when_token_is_free():
+    model = FakeGenerativeModel(latency=0.3)
+    client = _client(model, hedge_after=0.05, requests_per_minute=6000, burst=2)
+
+    client.generate_content("prompt")
+
+    assert model.calls == 2
+
+
+def test_hedge_is_not_sent_without_free_token():
+    model = FakeGenerativeModel(latency=0.3)
+    client = _client(model, hedge_after=0.05, requests_per_minute=1, burst=1)
+
+    client.generate_content("prompt")
+
+    # クォータを待ってまでヘッジは送らない
+    assert model.calls == 1
@@ -0,0 +1,115 @@
+"""
+ストレージの突き合わせ（app.reconcile_storage.reconcile）のテスト
+"""
+import os
+import time
+
+import pytest
+
+from app import crud, models, schemas
+from app.core.config import settings
+from app.reconcile_storage import reconcile
+
+GRACE_SECONDS = 3600
+
+
+def _write(path: str, age_seconds: float) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0")
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def storage(workdir, db):
+    """
+    参照されているファイル・孤児・最近作られた孤児・ファイルのない参照を UPLOADS_DIR に用意する
+    """
+    uploads = settings.UPLOADS_DIR
+    old = GRACE_SECONDS * 2
+    paths = {
+        "meal": _write(os.path.join(uploads, "aa", "aa", "meal.jpg"), old),
+        "meal_thumbnail": _write(os.path.join(uploads, "aa", "aa", "meal_thumb.jpg"), old),
+        "image_only": _write(os.path.join(uploads, "bb", "bb", "image.jpg"), old),
+        "item_only": _write(os.path.join(uploads, "cc", "cc", "item.jpg"), old),
+        "legacy": _write(os.path.join(uploads, "1", "20240101_120000_lunch.jpg"), old),
+        "orphan": _write(os.path.join(uploads, "dd", "dd", "orphan.jpg"), old),
+        "partial": _write(os.path.join(uploads, "tmp", "upload.part"), old),
+        "recent_orphan": _write(os.path.join(uploads, "ee", "ee", "recent.jpg"), 0),
+        "missing": os.path.join(uploads, "ff", "ff", "missing.jpg"),
+        "missing_item": os.path.join(uploads, "ff", "ff", "missing_item.jpg"),
+    }
+
+    user = crud.create_user(db, schemas.UserCreate(username="test", password="test"))
+    meal = models.Meal(
+        user_id=user.id, meal_type=models.MealType.lunch, calories=500,
+        image_path=paths["meal"], thumbnail_path=paths["meal_thumbnail"],
+    )
+    legacy_meal = models.Meal(user_id=user.id, meal_type=models.MealType.lunch, calories=500, image_path=paths["legacy"])
+    missing_meal = models.Meal(user_id=user.id, meal_type=models.MealType.lunch, calories=500, image_path=paths["missing"])
+    meal.items = [
+        models.MealItem(
+            position=0, image_path=paths["item_only"], image_hash="c" * 64, mime_type="image/jpeg", calories=0,
+        ),
+        models.MealItem(
+            position=1, image_path=paths["missing_item"], image_hash="f" * 64, mime_type="image/jpeg", calories=0,
+        ),
+    ]
+    db.add_all([meal, legacy_meal, missing_meal])
+    db.add(models.Image(sha256="b" * 64, path=paths["image_only"], size=4, ref_count=1))
+    db.commit()
+    paths["meal_id"] = meal.id
+    paths["missing_meal_id"] = missing_meal.id
+    return paths
+
+
+def test_dry_run_deletes_nothing(storage, db):
+    report = reconcile(db, uploads_dir=settings.UPLOADS_DIR, grace_seconds=GRACE_SECONDS, dry_run=True)
+
+    assert report["orphans"] == 2
+    assert report["removed"] == 0
+    for name in ("orphan", "partial", "recent_orphan"):
+        assert os.path.exists(storage[name])
+
+
+def test_delete_removes_only_orphans_past_grace_period(storage, db):
+    report = reconcile(db, uploads_dir=settings.UPLOADS_DIR, grace_seconds=GRACE_SECONDS, dry_run=False)
+
+    assert report["orphans"] == report["removed"] == 2
+    assert report["recent"] == 1
+    assert not os.path.exists(storage["orphan"])
+    assert not os.path.exists(storage["partial"])
+    # 保存した直後でDBへの登録がまだの可能性があるファイルは残す
+    assert os.path.exists(storage["recent_orphan"])
+
+
+def test_grace_period_decides_which_orphans_are_removed(storage, db):
+    report = reconcile(db, uploads_dir=settings.UPLOADS_DIR, grace_seconds=GRACE_SECONDS * 4, dry_run=False)
+    assert report["orphans"] == 0
+    assert report["recent"] == 3
+    assert os.path.exists(storage["orphan"])
+
+    report = reconcile(db, uploads_dir=settings.UPLOADS_DIR, grace_seconds=0, dry_run=False)
+    assert report["orphans"] == 3
+    assert not os.path.exists(storage["recent_orphan"])
+
+
+def test_referenced_files_are_kept(storage, db):
+    report = reconcile(db, uploads_dir=settings.UPLOADS_DIR, grace_seconds=0, dry_run=False)
+
+    assert report["referenced"] == 5
+    # meals・meal_items・images のどれか1つからだけ参照されているファイルも残す
+    for name in ("meal", "meal_thumbnail", "image_only", "item_only", "legacy"):
+        assert os.path.exists(storage[name]), name
+
+
+def test_missing_files_are_reported_with_meal_ids(storage, db):
+    report = reconcile(db, uploads_dir=settings.UPLOADS_DIR, grace_seconds=GRACE_SECONDS, dry_run=True)
+
+    assert report["missing"] == {
+        storage["missing"]: [storage["missing_meal_id"]],
+        # 複数の写真の食事の写真は、その食事記録の id で報告する
+        storage["missing_item"]: [storage["meal_id"]],
+    }
@@ -0,0 +1,164 @@
+"""
+アップロードのサイズ制限（413）・形式の判定（415）と、大きなアップロードのメモリ使用量のテスト
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from app import models
+from app.core.config import settings
+from app.middleware import BodySizeLimitMiddleware
+from tests.fakes import configure_app
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MiB = 1024 * 1024
+
+
+def _echo_app(max_bytes: int) -> TestClient:
+    async def echo(request):
+        return PlainTextResponse(str(len(await request.body())))
+
+    app = Starlette(routes=[Route("/", echo, methods=["POST"])])
+    return TestClient(BodySizeLimitMiddleware(app, max_bytes=max_bytes))
+
+
+def test_body_size_limit_rejects_content_length_over_limit():
+    response = _echo_app(1024).post("/", content=b"x" * 1025)
+
+    assert response.status_code == 413
+    assert "1024" in response.json()["detail"]
+
+
+def test_body_size_limit_stops_chunked_body_over_limit():
+    async def read_body(scope, receive, send):
+        while (await receive()).get("more_body"):
+            pass
+
+    received = 0
+    sent = []
+
+    async def receive():
+        nonlocal received
+        received += 1
+        return {"type": "http.request", "body": b"x" * 512, "more_body": received < 100}
+
+    async def send(message):
+        sent.append(message)
+
+    # Content-Length なし（chunked）のリクエスト
+    scope = {"type": "http", "method": "POST", "path": "/", "headers": []}
+    asyncio.run(BodySizeLimitMiddleware(read_body, max_bytes=1024)(scope, receive, send))
+
+    assert sent[0]["status"] == 413
+    # 上限を超えた時点で受信をやめる
+    assert received == 3
+
+
+def test_body_size_limit_passes_body_within_limit():
+    response = _echo_app(1024).post("/", content=b"x" * 1024)
+
+    assert response.status_code == 200
+    assert response.text == "1024"
+
+
+def _stored_files(workdir) -> list[str]:
+    return [name for _, _, names in os.walk(settings.UPLOADS_DIR) for name in names]
+
+
+def test_upload_over_max_upload_bytes_returns_413(monkeypatch, workdir, upload, db):
+    monkeypatch.setattr(settings, "MAX_UPLOAD_BYTES", 4096)
+
+    response = upload(b"\xff\xd8\xff\xe0" + b"\x00" * 8192)
+
+    assert response.status_code == 413
+    assert db.query(models.Meal).count() == 0
+    # 途中まで書いた一時ファイルも残さない
+    assert _stored_files(workdir) == []
+
+
+@pytest.mark.parametrize("content", [b"%PDF-1.4 not an image", b""], ids=["not-an-image", "empty"])
+def test_upload_of_non_image_returns_415(workdir, upload, db, content):
+    # クライアントの Content-Type（image/jpeg）ではなく、ファイルの先頭のバイトで判定する
+    response = upload(content)
+
+    assert response.status_code == 415
+    assert db.query(models.Meal).count() == 0
+    assert _stored_files(workdir) == []
+
+
+def _write_payload(path: Path, size: int) -> None:
+    # JPEG のマジックバイトで始まる（内容の判定は通るが Pillow ではデコードできない）ファイル
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0")
+        block = bytes(range(256)) * 4096
+        remaining = size - 4
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def _peak_rss_mib() -> float:
+    import resource
+
+    # Linux の ru_maxrss は KiB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _upload_and_measure(workdir: str, payload: str) -> dict:
+    configure_app(workdir)
+    from app.main import app
+
+    # TestClient はボディ全体をメモリに読んでから渡すので、ストリーミングで送る ASGITransport を使う
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        await client.post("/api/v1/auth/signup", json={"username": "test", "password": "test"})
+        token = (await client.post(
+            "/api/v1/auth/login/token", data={"username": "test", "password": "test"}
+        )).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        # 初回のリクエストで読み込まれるモジュールなどの分を除くため、小さい画像で1回アップロードしておく
+        await client.post(
+            "/api/v1/meals", data={"meal_type": "lunch"},
+            files={"file": ("warmup.jpg", b"\xff\xd8\xff\xe0" + b"\x00" * 1024, "image/jpeg")}, headers=headers,
+        )
+
+        before = _peak_rss_mib()
+        with open(payload, "rb") as f:
+            response = await client.post(
+                "/api/v1/meals", data={"meal_type": "lunch"}, files={"file": ("meal.jpg", f, "image/jpeg")},
+                headers=headers,
+            )
+        return {"status": response.status_code, "peak_rss_growth_mib": _peak_rss_mib() - before}
+
+
+def _measure_upload(workdir: str, payload: str) -> None:
+    # 別のプロセスで実行し、結果を JSON で標準出力に書く
+    print(json.dumps(asyncio.run(_upload_and_measure(workdir, payload))))
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss is measured in KiB on Linux only")
+@pytest.mark.parametrize("size_mib, status", [(15, 202), (30, 413)])
+def test_large_upload_peak_rss_stays_bounded(tmp_path, size_mib, status):
+    payload = tmp_path / "upload.jpg"
+    _write_payload(payload, size_mib * MiB)
+
+    # ru_maxrss はプロセス全体のピークなので、アップロードは新しいプロセスで実行して測る
+    code = f"from tests.test_uploads import _measure_upload; _measure_upload({str(tmp_path)!r}, {str(payload)!r})"
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+
+    assert result["status"] == status
+    # アップロードはチャンクごとにディスクに書くので、ファイル全体をメモリに載せない
+    assert result["peak_rss_growth_mib"] < size_mib / 4
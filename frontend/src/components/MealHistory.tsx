@@ -12,26 +12,30 @@ const MealHistory: React.FC = () => {
   const [groupedMeals, setGroupedMeals] = useState<GroupedMeals>({});
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const { user } = useAuth();
 
+  const appendMeals = (mealsData: Meal[]) => {
+    setGroupedMeals(prevGroupedMeals => mealsData.reduce((acc, meal) => {
+      const date = new Date(meal.created_at).toLocaleDateString('ja-JP');
+      acc[date] = [...(acc[date] || []), meal];
+      return acc;
+    }, { ...prevGroupedMeals } as GroupedMeals));
+  };
+
+  const fetchPage = async (cursor: string | null) => {
+    const response = await meals.getMealHistory(cursor);
+    appendMeals(response.data);
+    setNextCursor(response.headers['x-next-cursor'] || null);
+  };
+
   useEffect(() => {
     const fetchHistory = async () => {
       setLoading(true);
       setError(null);
       try {
-        const response = await meals.getMealHistory();
-        const mealsData: Meal[] = response.data;
-        
-        const groups = mealsData.reduce((acc, meal) => {
-          const date = new Date(meal.created_at).toLocaleDateString('ja-JP');
-          if (!acc[date]) {
-            acc[date] = [];
-          }
-          acc[date].push(meal);
-          return acc;
-        }, {} as GroupedMeals);
-
-        setGroupedMeals(groups);
+        await fetchPage(null);
       } catch (err: any) {
         console.error('Failed to fetch meal history:', err);
         setError(err.response?.data?.detail || '食事履歴の取得に失敗しました。');
@@ -43,6 +47,19 @@ const MealHistory: React.FC = () => {
     fetchHistory();
   }, []);
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    setError(null);
+    try {
+      await fetchPage(nextCursor);
+    } catch (err: any) {
+      console.error('Failed to fetch meal history:', err);
+      setError(err.response?.data?.detail || '食事履歴の取得に失敗しました。');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleMealDeleted = (mealId: number) => {
     setGroupedMeals(prevGroupedMeals => {
         const newGroupedMeals = { ...prevGroupedMeals };
@@ -118,6 +135,21 @@ const MealHistory: React.FC = () => {
           );
         })
       )}
+      {nextCursor && (
+        <div style={{ textAlign: 'center' }}>
+          <button onClick={handleLoadMore} disabled={loadingMore} style={{
+            padding: '10px 25px',
+            backgroundColor: 'white',
+            color: '#4285F4',
+            border: '1px solid #4285F4',
+            borderRadius: '4px',
+            cursor: 'pointer',
+            fontWeight: 'bold'
+          }}>
+            {loadingMore ? '読み込み中...' : 'さらに読み込む'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -7,6 +7,8 @@ export interface Meal {
   description: string;
   calories: number;
   image_path: string;
+  thumbnail_path?: string | null;
+  status: 'pending' | 'analyzed' | 'failed';
   created_at: string;
 }
 
@@ -81,7 +83,7 @@ const MealList: React.FC<MealListProps> = ({ meals, onMealDeleted, showImage = t
           }}>
             {showImage && (
               <img
-                src={`http://localhost:8000/${meal.image_path.replace('/app/', '')}`}
+                src={`http://localhost:8000/${(meal.thumbnail_path || meal.image_path).replace('/app/', '')}`}
                 alt={meal.description || 'Meal image'}
                 style={{ width: '100%', height: '200px', objectFit: 'cover', borderBottom: '1px solid #E0E0E0' }}
               />
@@ -89,7 +91,7 @@ const MealList: React.FC<MealListProps> = ({ meals, onMealDeleted, showImage = t
             <div style={{ padding: '15px' }}>
               <h4 style={{ margin: '0 0 10px 0', color: '#3C4043' }}>{getMealTypeLabel(meal.meal_type)}</h4>
               <p style={{ margin: '0 0 5px 0', fontSize: '14px', color: '#5F6368' }}>{meal.description}</p>
-              <p style={{ margin: '0', fontSize: '16px', fontWeight: 'bold', color: '#4285F4' }}>{meal.calories} kcal</p>
+              <p style={{ margin: '0', fontSize: '16px', fontWeight: 'bold', color: '#4285F4' }}>{meal.status === 'pending' ? '分析中...' : meal.status === 'failed' ? '分析失敗' : `${meal.calories} kcal`}</p>
               <p style={{ margin: '10px 0 0 0', fontSize: '12px', color: '#9AA0A6' }}>
                 {formatDateTime(meal.created_at)}
               </p>
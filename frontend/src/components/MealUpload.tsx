@@ -44,10 +44,20 @@ const MealUpload: React.FC<MealUploadProps> = ({ onMealUploaded }) => {
     setSuccess(null);
 
     try {
-      await meals.uploadMeal(mealType, selectedFile);
-      setSuccess('食事を記録しました！');
+      // アップロードはすぐに pending の記録を返すので、解析が終わるまでロングポーリングする
+      const uploaded = await meals.uploadMeal(mealType, selectedFile);
       setSelectedFile(null);
       onMealUploaded();
+      let meal = uploaded.data;
+      for (let i = 0; i < 10 && meal.status === 'pending'; i++) {
+        meal = (await meals.getMeal(meal.id, 30)).data;
+      }
+      if (meal.status === 'failed') {
+        setError('画像の分析に失敗しました。');
+      } else {
+        setSuccess('食事を記録しました！');
+      }
+      onMealUploaded();
     } catch (err: any) {
       console.error('Meal upload error:', err);
       setError(err.response?.data?.detail || '食事の記録に失敗しました。');
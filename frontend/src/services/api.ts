@@ -48,7 +48,9 @@ export const auth = {
     });
   },
   signup: (username: string, password: string, daily_calorie_limit: number) => {
-    return api.post('/auth/signup', { username, password, daily_calorie_limit });
+    // 「今日」や日ごとの集計はブラウザのタイムゾーンで行う
+    const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    return api.post('/auth/signup', { username, password, daily_calorie_limit, timezone });
   },
 };
 
@@ -58,19 +60,39 @@ export const users = {
 };
 
 export const meals = {
-  uploadMeal: (mealType: string, file: File) => {
+  // 複数の料理の写真を渡すと1つの食事記録にまとめて解析し、料理ごとの結果を items で返す
+  uploadMeal: (mealType: string, files: File | File[]) => {
     const formData = new FormData();
     formData.append('meal_type', mealType);
-    formData.append('file', file);
+    for (const file of Array.isArray(files) ? files : [files]) {
+      formData.append('file', file);
+    }
     return api.post('/meals', formData, {
       headers: {
         'Content-Type': 'multipart/form-data',
       },
     });
   },
+  // 解析が終わるまで最大 wait 秒待ってから食事記録を返す（ロングポーリング）
+  getMeal: (mealId: number, wait = 0) => api.get(`/meals/${mealId}`, { params: { wait } }),
   getTodayMeals: () => api.get('/meals/today'),
   deleteMeal: (mealId: number) => api.delete(`/meals/${mealId}`),
-  getMealHistory: () => api.get('/meals/history'),
+  // 複数の食事記録をまとめて削除・更新する。操作ごとの結果（deleted / updated / not_found / conflict）が返る
+  batchMeals: (operations: {
+    meal_id: number;
+    action: 'delete' | 'update';
+    meal_type?: string;
+    calories?: number;
+  }[]) => api.post('/meals/batch', { operations }),
+  // 1ページ分の履歴を取得する。続きのカーソルは X-Next-Cursor ヘッダーで返る
+  getMealHistory: (cursor?: string | null, limit = 50) =>
+    api.get('/meals/history', { params: { limit, ...(cursor ? { cursor } : {}) } }),
+  // 日・週・月ごとのカロリー集計（from / to は YYYY-MM-DD）
+  getMealSummary: (granularity: 'day' | 'week' | 'month' = 'day', from?: string, to?: string) =>
+    api.get('/meals/summary', { params: { granularity, ...(from ? { from } : {}), ...(to ? { to } : {}) } }),
+  // すべての食事記録をファイルとしてダウンロードする
+  exportMeals: (format: 'ndjson' | 'csv' = 'csv') =>
+    api.get('/meals/export', { params: { format }, responseType: 'blob' }),
 };
 
 export default api;
\ No newline at end of file